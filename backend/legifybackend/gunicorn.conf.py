@@ -0,0 +1,33 @@
+"""
+Gunicorn settings (picked up automatically from the working directory).
+
+The app is imported once in the master (preload_app) with MODEL_PRELOAD
+defaulting to "all", so InLegalBERT, spaCy and the NLTK data are loaded
+before the workers fork and shared copy-on-write between them.
+"""
+
+import gc
+import os
+
+os.environ.setdefault("MODEL_PRELOAD", "all")
+
+wsgi_app = "legifybackend.wsgi:application"
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# The first extraction/summary of a large document can take a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def pre_fork(server, worker):
+    # Move the preloaded objects out of the collector's generations so the
+    # first GC pass in a worker does not touch (and so copy) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Never share a database connection opened in the master
+    from django.db import connections
+
+    connections.close_all()
+    server.log.info(f"Worker {worker.pid} forked with preloaded models")
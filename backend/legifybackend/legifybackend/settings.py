@@ -22,6 +22,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
 
+# Uploads are streamed to disk in UPLOAD_CHUNK_SIZE pieces and rejected once
+# they exceed FILE_UPLOAD_MAX_SIZE (see myapp/utilities/uploads.py)
+FILE_UPLOAD_MAX_SIZE = int(os.getenv("FILE_UPLOAD_MAX_SIZE", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -169,6 +174,122 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Background document processing (see myapp/utilities/jobs.py)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_EAGER = os.getenv("JOB_EAGER", "false").lower() == "true"
+# Jobs are held in memory: pending/running jobs not updated for JOB_STALE_SECONDS
+# belong to a process that has gone and are requeued (pending) or failed
+# (running); each process checks at most every JOB_SWEEP_SECONDS.  Keep it well
+# above the longest single stage (e.g. OCR of a long scan)
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "1800"))
+JOB_SWEEP_SECONDS = int(os.getenv("JOB_SWEEP_SECONDS", "300"))
+
+# PDF text extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages are
+# parsed in PDF_PAGES_PER_TASK page ranges on a shared pool of PDF_EXTRACT_WORKERS
+# processes, started on first use
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# A PDF page with an image and fewer alphanumeric characters than this is OCR'd
+PDF_SCANNED_PAGE_MIN_CHARS = int(os.getenv("PDF_SCANNED_PAGE_MIN_CHARS", "20"))
+
+# PDF text-layer parser: pypdf2 (default), pypdfium2, pymupdf or pdfminer.
+# Compare them on your own documents with `manage.py benchmark_extractors pdf`
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdf2")
+
+# Extracted text is stored per page (DocumentPage); text without pages (DOCX,
+# TXT, ...) is split into chunks of about this many characters
+DOCUMENT_PAGE_CHARS = int(os.getenv("DOCUMENT_PAGE_CHARS", "4000"))
+
+# Extracted text is stored compressed (myapp.fields.CompressedTextField):
+# "zstd" (falls back to zlib when zstandard is not installed) or "zlib"
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "zstd")
+TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "9"))
+
+# File history pagination (views.file_history)
+FILE_HISTORY_PAGE_SIZE = int(os.getenv("FILE_HISTORY_PAGE_SIZE", "50"))
+FILE_HISTORY_MAX_PAGE_SIZE = int(os.getenv("FILE_HISTORY_MAX_PAGE_SIZE", "200"))
+
+# Gemini OCR: long PDFs are split into GEMINI_OCR_PAGES_PER_CHUNK page ranges,
+# OCR'd with at most GEMINI_OCR_CONCURRENCY requests in flight, and failed
+# ranges retried GEMINI_OCR_RETRIES times
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_OCR_MODEL = os.getenv("GEMINI_OCR_MODEL", "gemini-2.0-flash")
+GEMINI_OCR_TIMEOUT = int(os.getenv("GEMINI_OCR_TIMEOUT", "60"))
+GEMINI_OCR_PAGES_PER_CHUNK = int(os.getenv("GEMINI_OCR_PAGES_PER_CHUNK", "10"))
+GEMINI_OCR_CONCURRENCY = int(os.getenv("GEMINI_OCR_CONCURRENCY", "4"))
+GEMINI_OCR_RETRIES = int(os.getenv("GEMINI_OCR_RETRIES", "2"))
+
+# OCR engines, tried in this order: "gemini" (remote) and/or "tesseract" (local).
+# TESSERACT_CMD is auto-detected when empty; PDF pages are rasterized and OCR'd
+# at OCR_DPI in language OCR_LANG on the shared PDF_EXTRACT_WORKERS pool, at most
+# TESSERACT_WORKERS pages of one document at a time
+OCR_ENGINE_ORDER = [
+    engine.strip()
+    for engine in os.getenv("OCR_ENGINE_ORDER", "gemini,tesseract").split(",")
+    if engine.strip()
+]
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "")
+TESSERACT_WORKERS = int(os.getenv("TESSERACT_WORKERS", str(os.cpu_count() or 1)))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Images are rotated, grayscaled, downscaled to OCR_IMAGE_TARGET_DPI and
+# (optionally) binarized before OCR to shrink the payload
+OCR_IMAGE_PREPROCESS = os.getenv("OCR_IMAGE_PREPROCESS", "true").lower() == "true"
+OCR_IMAGE_TARGET_DPI = int(os.getenv("OCR_IMAGE_TARGET_DPI", "200"))
+OCR_IMAGE_BINARIZE = os.getenv("OCR_IMAGE_BINARIZE", "true").lower() == "true"
+
+# On-disk cache of extracted text keyed by content hash, extractor backend and
+# EXTRACTOR_VERSION (see myapp/utilities/extraction_cache.py)
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join(BASE_DIR, "cache", "extraction"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+# CSV/XLSX extraction streams TABULAR_CHUNK_ROWS rows at a time and keeps at
+# most TABULAR_MAX_ROWS rows (per sheet) and TABULAR_MAX_COLS columns
+TABULAR_MAX_ROWS = int(os.getenv("TABULAR_MAX_ROWS", "100000"))
+TABULAR_MAX_COLS = int(os.getenv("TABULAR_MAX_COLS", "50"))
+TABULAR_CHUNK_ROWS = int(os.getenv("TABULAR_CHUNK_ROWS", "10000"))
+
+# JSON extraction stops after producing this many bytes of text
+JSON_MAX_BYTES = int(os.getenv("JSON_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# NLP models to load at startup instead of on first use: "all", or a
+# comma-separated subset of nltk,spacy,inlegalbert.  Empty loads lazily.
+# gunicorn.conf.py defaults this to "all" so workers share preloaded weights.
+MODEL_PRELOAD = [name.strip() for name in os.getenv("MODEL_PRELOAD", "").split(",") if name.strip()]
+
+# A model that failed to load is not retried for this many seconds; callers
+# get the stored error immediately instead of waiting on another attempt
+MODEL_RETRY_SECONDS = int(os.getenv("MODEL_RETRY_SECONDS", "300"))
+
+# A document whose Gemini summary failed shows the job's fallback for this
+# long; opening it after that queues a new job to try Gemini again
+SUMMARY_RETRY_SECONDS = int(os.getenv("SUMMARY_RETRY_SECONDS", "300"))
+
+# Level-3 simplification batches concurrent fill-mask requests: up to
+# FILL_MASK_MAX_BATCH sentences per forward pass, waiting at most
+# FILL_MASK_MAX_WAIT_MS for a batch to fill
+FILL_MASK_MAX_BATCH = int(os.getenv("FILL_MASK_MAX_BATCH", "16"))
+FILL_MASK_MAX_WAIT_MS = int(os.getenv("FILL_MASK_MAX_WAIT_MS", "10"))
+
+# Level-3 simplification predicts each long word from this many words of
+# context either side, and memoizes up to SIMPLIFY_PREDICTION_CACHE_SIZE windows
+SIMPLIFY_CONTEXT_WORDS = int(os.getenv("SIMPLIFY_CONTEXT_WORDS", "12"))
+SIMPLIFY_PREDICTION_CACHE_SIZE = int(os.getenv("SIMPLIFY_PREDICTION_CACHE_SIZE", "50000"))
+
+# InLegalBERT inference: "fp32", "int8" (dynamic quantization, CPU) or "onnx"
+# (ONNX Runtime, needs optimum[onnxruntime]; exported once into LEGALBERT_ONNX_DIR)
+LEGALBERT_MODEL = os.getenv("LEGALBERT_MODEL", "law-ai/InLegalBERT")
+LEGALBERT_INFERENCE_BACKEND = os.getenv("LEGALBERT_INFERENCE_BACKEND", "fp32")
+LEGALBERT_ONNX_DIR = os.getenv("LEGALBERT_ONNX_DIR", os.path.join(BASE_DIR, "models", "onnx"))
+
+# JSON {"term": "replacement"} glossary used by simplification; edits are
+# picked up without a restart (the file's mtime is checked per document)
+LEGAL_GLOSSARY_PATH = os.getenv("LEGAL_GLOSSARY_PATH", os.path.join(BASE_DIR, "myapp", "data", "legal_terms.json"))
+
 # Email settings for password reset
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'support@legify.com'
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "myapp"
+
+    def ready(self):
+        # Load the models named in MODEL_PRELOAD now rather than on the first
+        # request; with gunicorn's preload_app this runs once in the master
+        # and workers share the weights (see gunicorn.conf.py)
+        from django.conf import settings
+
+        if settings.MODEL_PRELOAD:
+            from .utilities import model_registry
+
+            model_registry.preload()
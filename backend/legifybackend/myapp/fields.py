@@ -0,0 +1,112 @@
+"""
+Model fields.
+
+``CompressedTextField`` stores text compressed (zstd when the ``zstandard``
+package is installed, zlib otherwise) in a binary column and decompresses it
+transparently when it is read.  The codec is recognised from the stored
+bytes, so rows written with either one can always be read back.
+"""
+
+import codecs
+import zlib
+
+from django.conf import settings
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _codec():
+    codec = getattr(settings, "TEXT_COMPRESSION", "zstd")
+    if codec == "zstd" and zstandard is None:
+        return "zlib"
+    return codec
+
+
+def compress_text(text):
+    data = text.encode("utf-8")
+    level = getattr(settings, "TEXT_COMPRESSION_LEVEL", 9)
+    if _codec() == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, min(level, 9))
+
+
+def decompress_text(data):
+    data = bytes(data)
+    if not data:
+        # BinaryField's implicit default is b"", which was never compressed
+        return ""
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("Text was stored with zstd; install zstandard to read it")
+        return b"".join(zstandard.ZstdDecompressor().read_to_iter(data)).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def iter_decompressed_text(data, chunk_size=_STREAM_CHUNK_SIZE):
+    """Yield the text stored in *data* piece by piece instead of decompressing it at once."""
+    data = memoryview(data)
+    if not len(data):
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    if bytes(data[:4]) == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("Text was stored with zstd; install zstandard to read it")
+        for chunk in zstandard.ZstdDecompressor().read_to_iter(data, write_size=chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+    else:
+        decompressor = zlib.decompressobj()
+        for start in range(0, len(data), chunk_size):
+            text = decoder.decode(decompressor.decompress(data[start:start + chunk_size]))
+            if text:
+                yield text
+        text = decoder.decode(decompressor.flush())
+        if text:
+            yield text
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    A text field stored compressed.  Reads return ``str``; assign ``str``
+    (or None).  Database lookups on the text itself (contains, ...) are not
+    possible; use ``isnull`` only.
+    """
+
+    def _check_str_default_value(self):
+        # BinaryField rejects str defaults; here they are compressed like any value
+        return []
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return compress_text(value)
+        return super().get_prep_value(value)
+
+    def value_to_string(self, obj):
+        # Serialize (dumpdata) as text rather than base64 of the compressed bytes
+        return self.value_from_object(obj)
@@ -0,0 +1,257 @@
+"""
+Compare text extractors on a directory of sample documents.
+
+    python manage.py benchmark_extractors docx path/to/samples --repeat 3
+    python manage.py benchmark_extractors pdf path/to/samples --reference pypdf2
+
+docx: each implementation is timed in-process over ``--repeat`` runs and its
+peak Python allocation (tracemalloc) and output size are reported.
+
+pdf: every installed PDF backend (see ``pdf_backends``) parses each file in a
+fresh subprocess, so the peak RSS reported (and its growth over the idle
+interpreter) is that backend's alone.  On Linux the peak is the process's
+VmHWM, reset before parsing; ru_maxrss, the fallback elsewhere, carries the
+parent's peak over into a spawned child on Linux.  Output is
+compared with the ``--reference`` backend, or with ``<name>.txt`` files from
+``--reference-dir`` when given, as a token-overlap similarity in [0, 1].
+"""
+
+import multiprocessing
+import re
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utilities import pdf_backends, text_extractor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DOCX_IMPLEMENTATIONS = {
+    "streaming": text_extractor.extract_text_from_docx,
+    "object-model": text_extractor.extract_text_from_docx_object_model,
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _measure(fn, path, repeat):
+    """Best wall time over *repeat* runs, peak traced memory, and the output."""
+    best = None
+    output = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        fn(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, output
+
+
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+def _proc_status_kib(field):
+    """A ``kB`` field of /proc/self/status (e.g. VmHWM), or None off Linux."""
+    try:
+        with _PROC_STATUS.open() as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset VmHWM to the current RSS, so the next peak is this run's own; False if unsupported."""
+    try:
+        _PROC_CLEAR_REFS.write_text("5")
+    except OSError:
+        return False
+    return _proc_status_kib("VmHWM") is not None
+
+
+def _peak_rss_kib():
+    peak = _proc_status_kib("VmHWM")
+    if peak is not None or resource is None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak // 1024 if peak > 1 << 30 else peak
+
+
+def _run_pdf_backend(name, path, repeat):
+    """
+    Subprocess worker for one backend and file: (pages, best seconds, peak
+    RSS KiB, RSS growth KiB over the already-imported interpreter, text).
+    """
+    backend = pdf_backends.BACKENDS[name]
+    # Without a reset the peak may predate the run (imports, an earlier backend)
+    baseline = _proc_status_kib("VmRSS") if _reset_peak_rss() else _peak_rss_kib()
+    best = None
+    pages = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        page_count = backend.page_count(path)
+        pages = backend.extract_range(path, 0, page_count)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = _peak_rss_kib()
+    growth = peak - baseline if peak is not None else None
+    return len(pages), best, peak, growth, "\n".join(text for text, _ in pages)
+
+
+def similarity(text, reference):
+    """Token-overlap (Dice) similarity of two texts, 1.0 when identical bags of words."""
+    tokens = Counter(_TOKEN_RE.findall(text.lower()))
+    reference_tokens = Counter(_TOKEN_RE.findall(reference.lower()))
+    total = sum(tokens.values()) + sum(reference_tokens.values())
+    if not total:
+        return 1.0
+    return 2 * sum((tokens & reference_tokens).values()) / total
+
+
+class Command(BaseCommand):
+    help = "Benchmark text extractors against a directory of sample documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["docx", "pdf"])
+        parser.add_argument("corpus", help="File or directory of sample documents")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--backends",
+            help="pdf: comma-separated backends to run (default: every installed one)",
+        )
+        parser.add_argument(
+            "--reference",
+            default=pdf_backends.DEFAULT_BACKEND,
+            help="pdf: backend whose output the others are compared with",
+        )
+        parser.add_argument(
+            "--reference-dir",
+            help="pdf: directory of <file name>.txt ground-truth texts (overrides --reference)",
+        )
+
+    def _files(self, corpus, suffix):
+        corpus = Path(corpus)
+        if corpus.is_file():
+            return [corpus]
+        if not corpus.is_dir():
+            raise CommandError(f"{corpus} does not exist")
+        files = sorted(p for p in corpus.rglob("*") if p.suffix.lower() == suffix)
+        if not files:
+            raise CommandError(f"No {suffix} files found in {corpus}")
+        return files
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        if options["kind"] == "docx":
+            self._benchmark_docx(self._files(options["corpus"], ".docx"), repeat)
+        else:
+            self._benchmark_pdf(self._files(options["corpus"], ".pdf"), repeat, options)
+
+    # ── docx ─────────────────────────────────────────────────────────────────
+
+    def _benchmark_docx(self, files, repeat):
+        totals = {name: [0.0, 0] for name in DOCX_IMPLEMENTATIONS}
+        self.stdout.write(f"{'file':40} {'extractor':14} {'seconds':>9} {'peak KiB':>10} {'chars':>9}")
+        for path in files:
+            for name, fn in DOCX_IMPLEMENTATIONS.items():
+                try:
+                    seconds, peak, output = _measure(fn, str(path), repeat)
+                except Exception as e:
+                    self.stdout.write(f"{path.name[:40]:40} {name:14} failed: {e}")
+                    continue
+                totals[name][0] += seconds
+                totals[name][1] = max(totals[name][1], peak)
+                self.stdout.write(
+                    f"{path.name[:40]:40} {name:14} {seconds:9.4f} {peak / 1024:10.1f} {len(output):9}"
+                )
+
+        self.stdout.write("")
+        for name, (seconds, peak) in totals.items():
+            self.stdout.write(f"{name}: {seconds:.4f}s total, {peak / 1024:.1f} KiB max peak")
+
+    # ── pdf ──────────────────────────────────────────────────────────────────
+
+    def _pdf_backends(self, options):
+        installed = pdf_backends.available_backends()
+        if not options["backends"]:
+            return installed
+        names = [name.strip().lower() for name in options["backends"].split(",") if name.strip()]
+        missing = [name for name in names if name not in installed]
+        if missing:
+            raise CommandError(f"Not installed: {', '.join(missing)} (installed: {', '.join(installed)})")
+        return names
+
+    def _reference_text(self, path, results, options):
+        if options["reference_dir"]:
+            reference_path = Path(options["reference_dir"]) / f"{path.name}.txt"
+            if not reference_path.exists():
+                reference_path = Path(options["reference_dir"]) / f"{path.stem}.txt"
+            if reference_path.exists():
+                return reference_path.read_text(encoding="utf-8", errors="replace")
+            return None
+        reference = results.get(options["reference"])
+        return reference[4] if reference else None
+
+    def _benchmark_pdf(self, files, repeat, options):
+        names = self._pdf_backends(options)
+        if not options["reference_dir"] and options["reference"] not in names:
+            names.append(options["reference"])
+
+        totals = {name: {"pages": 0, "seconds": 0.0, "rss": 0, "growth": 0, "similarity": []} for name in names}
+        self.stdout.write(
+            f"{'file':32} {'backend':10} {'pages':>6} {'pages/s':>9} "
+            f"{'peak RSS MiB':>13} {'growth MiB':>11} {'similarity':>11}"
+        )
+        # "spawn" and one process per run, so each peak RSS belongs to a single backend
+        context = multiprocessing.get_context("spawn")
+        for path in files:
+            results = {}
+            for name in names:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    try:
+                        results[name] = pool.submit(_run_pdf_backend, name, str(path), repeat).result()
+                    except Exception as e:
+                        self.stdout.write(f"{path.name[:32]:32} {name:10} failed: {e}")
+
+            reference = self._reference_text(path, results, options)
+            for name, (pages, seconds, rss, growth, text) in results.items():
+                score = similarity(text, reference) if reference is not None else None
+                totals[name]["pages"] += pages
+                totals[name]["seconds"] += seconds
+                totals[name]["rss"] = max(totals[name]["rss"], rss or 0)
+                totals[name]["growth"] = max(totals[name]["growth"], growth or 0)
+                if score is not None:
+                    totals[name]["similarity"].append(score)
+                self.stdout.write(
+                    f"{path.name[:32]:32} {name:10} {pages:6} {pages / seconds if seconds else 0:9.1f} "
+                    f"{(rss or 0) / 1024:13.1f} {(growth or 0) / 1024:11.1f} "
+                    f"{'-' if score is None else f'{score:.3f}':>11}"
+                )
+
+        self.stdout.write("")
+        for name, total in totals.items():
+            rate = total["pages"] / total["seconds"] if total["seconds"] else 0
+            scores = total["similarity"]
+            mean = f"{sum(scores) / len(scores):.3f}" if scores else "n/a"
+            self.stdout.write(
+                f"{name}: {rate:.1f} pages/s, {total['rss'] / 1024:.1f} MiB max peak RSS "
+                f"(+{total['growth'] / 1024:.1f} MiB while parsing), "
+                f"mean similarity {mean}"
+            )
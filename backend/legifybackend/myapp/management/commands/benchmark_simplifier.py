@@ -0,0 +1,301 @@
+"""
+Benchmark the InLegalBERT simplifier on a fixed corpus.
+
+    python manage.py benchmark_simplifier level3
+    python manage.py benchmark_simplifier level3 path/to/texts --repeat 3
+    python manage.py benchmark_simplifier backends --backends fp32,int8,onnx
+    python manage.py benchmark_simplifier glossary --sizes 15,1000,10000
+
+level3 runs level-3 simplification the original way (one fill-mask pipeline
+call per long word) and the batched, memoized way, from a cold and from a
+warm prediction cache, and reports time, model forward passes and how many
+output words the two agree on.
+
+backends loads the model under each inference backend (see
+inference_backends) in a fresh subprocess and reports load time, RSS growth,
+latency per single prediction and per batch of FILL_MASK_MAX_BATCH, and
+top-1 / top-5 agreement with fp32 over every long word of the corpus.
+
+glossary pads the real glossary with generated terms up to each size and
+times the compiled single-pass replacement against the previous per-term
+re.sub loop (per sentence, as simplify_text used to run it).  It needs no
+model.
+
+Without a corpus argument the bundled
+data/legal_sample.txt is used.
+"""
+
+import multiprocessing
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utilities import inference_backends, model_registry
+from myapp.utilities.glossary import Glossary, replace_terms_loop
+
+from .benchmark_extractors import _peak_rss_kib
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "data" / "legal_sample.txt"
+
+
+def _load_corpus(corpus):
+    path = Path(corpus) if corpus else DEFAULT_CORPUS
+    if path.is_dir():
+        files = sorted(path.rglob("*.txt"))
+    elif path.is_file():
+        files = [path]
+    else:
+        raise CommandError(f"{path} does not exist")
+    if not files:
+        raise CommandError(f"No .txt files found in {path}")
+    return [f.read_text(encoding="utf-8", errors="replace") for f in files]
+
+
+class _CallCounter:
+    """Wraps a callable and counts calls (and items, for batched calls)."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.calls = 0
+        self.items = 0
+
+    def __call__(self, inputs, *args, **kwargs):
+        self.calls += 1
+        self.items += len(inputs) if isinstance(inputs, list) else 1
+        return self.fn(inputs, *args, **kwargs)
+
+
+def word_agreement(text, reference):
+    """Fraction of word positions at which two outputs agree."""
+    words, reference_words = text.split(), reference.split()
+    if not words and not reference_words:
+        return 1.0
+    same = sum(1 for a, b in zip(words, reference_words) if a == b)
+    return same / max(len(words), len(reference_words))
+
+
+def _masked_sentences(texts, mask_token, limit):
+    """One masked copy of each sentence per word longer than 7 letters, up to *limit*."""
+    masked = []
+    for text in texts:
+        for sentence in re.split(r"(?<=[.!?])\s+", text):
+            words = sentence.split()
+            for i, word in enumerate(words):
+                if len(word) > 7 and word.isalpha():
+                    masked.append(" ".join(words[:i] + [mask_token] + words[i + 1:]))
+                    if len(masked) >= limit:
+                        return masked
+    return masked
+
+
+def _run_inference_backend(model_name, backend, texts, limit):
+    """
+    Subprocess worker for one backend: (load seconds, RSS growth KiB, seconds
+    per single prediction, seconds per batched prediction, predicted token ids).
+    """
+    from transformers import AutoTokenizer
+
+    from myapp.utilities.fill_mask_batcher import FillMaskBatcher
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    masked = _masked_sentences(texts, tokenizer.mask_token, limit)
+
+    baseline = _peak_rss_kib()
+    started = time.perf_counter()
+    model, device = inference_backends.load_masked_lm(model_name, backend)
+    batcher = FillMaskBatcher(model, tokenizer, device=device)
+    batcher._predict(masked[:1])  # warm-up
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for text in masked:
+        batcher._predict([text])
+    single = (time.perf_counter() - started) / len(masked)
+
+    started = time.perf_counter()
+    predictions = []
+    for start in range(0, len(masked), batcher.max_batch_size):
+        predictions.extend(batcher._predict(masked[start:start + batcher.max_batch_size]))
+    batched = (time.perf_counter() - started) / len(masked)
+
+    peak = _peak_rss_kib()
+    growth = peak - baseline if peak is not None else None
+    return load_seconds, growth, single, batched, [[p["token"] for p in top] for top in predictions]
+
+
+def _synthetic_terms(count):
+    """*count* made-up multi-word terms that do not occur in real text."""
+    return {f"zq{i:05d} clause{i % 7}": f"term {i}" for i in range(count)}
+
+
+def top_k_agreement(predictions, reference):
+    """(fraction of identical top-1 tokens, mean top-k overlap) against *reference*."""
+    if not reference:
+        return 1.0, 1.0
+    top1 = sum(1 for got, want in zip(predictions, reference) if got[:1] == want[:1])
+    overlap = sum(len(set(got) & set(want)) / len(want) for got, want in zip(predictions, reference))
+    return top1 / len(reference), overlap / len(reference)
+
+
+class Command(BaseCommand):
+    help = "Benchmark InLegalBERT simplification on a fixed corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["level3", "backends", "glossary"])
+        parser.add_argument("corpus", nargs="?", help="File or directory of .txt files (default: bundled sample)")
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument(
+            "--backends",
+            help=f"Comma-separated inference backends (default: all installed of {', '.join(inference_backends.BACKENDS)})",
+        )
+        parser.add_argument("--model", help="Model name or directory (default: LEGALBERT_MODEL)")
+        parser.add_argument("--limit", type=int, default=200, help="Masked sentences per backend (default: 200)")
+        parser.add_argument(
+            "--sizes", default="15,100,1000,5000", help="Glossary sizes to time (default: 15,100,1000,5000)"
+        )
+
+    def handle(self, *args, **options):
+        texts = _load_corpus(options["corpus"])
+        self.stdout.write(f"Corpus: {len(texts)} text(s), {sum(len(t) for t in texts)} chars")
+        if options["kind"] == "backends":
+            self._benchmark_backends(texts, options)
+        elif options["kind"] == "glossary":
+            sizes = [int(size) for size in options["sizes"].split(",")]
+            self._benchmark_glossary(texts, sizes, max(1, options["repeat"]))
+        else:
+            self._benchmark_level3(texts, max(1, options["repeat"]))
+
+    def _simplifier(self):
+        try:
+            return model_registry.get("inlegalbert")
+        except Exception as e:
+            raise CommandError(f"InLegalBERT could not be loaded: {e}")
+
+    # ── level 3 ──────────────────────────────────────────────────────────────
+
+    def _run(self, simplifier, texts, sequential, repeat, clear_cache):
+        best = None
+        outputs = []
+        for _ in range(repeat):
+            if clear_cache:
+                simplifier._prediction_cache.clear()
+            started = time.perf_counter()
+            outputs = [simplifier.simplify_text(text, level=3, sequential=sequential) for text in texts]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, outputs
+
+    def _benchmark_level3(self, texts, repeat):
+        simplifier = self._simplifier()
+
+        pipeline_counter = _CallCounter(simplifier.fill_mask)
+        batch_counter = _CallCounter(simplifier.batcher._predict)
+        simplifier.fill_mask = pipeline_counter
+        simplifier.batcher._predict = batch_counter
+        try:
+            # Warm-up so neither variant pays for lazy initialisation
+            simplifier.simplify_text(texts[0][:200], level=3, sequential=True)
+            simplifier.simplify_text(texts[0][:200], level=3)
+
+            rows = []
+            for label, sequential, clear_cache in (
+                ("sequential", True, True),
+                ("batched, cold cache", False, True),
+                ("batched, warm cache", False, False),
+            ):
+                counter = pipeline_counter if sequential else batch_counter
+                counter.calls = counter.items = 0
+                seconds, outputs = self._run(simplifier, texts, sequential, repeat, clear_cache)
+                rows.append((label, seconds, counter.calls // repeat, counter.items // repeat, outputs))
+        finally:
+            simplifier.fill_mask = pipeline_counter.fn
+            simplifier.batcher._predict = batch_counter.fn
+
+        reference = rows[0][4]
+        self.stdout.write(f"{'variant':22} {'seconds':>9} {'forward passes':>15} {'predictions':>12} {'agreement':>10}")
+        for label, seconds, calls, items, outputs in rows:
+            agreement = sum(word_agreement(o, r) for o, r in zip(outputs, reference)) / len(reference)
+            self.stdout.write(f"{label:22} {seconds:9.3f} {calls:15} {items:12} {agreement:10.3f}")
+
+        speedup = rows[0][1] / rows[1][1] if rows[1][1] else 0
+        self.stdout.write(self.style.SUCCESS(f"Batched (cold) is {speedup:.1f}x the sequential speed"))
+
+    # ── Inference backends ───────────────────────────────────────────────────
+
+    def _benchmark_backends(self, texts, options):
+        model_name = options["model"] or settings.LEGALBERT_MODEL
+        names = options["backends"].split(",") if options["backends"] else inference_backends.available_backends()
+        unknown = [name for name in names if name not in inference_backends.available_backends()]
+        if unknown:
+            raise CommandError(f"Unknown or unavailable backends: {', '.join(unknown)}")
+        if "fp32" not in names:
+            names = ["fp32"] + names  # the reference for agreement
+
+        # "spawn" and one process per backend, so each RSS figure belongs to one model
+        context = multiprocessing.get_context("spawn")
+        results = {}
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[name] = pool.submit(
+                    _run_inference_backend, model_name, name, texts, max(1, options["limit"])
+                ).result()
+
+        reference = results["fp32"][4]
+        self.stdout.write(f"Model: {model_name}, {len(reference)} masked sentences")
+        self.stdout.write(
+            f"{'backend':8} {'load s':>8} {'RSS growth MiB':>15} {'ms/single':>10} {'ms/batched':>11} "
+            f"{'top-1':>6} {'top-5':>6}"
+        )
+        for name, (load_seconds, growth, single, batched, predictions) in results.items():
+            top1, overlap = top_k_agreement(predictions, reference)
+            self.stdout.write(
+                f"{name:8} {load_seconds:8.2f} {(growth or 0) / 1024:15.1f} {single * 1000:10.2f} "
+                f"{batched * 1000:11.2f} {top1:6.3f} {overlap:6.3f}"
+            )
+
+    # ── Glossary ─────────────────────────────────────────────────────────────
+
+    def _benchmark_glossary(self, texts, sizes, repeat):
+        real_terms = Glossary().terms
+        if not real_terms:
+            raise CommandError("The glossary (LEGAL_GLOSSARY_PATH) is empty or could not be loaded")
+        sentences = [
+            [sentence for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence] for text in texts
+        ]
+
+        def best_of(fn):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            return best
+
+        self.stdout.write(
+            f"{'terms':>7} {'loop ms':>10} {'compile ms':>11} {'single-pass ms':>15} {'speedup':>8} {'same':>5}"
+        )
+        for size in sizes:
+            terms = dict(real_terms)
+            terms.update(_synthetic_terms(max(0, size - len(real_terms))))
+
+            loop_seconds = best_of(
+                lambda: [[replace_terms_loop(sentence, terms) for sentence in doc] for doc in sentences]
+            )
+            started = time.perf_counter()
+            glossary = Glossary(terms=terms)
+            compile_seconds = time.perf_counter() - started
+            engine_seconds = best_of(lambda: [glossary.replace(text) for text in texts])
+
+            # The loop lower-cases replacements; the engine keeps the original case
+            same = all(
+                glossary.replace(text).lower() == replace_terms_loop(text, terms).lower() for text in texts
+            )
+            self.stdout.write(
+                f"{len(terms):7} {loop_seconds * 1000:10.1f} {compile_seconds * 1000:11.1f} "
+                f"{engine_seconds * 1000:15.2f} {loop_seconds / engine_seconds:7.0f}x {'yes' if same else 'NO':>5}"
+            )
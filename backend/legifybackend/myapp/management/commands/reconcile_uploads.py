@@ -0,0 +1,104 @@
+"""
+Reconcile the uploads store with the database.
+
+    python manage.py reconcile_uploads                 # report only
+    python manage.py reconcile_uploads --delete-files  # remove files no row points to
+    python manage.py reconcile_uploads --delete-rows   # remove rows whose file is gone
+
+Orphan files are files under MEDIA_ROOT/uploads that no ``UserFile.file_path``
+refers to (e.g. left behind when a background removal failed); orphan rows
+are ``UserFile`` rows whose file is missing.  Both passes work in batches of
+``--batch-size`` and print progress as they go.  Files younger than
+``--min-age`` seconds and in-progress ``.part`` uploads are never treated as
+orphans, since their row may not have been created yet.
+"""
+
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.models import UserFile
+from myapp.utilities.storage import iter_upload_files, remove_files, uploads_root
+
+
+class Command(BaseCommand):
+    help = "Find (and optionally delete) upload files without rows and rows without files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete-files", action="store_true", help="Delete orphan files")
+        parser.add_argument("--delete-rows", action="store_true", help="Delete rows whose file is missing")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Ignore files modified less than this many seconds ago (default: 3600)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        orphan_files = self._orphan_files(batch_size, options["min_age"], options["delete_files"])
+        orphan_rows = self._orphan_rows(batch_size, options["delete_rows"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{orphan_files} orphan file(s){' deleted' if options['delete_files'] else ''}, "
+            f"{orphan_rows} orphan row(s){' deleted' if options['delete_rows'] else ''}"
+        ))
+
+    # ── Files without rows ───────────────────────────────────────────────────
+
+    def _orphan_files(self, batch_size, min_age, delete):
+        self.stdout.write(f"Scanning {uploads_root()} for files without rows...")
+        cutoff = time.time() - min_age
+        scanned = orphans = 0
+        batch = []
+
+        def flush():
+            nonlocal orphans
+            known = set(UserFile.objects.filter(file_path__in=batch).values_list("file_path", flat=True))
+            missing = [path for path in batch if path not in known]
+            orphans += len(missing)
+            for path in missing:
+                self.stdout.write(f"  orphan file: {path}")
+            if delete and missing:
+                remove_files(missing)
+            batch.clear()
+            self.stdout.write(f"  {scanned} files scanned, {orphans} orphans so far")
+
+        for path, entry in iter_upload_files():
+            if path.endswith(".part") or entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+            scanned += 1
+            batch.append(path)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return orphans
+
+    # ── Rows without files ───────────────────────────────────────────────────
+
+    def _orphan_rows(self, batch_size, delete):
+        self.stdout.write("Checking UserFile rows for missing files...")
+        rows = UserFile.objects.order_by("id").values_list("id", "file_path")
+        checked = orphans = 0
+        last_id = 0
+
+        while True:
+            # Keyset over id, so deleting rows does not shift later batches
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            checked += len(batch)
+
+            missing = [file_id for file_id, path in batch if not os.path.exists(path)]
+            orphans += len(missing)
+            for file_id in missing:
+                self.stdout.write(f"  orphan row: UserFile {file_id}")
+            if delete and missing:
+                UserFile.objects.filter(id__in=missing).delete()
+            self.stdout.write(f"  {checked} rows checked, {orphans} orphans so far")
+
+        return orphans
@@ -0,0 +1,90 @@
+"""
+Move uploads from the flat ``MEDIA_ROOT/uploads/`` directory into the hashed
+fan-out layout (see ``utilities/storage.py``) and update ``UserFile.file_path``.
+
+    python manage.py shard_uploads --dry-run
+    python manage.py shard_uploads --batch-size 500
+
+Each file's target follows from the name it is stored under (the basename
+of ``file_path``, which for new uploads carries a random prefix that
+``file_name`` lacks), so rows already at their sharded path are skipped and
+a file is never moved onto another one: when the target exists and the
+source does too, the row is reported as a conflict and left alone.
+
+Rows are processed in id order, ``--batch-size`` at a time: the batch's files
+are moved first, then its paths are written with one bulk update.  If the
+command is interrupted between the two, re-running it finds the files
+already in place and only updates the rows.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from myapp.models import UserFile
+from myapp.utilities.storage import upload_path
+
+
+class Command(BaseCommand):
+    help = "Move uploads into hashed subdirectories and rewrite UserFile.file_path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Report what would move")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        dry_run = options["dry_run"]
+        rows = UserFile.objects.order_by("id").only("id", "file_name", "file_path")
+
+        checked = moved = missing = conflicts = 0
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            checked += len(batch)
+
+            updated = []
+            for user_file in batch:
+                target = upload_path(os.path.basename(user_file.file_path))
+                if user_file.file_path == target:
+                    continue
+
+                if os.path.exists(user_file.file_path):
+                    if os.path.exists(target):
+                        # Another file already lives there; never overwrite it
+                        conflicts += 1
+                        self.stdout.write(
+                            f"  target exists for UserFile {user_file.id}, not moving: {user_file.file_path} -> {target}"
+                        )
+                        continue
+                    if not dry_run:
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        # Reserve the target exclusively (as save_upload does), so a
+                        # file created there since the check above is not replaced
+                        try:
+                            os.close(os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                        except FileExistsError:
+                            conflicts += 1
+                            self.stdout.write(f"  target exists for UserFile {user_file.id}, not moving: {target}")
+                            continue
+                        os.replace(user_file.file_path, target)
+                elif not os.path.exists(target):
+                    # Neither copy exists; leave the row for reconcile_uploads
+                    missing += 1
+                    self.stdout.write(f"  missing file for UserFile {user_file.id}: {user_file.file_path}")
+                    continue
+
+                user_file.file_path = target
+                updated.append(user_file)
+
+            moved += len(updated)
+            if updated and not dry_run:
+                UserFile.objects.bulk_update(updated, ["file_path"])
+            self.stdout.write(f"  {checked} rows checked, {moved} {'to move' if dry_run else 'moved'}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} file(s) {'would be moved' if dry_run else 'moved'}, {missing} missing, {conflicts} conflicting"
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_processingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField(default=2)),
+                ('pipeline_version', models.CharField(max_length=32)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('summary_text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='myapp.userfile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_file', 'level', 'pipeline_version'), name='unique_summary_per_file_level_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_content_hash_documentartifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfile',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userfile',
+            name='mime_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
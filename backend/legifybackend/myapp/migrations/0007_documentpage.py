@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_userfile_mime_type_file_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('char_start', models.PositiveIntegerField()),
+                ('char_end', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True, default='')),
+                ('user_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='myapp.userfile')),
+            ],
+            options={
+                'ordering': ['user_file', 'page_number'],
+                'constraints': [models.UniqueConstraint(fields=('user_file', 'page_number'), name='unique_page_per_file')],
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+"""
+Store extracted text compressed.
+
+Adds compressed columns next to the TextField ones, copies every row across
+in batches, drops the old columns and renames the new ones into place.
+"""
+
+from django.db import migrations
+
+import myapp.fields
+
+BATCH_SIZE = 200
+
+MODELS = ('UserFile', 'DocumentArtifact')
+
+
+def _copy(apps, source, target):
+    for model_name in MODELS:
+        model = apps.get_model('myapp', model_name)
+        rows = model.objects.exclude(**{f'{source}__isnull': True}).only('pk', source)
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            setattr(row, target, getattr(row, source))
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, [target])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, [target])
+
+
+def compress_rows(apps, schema_editor):
+    _copy(apps, 'extracted_text', 'extracted_text_compressed')
+
+
+def decompress_rows(apps, schema_editor):
+    _copy(apps, 'extracted_text_compressed', 'extracted_text')
+
+
+def skip_toast_compression(apps, schema_editor):
+    # The bytes are already compressed; stop Postgres from trying again
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name in MODELS:
+        table = apps.get_model('myapp', model_name)._meta.db_table
+        schema_editor.execute(
+            f'ALTER TABLE {schema_editor.quote_name(table)} '
+            f'ALTER COLUMN {schema_editor.quote_name("extracted_text")} SET STORAGE EXTERNAL'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_documentpage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfile',
+            name='extracted_text_compressed',
+            field=myapp.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentartifact',
+            name='extracted_text_compressed',
+            field=myapp.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+        migrations.RemoveField(
+            model_name='userfile',
+            name='extracted_text',
+        ),
+        migrations.RemoveField(
+            model_name='documentartifact',
+            name='extracted_text',
+        ),
+        migrations.RenameField(
+            model_name='userfile',
+            old_name='extracted_text_compressed',
+            new_name='extracted_text',
+        ),
+        migrations.RenameField(
+            model_name='documentartifact',
+            old_name='extracted_text_compressed',
+            new_name='extracted_text',
+        ),
+        migrations.RunPython(skip_toast_compression, migrations.RunPython.noop),
+    ]
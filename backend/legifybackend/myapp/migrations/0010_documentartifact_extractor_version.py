@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_userfile_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentartifact',
+            name='extractor_version',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
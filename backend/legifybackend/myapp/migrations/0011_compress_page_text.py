@@ -0,0 +1,72 @@
+"""
+Store page text compressed.
+
+Same steps as 0008: add a compressed column next to the TextField, copy
+every row across in batches, drop the old column and rename the new one
+into place.
+"""
+
+from django.db import migrations
+
+import myapp.fields
+
+BATCH_SIZE = 200
+
+
+def _copy(apps, source, target):
+    model = apps.get_model('myapp', 'DocumentPage')
+    rows = model.objects.only('pk', source)
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        setattr(row, target, getattr(row, source) or '')
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, [target])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, [target])
+
+
+def compress_rows(apps, schema_editor):
+    _copy(apps, 'text', 'text_compressed')
+
+
+def decompress_rows(apps, schema_editor):
+    _copy(apps, 'text_compressed', 'text')
+
+
+def skip_toast_compression(apps, schema_editor):
+    # The bytes are already compressed; stop Postgres from trying again
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('myapp', 'DocumentPage')._meta.db_table
+    schema_editor.execute(
+        f'ALTER TABLE {schema_editor.quote_name(table)} '
+        f'ALTER COLUMN {schema_editor.quote_name("text")} SET STORAGE EXTERNAL'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_documentartifact_extractor_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentpage',
+            name='text_compressed',
+            field=myapp.fields.CompressedTextField(blank=True, default=''),
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+        migrations.RemoveField(
+            model_name='documentpage',
+            name='text',
+        ),
+        migrations.RenameField(
+            model_name='documentpage',
+            old_name='text_compressed',
+            new_name='text',
+        ),
+        migrations.RunPython(skip_toast_compression, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+"""
+Record the hash of each file's extracted text next to it.
+
+Existing rows are hashed in batches; files without text keep ''.
+"""
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 200
+
+
+def hash_texts(apps, schema_editor):
+    model = apps.get_model('myapp', 'UserFile')
+    rows = model.objects.exclude(extracted_text__isnull=True).only('pk', 'extracted_text')
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        if not row.extracted_text:
+            continue
+        row.text_hash = hashlib.sha256(row.extracted_text.encode('utf-8')).hexdigest()
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, ['text_hash'])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['text_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_compress_page_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfile',
+            name='text_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(hash_texts, migrations.RunPython.noop),
+    ]
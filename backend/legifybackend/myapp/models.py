@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User  # Import Django's built-in User model
 
+from .fields import CompressedTextField
+
 # Create your models here.
 class UserFile(models.Model):
     # Link to the user who uploaded the file
@@ -9,14 +11,26 @@ class UserFile(models.Model):
     # Name of the file (e.g., "example.pdf")
     file_name = models.CharField(max_length=255)
 
-    # Path to the file in the media folder (e.g., "uploads/1_20231025_143000_example.pdf")
+    # Path to the file in the media folder (e.g., "uploads/3f/a2/1_20231025_143000_example.pdf";
+    # see utilities/storage.py for the fan-out)
     file_path = models.CharField(max_length=255)
 
     # Timestamp of when the file was uploaded
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
-    # Optional: Store the extracted text (if needed)
-    extracted_text = models.TextField(blank=True, null=True)
+    # Optional: Store the extracted text (if needed); kept compressed on disk
+    extracted_text = CompressedTextField(blank=True, null=True)
+
+    # SHA-256 of extracted_text, set with it (see summary_store.set_extracted_text) so
+    # summaries can be looked up without decompressing the text; '' until extracted
+    text_hash = models.CharField(max_length=64, blank=True, default='')
+
+    # SHA-256 of the uploaded bytes; links byte-identical uploads to one DocumentArtifact
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+
+    # MIME type sniffed from the first bytes and size in bytes, recorded while streaming the upload
+    mime_type = models.CharField(max_length=100, blank=True, default='')
+    file_size = models.BigIntegerField(blank=True, null=True)
 
     def __str__(self):
         """String representation of the model."""
@@ -25,6 +39,10 @@ class UserFile(models.Model):
     class Meta:
         # Order files by upload time (newest first)
         ordering = ['-uploaded_at']
+        indexes = [
+            # Keyset pagination of a user's history (see views.file_history)
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='userfile_user_uploaded_idx'),
+        ]
 
 
 class PasswordResetOTP(models.Model):
@@ -38,3 +56,133 @@ class PasswordResetOTP(models.Model):
 
 
 
+
+
+class ProcessingJob(models.Model):
+    """A staged background job that turns an uploaded file into text, summary and entities."""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    # Stages run in this order; each one gets an entry in `stages`
+    STAGES = ('extract', 'simplify', 'summarize', 'ner')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='processing_jobs')
+    user_file = models.ForeignKey(UserFile, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    current_stage = models.CharField(max_length=32, blank=True, default='')
+
+    # Per-stage progress, e.g. {"extract": {"status": "done", "duration_ms": 812}, ...}
+    stages = models.JSONField(default=dict, blank=True)
+
+    # Stage outputs that are not stored on UserFile (summary, entities)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job {self.id} for {self.user_file.file_name} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class DocumentSummary(models.Model):
+    """A generated summary, stored so reopening a document does not re-run the model and Gemini."""
+
+    user_file = models.ForeignKey(UserFile, on_delete=models.CASCADE, related_name='summaries')
+
+    # Simplification level passed to summarize_text (1-3)
+    level = models.PositiveSmallIntegerField(default=2)
+
+    # summary_pipeline_version() at generation time (SUMMARY_PIPELINE_VERSION plus the
+    # glossary's fingerprint); bumping either invalidates old rows
+    pipeline_version = models.CharField(max_length=32)
+
+    # SHA-256 of the extracted text that was summarised (also used to share
+    # summaries between files with identical text)
+    text_hash = models.CharField(max_length=64, db_index=True)
+
+    summary_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of {self.user_file.file_name} (level {self.level}, v{self.pipeline_version})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_file', 'level', 'pipeline_version'],
+                name='unique_summary_per_file_level_version',
+            ),
+        ]
+
+
+class DocumentArtifact(models.Model):
+    """
+    Derived data shared by every upload with the same bytes, so extraction and
+    NER run once per distinct file rather than once per upload.
+    """
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    extracted_text = CompressedTextField(blank=True, null=True)
+
+    # text_extractor.EXTRACTOR_VERSION that produced extracted_text; text from
+    # any other version is ignored and re-extracted ('' = before versions were stored)
+    extractor_version = models.CharField(max_length=32, blank=True, default='')
+
+    # Output of extract_legal_entities; null until NER has run
+    entities = models.JSONField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Artifact {self.content_hash[:12]}"
+
+
+class DocumentPage(models.Model):
+    """
+    One page of a file's extracted text, so callers that need a few pages
+    (chat context, NER, page-range views) do not load the whole document.
+
+    PDF pages are the physical pages; formats without pages are split into
+    chunks of about DOCUMENT_PAGE_CHARS characters at line breaks.
+    """
+
+    user_file = models.ForeignKey(UserFile, on_delete=models.CASCADE, related_name='pages')
+
+    # 1-based page number
+    page_number = models.PositiveIntegerField()
+
+    # Offsets of this page in UserFile.extracted_text (end exclusive)
+    char_start = models.PositiveIntegerField()
+    char_end = models.PositiveIntegerField()
+
+    # Compressed like UserFile.extracted_text, so pages do not add an
+    # uncompressed second copy of every document
+    text = CompressedTextField(blank=True, default='')
+
+    def __str__(self):
+        return f"{self.user_file.file_name} page {self.page_number}"
+
+    class Meta:
+        ordering = ['user_file', 'page_number']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_file', 'page_number'],
+                name='unique_page_per_file',
+            ),
+        ]
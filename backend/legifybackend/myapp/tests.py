@@ -1,3 +1,2172 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import PyPDF2
+import docx
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from . import fields
+from .models import DocumentArtifact, DocumentPage, DocumentSummary, ProcessingJob, UserFile
+from .utilities import (
+    extraction_cache,
+    inference_backends,
+    jobs,
+    model_registry,
+    pdf_backends,
+    pipeline,
+    summary_store,
+    storage,
+    tesseract_ocr,
+    text_extractor,
+)
+from .utilities.fill_mask_batcher import FillMaskBatcher
+from .utilities.glossary import Glossary, replace_terms_loop
+from .utilities.pages import parse_page_range, split_pages, store_pages
+
+
+# ================= GEMINI OCR =================
+
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for generateContent: answers with the label of each page of the
+    PDF it receives, separated as the prompt asks, or with a single
+    "<first page> +<further pages>" when the server's ``merge_pages`` is set.
+    """
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        payload = json.loads(self._read_body())
+        inline = payload["contents"][0]["parts"][0]["inlineData"]
+        reader = PyPDF2.PdfReader(io.BytesIO(base64.b64decode(inline["data"])))
+        first_page = _page_label(reader.pages[0])
+
+        server = self.server
+        with server.lock:
+            server.requests.append(first_page)
+            fail = first_page in server.fail_once
+            server.fail_once.discard(first_page)
+
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        if server.merge_pages:
+            text = f"{first_page} +{len(reader.pages) - 1}"
+        else:
+            separator = f"\n{text_extractor._OCR_PAGE_SEPARATOR}\n"
+            text = separator.join(_page_label(page) for page in reader.pages)
+        body = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+def _make_pdf(path, page_count):
+    """Write a blank PDF whose page N (1-based) is 100 + N points wide."""
+    writer = PyPDF2.PdfWriter()
+    for number in range(1, page_count + 1):
+        writer.add_blank_page(width=100 + number, height=200)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def _page_label(page):
+    return f"p{int(page.mediabox.width) - 100}"
+
+
+class ChunkedGeminiOCRTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGeminiHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.fail_once = set()
+        self.server.merge_pages = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.settings_override = override_settings(
+            GEMINI_API_BASE=f"http://127.0.0.1:{self.server.server_port}",
+            GEMINI_OCR_PAGES_PER_CHUNK=3,
+            GEMINI_OCR_CONCURRENCY=2,
+            GEMINI_OCR_RETRIES=1,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        # No real backoff between retry rounds
+        sleep_patch = mock.patch.object(text_extractor.time, "sleep")
+        sleep_patch.start()
+        self.addCleanup(sleep_patch.stop)
+
+    def _pdf(self, page_count):
+        handle = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        _make_pdf(handle.name, page_count)
+        return handle.name
+
+    def test_pages_are_split_into_ranges_and_returned_in_order(self):
+        path = self._pdf(8)
+
+        results = text_extractor.ocr_pdf_pages(path, range(8))
+
+        self.assertEqual(results, [(number, f"p{number + 1}") for number in range(8)])
+        self.assertEqual(sorted(self.server.requests), ["p1", "p4", "p7"])
+
+    def test_reply_without_page_separators_is_ocrd_page_by_page(self):
+        path = self._pdf(4)
+        self.server.merge_pages = True
+
+        results = text_extractor.ocr_pdf_pages(path, range(4))
+
+        self.assertEqual(results, [(number, f"p{number + 1} +0") for number in range(4)])
+        self.assertEqual(sorted(self.server.requests), ["p1", "p1", "p2", "p3", "p4"])
+
+    def test_only_failed_ranges_are_retried(self):
+        path = self._pdf(8)
+        self.server.fail_once.add("p4")
+
+        results = text_extractor.ocr_pdf_pages(path, range(8))
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(sorted(self.server.requests), ["p1", "p4", "p4", "p7"])
+
+    def test_ranges_that_keep_failing_are_left_out(self):
+        path = self._pdf(6)
+        with override_settings(GEMINI_OCR_RETRIES=0):
+            self.server.fail_once.add("p1")
+            results = text_extractor.ocr_pdf_pages(path, range(6))
+
+        self.assertEqual([number for number, _ in results], [3, 4, 5])
+
+    def test_scattered_pages_are_grouped_by_run(self):
+        path = self._pdf(8)
+
+        results = text_extractor.ocr_pdf_pages(path, [6, 0, 1])
+
+        self.assertEqual(results, [(0, "p1"), (1, "p2"), (6, "p7")])
+        self.assertEqual(sorted(self.server.requests), ["p1", "p7"])
+
+    def test_long_pdf_is_ocrd_in_chunks(self):
+        path = self._pdf(7)
+
+        text = text_extractor.extract_text_via_gemini(path, "application/pdf")
+
+        self.assertEqual(text, text_extractor.PAGE_BREAK.join(f"p{number}" for number in range(1, 8)))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_pdf_with_a_failed_range_fails_instead_of_dropping_pages(self):
+        path = self._pdf(7)
+        self.server.fail_once.add("p4")
+
+        with override_settings(GEMINI_OCR_RETRIES=0), self.assertRaisesMessage(Exception, "3 of 7 PDF pages: 4-6"):
+            text_extractor.extract_text_via_gemini(path, "application/pdf")
+
+    def test_scanned_pages_that_cannot_be_ocrd_fail_the_extraction(self):
+        path = self._pdf(3)
+        self.server.fail_once.add("p2")
+        layer = "A text layer long enough not to count as scanned. " * 4
+        pages = [(layer, False), ("", True), ("", True)]
+
+        with mock.patch.object(text_extractor, "_iter_pdf_page_info", return_value=iter(pages)), \
+                mock.patch.object(text_extractor, "ocr_whole_pdf") as ocr_whole_pdf, \
+                override_settings(OCR_ENGINE_ORDER=["gemini"], GEMINI_OCR_RETRIES=0):
+            with self.assertRaisesMessage(ValidationError, "OCR failed for scanned PDF pages 2-3"):
+                text_extractor.extract_text_from_pdf(path)
+        # Only the scanned pages were sent, never the whole document
+        ocr_whole_pdf.assert_not_called()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_scanned_pages_keep_their_own_text(self):
+        path = self._pdf(6)
+        layer = "A text layer long enough not to count as scanned. " * 4
+        pages = [(layer, False), ("", True), ("", True), ("", True), (layer, True), ("", True)]
+
+        with mock.patch.object(text_extractor, "_iter_pdf_page_info", return_value=iter(pages)), \
+                override_settings(OCR_ENGINE_ORDER=["gemini"]):
+            text = text_extractor.extract_text_from_pdf(path)
+
+        self.assertEqual(
+            text.split(text_extractor.PAGE_BREAK),
+            [layer, "p2", "p3", "p4", layer, "p6"],
+        )
+
+
+# ================= PAGES =================
+
+
+class PageSplitTests(SimpleTestCase):
+    def test_pdf_text_is_split_on_page_breaks_keeping_empty_pages(self):
+        text = "one\fsecond page\f\ffour"
+
+        spans = split_pages(text)
+
+        self.assertEqual([text[start:end] for start, end in spans], ["one", "second page", "", "four"])
+
+    def test_text_without_pages_is_chunked_at_line_breaks(self):
+        text = "aaaa\nbbbb\ncccccccccc"
+
+        spans = split_pages(text, max_chars=7)
+
+        self.assertEqual([text[start:end] for start, end in spans], ["aaaa\n", "bbbb\n", "ccccccc", "ccc"])
+
+    def test_page_ranges(self):
+        self.assertEqual(parse_page_range("3"), (3, 3))
+        self.assertEqual(parse_page_range("3-5"), (3, 5))
+        self.assertEqual(parse_page_range("3-"), (3, None))
+        self.assertIsNone(parse_page_range(""))
+        for value in ("0", "5-3", "x", "-2"):
+            with self.assertRaises(ValueError):
+                parse_page_range(value)
+
+
+# ================= PDF EXTRACTION =================
+
+
+def _make_text_pdf(path, page_count):
+    """Write a PDF whose page N (1-based) reads "Page N of the lease"."""
+    document = pdf_backends.fitz.open()
+    for number in range(1, page_count + 1):
+        document.new_page().insert_text((72, 72), f"Page {number} of the lease")
+    document.save(path)
+    document.close()
+
+
+@override_settings(PDF_BACKEND="pypdf2", PDF_PARALLEL_MIN_PAGES=8, PDF_PAGES_PER_TASK=3, PDF_EXTRACT_WORKERS=3)
+class ParallelPdfExtractionTests(SimpleTestCase):
+    def setUp(self):
+        if pdf_backends.fitz is None:
+            self.skipTest("PyMuPDF is needed to write test PDFs with text")
+        handle = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        self.path = handle.name
+
+        pool_patch = mock.patch.object(text_extractor, "_pdf_pool", None)
+        pool_patch.start()
+        self.addCleanup(pool_patch.stop)
+        self.addCleanup(lambda: text_extractor._pdf_pool and text_extractor._pdf_pool.shutdown())
+
+    def test_pages_come_back_in_order_from_the_shared_pool(self):
+        _make_text_pdf(self.path, 20)
+
+        pages = list(text_extractor.iter_pdf_pages(self.path))
+
+        self.assertEqual(len(pages), 20)
+        for number, text in enumerate(pages, start=1):
+            self.assertIn(f"Page {number} of the lease", text)
+        self.assertEqual(pages, list(text_extractor.iter_pdf_pages(self.path, workers=1)))
+
+    def test_pool_is_created_once_and_reused(self):
+        _make_text_pdf(self.path, 9)
+
+        list(text_extractor.iter_pdf_pages(self.path))
+        pool = text_extractor._pdf_pool
+        with mock.patch.object(text_extractor, "ProcessPoolExecutor") as new_pool:
+            list(text_extractor.iter_pdf_pages(self.path))
+
+        self.assertIsNotNone(pool)
+        self.assertIs(text_extractor._pdf_pool, pool)
+        new_pool.assert_not_called()
+
+    def test_short_pdfs_do_not_start_the_pool(self):
+        _make_text_pdf(self.path, 7)
+
+        pages = list(text_extractor.iter_pdf_pages(self.path))
+
+        self.assertEqual(len(pages), 7)
+        self.assertIsNone(text_extractor._pdf_pool)
+
+    def test_broken_pool_is_replaced(self):
+        from concurrent.futures.process import BrokenProcessPool
+
+        _make_text_pdf(self.path, 9)
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool("worker killed")
+        text_extractor._pdf_pool = broken
+
+        with self.assertRaises(BrokenProcessPool):
+            list(text_extractor.iter_pdf_pages(self.path))
+        self.assertIsNone(text_extractor._pdf_pool)
+        broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+        self.assertEqual(len(list(text_extractor.iter_pdf_pages(self.path))), 9)
+
+
+# ================= FILL-MASK BATCHING =================
+
+
+def _tiny_masked_lm(directory):
+    """A small random BERT masked LM and tokenizer, built locally (no downloads)."""
+    import torch
+    from transformers import BertConfig, BertForMaskedLM, BertTokenizerFast
+
+    words = "the a lessee lessor shall pay rent court held that appeal was dismissed party agreement term".split()
+    vocab_path = os.path.join(directory, "vocab.txt")
+    with open(vocab_path, "w") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "."] + words))
+
+    torch.manual_seed(0)
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path)
+    config = BertConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+    )
+    return BertForMaskedLM(config).eval(), tokenizer
+
+
+class FillMaskBatcherTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.model, self.tokenizer = _tiny_masked_lm(directory)
+
+    def test_batched_predictions_match_the_fill_mask_pipeline(self):
+        from transformers import pipeline
+
+        fill_mask = pipeline("fill-mask", model=self.model, tokenizer=self.tokenizer, top_k=5, device=-1)
+        texts = [
+            "the lessee shall [MASK] rent .",
+            "the court held that the [MASK] was dismissed .",
+            "[MASK] .",
+        ]
+
+        batcher = FillMaskBatcher(self.model, self.tokenizer, max_batch_size=8, max_wait_ms=50)
+        batched = batcher.fill_many(texts)
+
+        for text, predictions in zip(texts, batched):
+            expected = fill_mask(text)
+            self.assertEqual([p["token"] for p in predictions], [p["token"] for p in expected])
+            for got, want in zip(predictions, expected):
+                self.assertAlmostEqual(got["score"], want["score"], places=5)
+
+    def test_concurrent_callers_share_forward_passes(self):
+        batcher = FillMaskBatcher(self.model, self.tokenizer, max_batch_size=4, max_wait_ms=200)
+        calls = []
+        predict = batcher._predict
+        batcher._predict = lambda texts: calls.append(len(texts)) or predict(texts)
+
+        results = [None] * 4
+
+        def caller(index):
+            results[index] = batcher.fill("the [MASK] shall pay .")
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [4])
+        self.assertTrue(all(len(result) == 5 for result in results))
+
+
+class BatchedSimplificationTests(SimpleTestCase):
+    def _simplifier(self):
+        from collections import OrderedDict
+
+        from .utilities.text_summarizer import LegalBertSimplifier
+
+        simplifier = LegalBertSimplifier.__new__(LegalBertSimplifier)
+        simplifier.tokenizer = mock.Mock(mask_token="[MASK]")
+        simplifier.batcher = mock.Mock()
+        simplifier.batcher.fill_many.side_effect = lambda keys: [[{"token_str": "deal", "score": 0.9}] for _ in keys]
+        simplifier.glossary = Glossary(terms={})
+        simplifier._prediction_cache = OrderedDict()
+        simplifier._prediction_cache_lock = threading.Lock()
+        return simplifier
+
+    def test_each_occurrence_is_masked_by_position(self):
+        simplifier = self._simplifier()
+
+        result = simplifier._model_based_simplification_batch(["the agreement binds the agreement"])
+
+        self.assertEqual(result, ["the deal binds the deal"])
+        (keys,), _ = simplifier.batcher.fill_many.call_args
+        self.assertEqual(keys, ["the [MASK] binds the agreement", "the agreement binds the [MASK]"])
+
+    def test_repeated_windows_are_predicted_once(self):
+        simplifier = self._simplifier()
+
+        simplifier._model_based_simplification_batch(["the agreement binds", "the agreement binds"])
+        simplifier._model_based_simplification_batch(["the agreement binds"])
+
+        self.assertEqual(simplifier.batcher.fill_many.call_count, 1)
+        (keys,), _ = simplifier.batcher.fill_many.call_args
+        self.assertEqual(keys, ["the [MASK] binds"])
+
+
+# ================= INFERENCE BACKENDS =================
+
+PARITY_SENTENCES = [
+    "The Lessee shall pay the [MASK] on or before the fifth day of each month.",
+    "The appeal is accordingly [MASK] with costs.",
+    "The High Court set aside the [MASK] of the trial court.",
+    "This Agreement shall be governed by the [MASK] of India.",
+    "The accused was [MASK] on bail by the Sessions Court.",
+    "Any dispute shall be referred to [MASK] under the Act.",
+    "The petitioner filed a writ [MASK] under Article 226.",
+    "The parties have [MASK] this agreement on the date written above.",
+]
+
+
+def _top_k_agreement(reference, predictions):
+    """(fraction of identical top-1 tokens, mean top-k overlap) between two runs of predictions."""
+    top1 = overlap = 0
+    for want, got in zip(reference, predictions):
+        want_tokens = [p["token"] for p in want]
+        got_tokens = [p["token"] for p in got]
+        top1 += want_tokens[0] == got_tokens[0]
+        overlap += len(set(want_tokens) & set(got_tokens)) / len(want_tokens)
+    return top1 / len(reference), overlap / len(reference)
+
+
+class InferenceBackendParityTests(SimpleTestCase):
+    def _predictions(self, model_name, backend, tokenizer, texts):
+        model, device = inference_backends.load_masked_lm(model_name, backend)
+        return FillMaskBatcher(model, tokenizer, device=device).fill_many(texts)
+
+    def _assert_parity(self, model_name, tokenizer, texts, backend, min_top1, min_overlap):
+        reference = self._predictions(model_name, "fp32", tokenizer, texts)
+        predictions = self._predictions(model_name, backend, tokenizer, texts)
+
+        top1, overlap = _top_k_agreement(reference, predictions)
+        self.assertGreaterEqual(top1, min_top1, f"{backend} top-1 agreement")
+        self.assertGreaterEqual(overlap, min_overlap, f"{backend} top-5 overlap")
+
+    def _tiny_model_dir(self):
+        directory = tempfile.mkdtemp()
+        model, tokenizer = _tiny_masked_lm(directory)
+        model.save_pretrained(directory)
+        tokenizer.save_pretrained(directory)
+        return directory, tokenizer
+
+    def test_int8_quantizes_linear_layers_and_keeps_top_k(self):
+        import torch
+
+        directory, tokenizer = self._tiny_model_dir()
+
+        model, device = inference_backends.load_masked_lm(directory, "int8", device="cuda")
+        self.assertEqual(device, "cpu")
+        self.assertFalse(any(type(module) is torch.nn.Linear for module in model.modules()))
+
+        texts = ["the lessee shall [MASK] rent .", "the court held that the [MASK] was dismissed ."]
+        self._assert_parity(directory, tokenizer, texts, "int8", min_top1=1.0, min_overlap=0.8)
+
+    def test_onnx_keeps_top_k(self):
+        if not inference_backends.BACKENDS["onnx"].available:
+            self.skipTest("optimum[onnxruntime] is not installed")
+        directory, tokenizer = self._tiny_model_dir()
+
+        with override_settings(LEGALBERT_ONNX_DIR=tempfile.mkdtemp()):
+            self._assert_parity(
+                directory, tokenizer, ["the lessee shall [MASK] rent ."], "onnx", min_top1=1.0, min_overlap=1.0
+            )
+
+    def test_unavailable_backend_falls_back_to_fp32(self):
+        self.assertEqual(inference_backends.backend_name("no-such-backend"), "fp32")
+
+    def test_inlegalbert_parity(self):
+        from django.conf import settings
+        from transformers import AutoTokenizer
+
+        model_name = settings.LEGALBERT_MODEL
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+        except OSError:
+            self.skipTest(f"{model_name} is not in the local model cache")
+        texts = [text.replace("[MASK]", tokenizer.mask_token) for text in PARITY_SENTENCES]
+
+        with override_settings(LEGALBERT_ONNX_DIR=tempfile.mkdtemp()):
+            for backend in inference_backends.available_backends():
+                if backend != "fp32":
+                    with self.subTest(backend=backend):
+                        self._assert_parity(
+                            model_name, tokenizer, texts, backend, min_top1=0.85, min_overlap=0.8
+                        )
+
+
+# ================= GLOSSARY =================
+
+LEGACY_TERMS = {
+    "hereinafter": "from now on",
+    "herein": "in this document",
+    "notwithstanding": "despite",
+    "party of the first part": "first party",
+    "shall": "will",
+    "said": "the",
+}
+
+
+class GlossaryTests(SimpleTestCase):
+    def test_longest_term_wins(self):
+        glossary = Glossary(terms={
+            "herein": "in this document",
+            "hereinafter": "from now on",
+            "party": "side",
+            "party of the first part": "first party",
+        })
+
+        self.assertEqual(
+            glossary.replace("the party of the first part, hereinafter the party, herein"),
+            "the first party, from now on the side, in this document",
+        )
+
+    def test_case_is_preserved(self):
+        glossary = Glossary(terms=LEGACY_TERMS)
+
+        self.assertEqual(
+            glossary.replace("Notwithstanding that, the Lessee SHALL pay. Said party shall"),
+            "Despite that, the Lessee WILL pay. The party will",
+        )
+
+    def test_multi_word_terms_match_across_line_breaks(self):
+        glossary = Glossary(terms=LEGACY_TERMS)
+
+        self.assertEqual(glossary.replace("the party of the\nfirst part"), "the first party")
+
+    def test_whole_words_only(self):
+        glossary = Glossary(terms=LEGACY_TERMS)
+
+        self.assertEqual(glossary.replace("unsaid shallow"), "unsaid shallow")
+
+    def test_matches_the_legacy_loop_apart_from_case(self):
+        glossary = Glossary(terms=LEGACY_TERMS)
+        text = "Notwithstanding the party of the first part, hereinafter said lessee, shall pay herein."
+
+        self.assertEqual(glossary.replace(text).lower(), replace_terms_loop(text, LEGACY_TERMS).lower())
+
+    def test_glossary_file_is_reloaded_when_it_changes(self):
+        path = os.path.join(tempfile.mkdtemp(), "terms.json")
+        with open(path, "w") as f:
+            json.dump({"shall": "will"}, f)
+        glossary = Glossary(path)
+        self.assertEqual(glossary.replace("it shall"), "it will")
+
+        with open(path, "w") as f:
+            json.dump({"shall": "must"}, f)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+        self.assertEqual(glossary.replace("it shall"), "it must")
+
+        with open(path, "w") as f:
+            f.write("{not json")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+        with self.assertLogs("legify.glossary", "ERROR"):
+            self.assertEqual(glossary.replace("it shall"), "it must")
+
+    def test_fingerprint_changes_when_the_file_is_edited(self):
+        from .utilities import glossary
+
+        path = os.path.join(tempfile.mkdtemp(), "terms.json")
+        with open(path, "w") as f:
+            json.dump({"shall": "will"}, f)
+        before = glossary.fingerprint(path)
+        self.assertEqual(glossary.fingerprint(path), before)
+
+        with open(path, "w") as f:
+            json.dump({"shall": "must"}, f)
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+        self.assertNotEqual(glossary.fingerprint(path), before)
+        self.assertEqual(glossary.fingerprint(path + ".gone"), "missing")
+
+
+# ================= MODEL REGISTRY =================
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def _register(self, loader):
+        entry = model_registry._Entry(loader)
+        patcher = mock.patch.dict(model_registry._models, {"broken": entry})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return entry
+
+    @override_settings(MODEL_RETRY_SECONDS=300)
+    def test_failed_load_is_not_retried_until_the_backoff_passes(self):
+        loader = mock.Mock(side_effect=OSError("model is not installed"))
+        self._register(loader)
+
+        with self.assertLogs("legify.models", "ERROR"):
+            with self.assertRaisesRegex(OSError, "model is not installed"):
+                model_registry.get("broken")
+        for _ in range(2):
+            with self.assertRaisesRegex(OSError, "model is not installed"):
+                model_registry.get("broken")
+        self.assertEqual(loader.call_count, 1)
+        self.assertEqual(model_registry.status()["broken"]["state"], "failed")
+
+        later = model_registry.time.monotonic() + 301
+        loader.side_effect = None
+        loader.return_value = "model"
+        with mock.patch.object(model_registry.time, "monotonic", return_value=later):
+            self.assertEqual(model_registry.get("broken"), "model")
+        self.assertEqual(loader.call_count, 2)
+
+
+# ================= SUMMARIES =================
+
+
+def _user_file(user, text="", name="doc.txt", **fields):
+    return UserFile.objects.create(
+        user=user,
+        file_name=name,
+        file_path=f"/nonexistent/{name}",
+        extracted_text=text,
+        text_hash=summary_store.text_hash(text) if text else "",
+        **fields,
+    )
+
+
+@mock.patch.object(summary_store, "bert_simplify", side_effect=lambda text, level: text.upper())
+@mock.patch.object(summary_store, "gemini_summary", return_value="A short summary.")
+class SummaryStoreTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="pw")
+
+    def test_summary_is_generated_once_and_then_served_from_the_store(self, gemini, simplify):
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+
+        self.assertEqual(summary_store.get_or_create_summary(user_file), "A short summary.")
+        self.assertEqual(summary_store.get_or_create_summary(user_file), "A short summary.")
+
+        self.assertEqual(gemini.call_count, 1)
+        self.assertEqual(DocumentSummary.objects.filter(user_file=user_file).count(), 1)
+
+    def test_files_with_identical_text_share_a_summary(self, gemini, simplify):
+        summary_store.get_or_create_summary(_user_file(self.user, "Same text.", name="a.txt"))
+        other = _user_file(User.objects.create_user("bob"), "Same text.", name="b.txt")
+
+        self.assertEqual(summary_store.get_or_create_summary(other), "A short summary.")
+        self.assertEqual(gemini.call_count, 1)
+
+    def test_fallback_is_returned_but_not_stored(self, gemini, simplify):
+        gemini.return_value = None
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+
+        self.assertEqual(summary_store.get_or_create_summary(user_file), "THE LESSEE SHALL PAY RENT.")
+        self.assertFalse(DocumentSummary.objects.exists())
+        self.assertIsNone(summary_store.find_shared_summary(summary_store.text_hash(user_file.extracted_text)))
+
+        # Once Gemini is back, the next request gets (and stores) a real summary
+        gemini.return_value = "A short summary."
+        self.assertEqual(summary_store.get_or_create_summary(user_file), "A short summary.")
+        self.assertEqual(DocumentSummary.objects.count(), 1)
+
+    def test_summary_is_regenerated_after_a_pipeline_version_bump(self, gemini, simplify):
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+        summary_store.get_or_create_summary(user_file)
+
+        gemini.return_value = "A newer summary."
+        with mock.patch.object(summary_store, "summary_pipeline_version", return_value="next"):
+            self.assertEqual(summary_store.get_or_create_summary(user_file), "A newer summary.")
+        self.assertEqual(gemini.call_count, 2)
+
+    def test_summary_is_regenerated_after_a_glossary_edit(self, gemini, simplify):
+        path = os.path.join(tempfile.mkdtemp(), "terms.json")
+        with open(path, "w") as f:
+            json.dump({"shall": "will"}, f)
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+
+        with override_settings(LEGAL_GLOSSARY_PATH=path):
+            summary_store.get_or_create_summary(user_file)
+            with open(path, "w") as f:
+                json.dump({"shall": "must"}, f)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+
+            self.assertIsNone(summary_store.get_stored_summary(user_file))
+            gemini.return_value = "A newer summary."
+            self.assertEqual(summary_store.get_or_create_summary(user_file), "A newer summary.")
+        self.assertEqual(gemini.call_count, 2)
+
+    def test_summary_is_regenerated_when_the_text_changes(self, gemini, simplify):
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+        summary_store.get_or_create_summary(user_file)
+
+        summary_store.set_extracted_text(user_file, "The lessor shall repair the roof.")
+        gemini.return_value = "Another summary."
+        self.assertEqual(summary_store.get_or_create_summary(user_file), "Another summary.")
+
+    def test_stored_summary_is_found_without_reading_the_text(self, gemini, simplify):
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+        summary_store.store_summary(user_file, "A short summary.")
+
+        user_file = UserFile.objects.defer("extracted_text").get(pk=user_file.pk)
+        with mock.patch.object(summary_store, "text_hash", side_effect=AssertionError("text rehashed")):
+            self.assertEqual(summary_store.get_stored_summary(user_file), "A short summary.")
+        self.assertIn("extracted_text", user_file.get_deferred_fields())
+
+    def test_file_without_text_has_no_stored_summary(self, gemini, simplify):
+        self.assertIsNone(summary_store.get_stored_summary(_user_file(self.user, None)))
+
+    def test_pipeline_does_not_store_a_fallback_summary(self, gemini, simplify):
+        gemini.return_value = None
+        user_file = _user_file(self.user, "The lessee shall pay rent.")
+        job = ProcessingJob.objects.create(user=self.user, user_file=user_file, stages={"summarize": {}})
+
+        with mock.patch.object(pipeline, "gemini_summary", return_value=None):
+            summary = pipeline._stage_summarize(job, user_file, user_file.extracted_text, "Simplified.")
+
+        self.assertEqual(summary, "Simplified.")
+        self.assertTrue(job.stages["summarize"]["fallback"])
+        self.assertFalse(DocumentSummary.objects.exists())
+
+
+# ================= EXTRACTION CACHE =================
+
+
+class ExtractionCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        overrides = override_settings(EXTRACTION_CACHE_DIR=self.root, EXTRACTION_CACHE_MAX_BYTES=10 ** 9)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # Module state is per process; start every test from an empty cache
+        for state in (extraction_cache._state, extraction_cache._stats):
+            patcher = mock.patch.dict(state)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        extraction_cache._state.update(initialized=False, size=0)
+        extraction_cache._stats.update(hits=0, misses=0, writes=0, evictions=0)
+
+    def test_entries_live_under_the_extractor_version_and_old_versions_are_removed(self):
+        stale = os.path.join(self.root, "v0", "ab")
+        os.makedirs(stale)
+        open(os.path.join(stale, "old.txt.gz"), "wb").close()
+
+        extraction_cache.put("hash", "pdf", "text")
+
+        self.assertEqual(os.listdir(self.root), [f"v{text_extractor.EXTRACTOR_VERSION}"])
+        self.assertEqual(extraction_cache.get("hash", "pdf"), "text")
+        self.assertIsNone(extraction_cache.get("hash", "docx"))
+        self.assertEqual(extraction_cache.stats()["hits"], 1)
+        self.assertEqual(extraction_cache.stats()["misses"], 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        extraction_cache.put("first", "txt", "a" * 100)
+        entry_size = extraction_cache.stats()["size_bytes"]
+        extraction_cache.put("second", "txt", "b" * 100)
+        # Make "first" clearly the older entry, then use "second"
+        old = extraction_cache._entry_path("first", "txt")
+        os.utime(old, (1, 1))
+
+        # Room for two entries even at the low-water mark
+        with override_settings(EXTRACTION_CACHE_MAX_BYTES=entry_size * 3 - 1):
+            extraction_cache.put("third", "txt", "c" * 100)
+
+        self.assertIsNone(extraction_cache.get("first", "txt"))
+        self.assertEqual(extraction_cache.get("second", "txt"), "b" * 100)
+        self.assertEqual(extraction_cache.get("third", "txt"), "c" * 100)
+        self.assertEqual(extraction_cache.stats()["evictions"], 1)
+
+    def test_only_older_version_directories_are_removed(self):
+        version = int(text_extractor.EXTRACTOR_VERSION)
+        for name in (f"v{version - 1}", f"v{version + 1}", "v1-beta", "backups"):
+            os.makedirs(os.path.join(self.root, name))
+
+        extraction_cache.put("hash", "pdf", "text")
+
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            sorted([f"v{version}", f"v{version + 1}", "v1-beta", "backups"]),
+        )
+
+    def test_eviction_goes_down_to_the_low_water_mark_and_is_not_repeated_on_every_put(self):
+        extraction_cache.put("entry-0", "txt", "x" * 100)
+        entry_size = extraction_cache.stats()["size_bytes"]
+        for i in range(1, 10):
+            extraction_cache.put(f"entry-{i}", "txt", "x" * 100)
+            os.utime(extraction_cache._entry_path(f"entry-{i}", "txt"), (i + 1, i + 1))
+        os.utime(extraction_cache._entry_path("entry-0", "txt"), (1, 1))
+
+        with override_settings(EXTRACTION_CACHE_MAX_BYTES=entry_size * 10), \
+                mock.patch.object(extraction_cache, "_iter_entries", wraps=extraction_cache._iter_entries) as scans:
+            extraction_cache.put("entry-10", "txt", "x" * 100)
+            self.assertEqual(scans.call_count, 1)
+            # 11 entries over a 10-entry budget: trimmed to 9, the 90% mark
+            self.assertEqual(extraction_cache.stats()["evictions"], 2)
+            self.assertIsNone(extraction_cache.get("entry-0", "txt"))
+            self.assertIsNone(extraction_cache.get("entry-1", "txt"))
+
+            extraction_cache.put("entry-11", "txt", "x" * 100)
+            self.assertEqual(scans.call_count, 1)
+
+    def test_eviction_counts_entries_written_by_other_processes(self):
+        extraction_cache.put("mine", "txt", "x" * 100)
+        entry_size = extraction_cache.stats()["size_bytes"]
+        extraction_cache.put("theirs", "txt", "x" * 100)
+        # Another worker's write: on disk, but not in this process's total
+        extraction_cache._state["size"] -= entry_size
+        os.utime(extraction_cache._entry_path("theirs", "txt"), (1, 1))
+
+        with override_settings(EXTRACTION_CACHE_MAX_BYTES=entry_size * 2 - 1):
+            extraction_cache.put("new", "txt", "x" * 100)
+
+        self.assertIsNone(extraction_cache.get("theirs", "txt"))
+        self.assertEqual(extraction_cache.stats()["size_bytes"], entry_size)
+
+    def test_corrupt_entry_is_a_miss_and_is_re_extracted(self):
+        extraction_cache.put("hash", "txt", "text")
+        path = extraction_cache._entry_path("hash", "txt")
+        with open(path, "r+b") as f:
+            f.seek(12)
+            f.write(b"\xff" * 16)
+
+        with self.assertLogs("legify.extraction_cache", "WARNING"):
+            self.assertIsNone(extraction_cache.get("hash", "txt"))
+        self.assertFalse(path.exists())
+
+        with mock.patch.object(extraction_cache, "extractor_backend", return_value="txt"), \
+                mock.patch.object(extraction_cache, "extract_text", return_value="fresh text") as extract:
+            self.assertEqual(extraction_cache.extract_text_cached("/any/file.txt", "hash"), "fresh text")
+            self.assertEqual(extraction_cache.extract_text_cached("/any/file.txt", "hash"), "fresh text")
+        self.assertEqual(extract.call_count, 1)
+
+    @override_settings(MODEL_PRELOAD=[])
+    def test_readiness_reports_cache_counters(self):
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+
+        extraction_cache.put("hash", "txt", "text")
+        extraction_cache.get("hash", "txt")
+
+        response = APIClient().get(reverse("readiness"))
+
+        self.assertEqual(response.json()["extraction_cache"]["hits"], 1)
+        self.assertEqual(response.json()["extraction_cache"]["writes"], 1)
+
+
+class ArtifactVersionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+
+    def _extract(self, user_file):
+        job = ProcessingJob.objects.create(user=self.user, user_file=user_file, stages={"extract": {}})
+        with mock.patch.object(pipeline, "extract_text_cached", return_value="new text") as extract:
+            text = pipeline._stage_extract(job, user_file)
+        return text, extract.call_count, job
+
+    def test_text_from_an_older_extractor_is_extracted_again(self):
+        DocumentArtifact.objects.create(
+            content_hash="h", extracted_text="old text", extractor_version="", entities={"ORG": ["x"]}
+        )
+
+        text, extractions, _ = self._extract(_user_file(self.user, content_hash="h"))
+
+        self.assertEqual((text, extractions), ("new text", 1))
+        artifact = DocumentArtifact.objects.get(content_hash="h")
+        self.assertEqual(artifact.extractor_version, text_extractor.EXTRACTOR_VERSION)
+        self.assertIsNone(artifact.entities)
+
+    def test_text_from_the_current_extractor_is_reused(self):
+        DocumentArtifact.objects.create(
+            content_hash="h", extracted_text="current text", extractor_version=text_extractor.EXTRACTOR_VERSION
+        )
+
+        text, extractions, job = self._extract(_user_file(self.user, content_hash="h"))
+
+        self.assertEqual((text, extractions), ("current text", 0))
+        self.assertTrue(job.stages["extract"]["reused"])
+
+
+# ================= UPLOADS =================
+
+PDF_BYTES = b"%PDF-1.4\n" + b"0" * 5000
+EXE_BYTES = b"MZ\x90\x00" + b"\x00" * 5000
+
+
+class SaveUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def _save(self, name, data, **kwargs):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from .utilities.uploads import save_upload
+
+        return save_upload(SimpleUploadedFile(name, data), os.path.join(self.directory, name), **kwargs)
+
+    def test_upload_is_streamed_hashed_and_sniffed(self):
+        import hashlib
+
+        stored = self._save("a.pdf", PDF_BYTES, chunk_size=1000)
+
+        self.assertEqual(stored.size, len(PDF_BYTES))
+        self.assertEqual(stored.content_hash, hashlib.sha256(PDF_BYTES).hexdigest())
+        self.assertEqual(stored.mime_type, "application/pdf")
+        with open(stored.path, "rb") as f:
+            self.assertEqual(f.read(), PDF_BYTES)
+        self.assertEqual(os.listdir(self.directory), ["a.pdf"])
+
+    def test_oversized_upload_is_rejected_without_leaving_files(self):
+        from .utilities.uploads import UploadTooLarge
+
+        with self.assertRaises(UploadTooLarge):
+            self._save("a.pdf", PDF_BYTES, max_size=1000, chunk_size=100)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_content_that_does_not_match_the_extension_is_rejected(self):
+        from .utilities.uploads import UnsupportedUpload
+
+        for name, data in (("a.pdf", EXE_BYTES), ("a.pdf", b"just text"), ("a.exe", EXE_BYTES)):
+            with self.subTest(name=name, data=data[:4]), self.assertRaises(UnsupportedUpload):
+                self._save(name, data)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_existing_file_is_never_overwritten(self):
+        path = os.path.join(self.directory, "a.txt")
+        with open(path, "wb") as f:
+            f.write(b"first upload")
+
+        with self.assertRaises(FileExistsError):
+            self._save("a.txt", b"second upload")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"first upload")
+        self.assertEqual(os.listdir(self.directory), ["a.txt"])
+
+
+class FileUploadViewTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, name, data):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return self.client.post("/api/users/upload/", {"file": SimpleUploadedFile(name, data)}, format="multipart")
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=1000)
+    def test_oversized_upload_gets_413(self):
+        response = self._upload("big.pdf", PDF_BYTES + b"0" * (100 * 1024))
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(UserFile.objects.exists())
+
+    def test_mismatched_content_gets_415(self):
+        response = self._upload("invoice.pdf", EXE_BYTES)
+
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(UserFile.objects.exists())
+
+    def test_same_name_uploads_in_the_same_second_do_not_collide(self):
+        from datetime import datetime
+
+        from . import views
+
+        with mock.patch.object(views, "datetime") as clock:
+            clock.now.return_value = datetime(2024, 1, 1, 12, 0, 0)
+            first = self._upload("lease.txt", b"first lease")
+            second = self._upload("lease.txt", b"second lease")
+
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        files = {f.id: f for f in UserFile.objects.all()}
+        first_file, second_file = files[first.json()["file_id"]], files[second.json()["file_id"]]
+        self.assertEqual(first_file.file_name, second_file.file_name)
+        self.assertNotEqual(first_file.file_path, second_file.file_path)
+        with open(first_file.file_path, "rb") as f:
+            self.assertEqual(f.read(), b"first lease")
+        with open(second_file.file_path, "rb") as f:
+            self.assertEqual(f.read(), b"second lease")
+
+
+# ================= COMPRESSED TEXT =================
+
+SAMPLE_TEXT = "\f".join(["Lessee shall pay ₹10,000 — “in advance” — each month."] * 50)
+
+
+class CompressedTextFieldTests(SimpleTestCase):
+    def test_round_trip_with_each_codec(self):
+        for codec, zstd_magic in (("zstd", True), ("zlib", False)):
+            with self.subTest(codec=codec), override_settings(TEXT_COMPRESSION=codec):
+                data = fields.compress_text(SAMPLE_TEXT)
+                self.assertEqual(data.startswith(fields.ZSTD_MAGIC), zstd_magic)
+                self.assertLess(len(data), len(SAMPLE_TEXT.encode("utf-8")))
+                self.assertEqual(fields.decompress_text(data), SAMPLE_TEXT)
+
+    def test_rows_written_with_one_codec_are_read_after_switching(self):
+        with override_settings(TEXT_COMPRESSION="zlib"):
+            data = fields.compress_text(SAMPLE_TEXT)
+        with override_settings(TEXT_COMPRESSION="zstd"):
+            self.assertEqual(fields.decompress_text(data), SAMPLE_TEXT)
+            self.assertEqual("".join(fields.iter_decompressed_text(data)), SAMPLE_TEXT)
+
+    def test_streaming_keeps_multibyte_characters_split_across_chunks(self):
+        for codec in ("zstd", "zlib"):
+            with self.subTest(codec=codec), override_settings(TEXT_COMPRESSION=codec):
+                data = fields.compress_text(SAMPLE_TEXT)
+                chunks = list(fields.iter_decompressed_text(data, chunk_size=7))
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual("".join(chunks), SAMPLE_TEXT)
+
+    def test_empty_bytes_read_as_empty_text(self):
+        self.assertEqual(fields.decompress_text(b""), "")
+        self.assertEqual(list(fields.iter_decompressed_text(b"")), [])
+
+    def test_field_compresses_str_and_decompresses_db_values(self):
+        field = fields.CompressedTextField()
+        data = field.get_prep_value(SAMPLE_TEXT)
+
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(field.from_db_value(data, None, connection), SAMPLE_TEXT)
+        self.assertEqual(field.to_python(data), SAMPLE_TEXT)
+        self.assertIsNone(field.get_prep_value(None))
+        self.assertIsNone(field.from_db_value(None, None, connection))
+
+
+class CompressedStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+
+    def _raw(self, table, column, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM {table} WHERE id = %s", [pk])
+            return bytes(cursor.fetchone()[0])
+
+    def test_file_and_page_text_are_stored_compressed(self):
+        user_file = _user_file(self.user, SAMPLE_TEXT)
+        store_pages(user_file, SAMPLE_TEXT)
+        page = DocumentPage.objects.get(user_file=user_file, page_number=2)
+
+        self.assertEqual(fields.decompress_text(self._raw(UserFile._meta.db_table, "extracted_text", user_file.pk)), SAMPLE_TEXT)
+        raw_page = self._raw(DocumentPage._meta.db_table, "text", page.pk)
+        self.assertNotEqual(raw_page, page.text.encode("utf-8"))
+        self.assertEqual(fields.decompress_text(raw_page), page.text)
+        self.assertEqual(page.text, SAMPLE_TEXT[page.char_start:page.char_end])
+
+    def test_responses_link_to_the_text_instead_of_inlining_it(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        user_file = _user_file(self.user, SAMPLE_TEXT)
+        job = ProcessingJob.objects.create(
+            user=self.user,
+            user_file=user_file,
+            status=ProcessingJob.STATUS_SUCCEEDED,
+            result={"summarized_text": "Pay monthly.", "entities": {}},
+        )
+
+        summary_store.store_summary(user_file, "Pay monthly.")
+        details = client.get(f"/api/users/history/{user_file.id}/").json()
+        result = client.get(f"/api/users/jobs/{job.id}/").json()["result"]
+
+        self.assertNotIn("extracted_text", details)
+        self.assertNotIn("extracted_text", result)
+        self.assertEqual(details["page_count"], 50)
+        self.assertEqual(details["text_url"], result["text_url"])
+        response = client.get(result["text_url"])
+        self.assertEqual(b"".join(response.streaming_content).decode("utf-8"), SAMPLE_TEXT)
+
+
+class CompressionMigrationTests(TransactionTestCase):
+    """0008 compresses file and artifact text, 0011 page text; both reverse.  0012 hashes file text."""
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([("myapp", target)])
+        return executor.loader.project_state([("myapp", target)]).apps
+
+    def tearDown(self):
+        self._migrate(MigrationExecutor(connection).loader.graph.leaf_nodes("myapp")[0][1])
+
+    def _create_file(self, apps, text):
+        user = apps.get_model("auth", "User").objects.get_or_create(username="alice")[0]
+        return apps.get_model("myapp", "UserFile").objects.create(
+            user=user, file_name="a.txt", file_path="/nonexistent/a.txt", extracted_text=text
+        )
+
+    def test_0008_compresses_file_and_artifact_text(self):
+        apps = self._migrate("0007_documentpage")
+        file_id = self._create_file(apps, SAMPLE_TEXT).pk
+        artifact_id = apps.get_model("myapp", "DocumentArtifact").objects.create(
+            content_hash="a" * 64, extracted_text=SAMPLE_TEXT
+        ).pk
+
+        apps = self._migrate("0008_compress_extracted_text")
+        self.assertEqual(apps.get_model("myapp", "UserFile").objects.get(pk=file_id).extracted_text, SAMPLE_TEXT)
+        self.assertEqual(apps.get_model("myapp", "DocumentArtifact").objects.get(pk=artifact_id).extracted_text, SAMPLE_TEXT)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extracted_text FROM myapp_userfile WHERE id = %s", [file_id])
+            self.assertEqual(fields.decompress_text(cursor.fetchone()[0]), SAMPLE_TEXT)
+
+        apps = self._migrate("0007_documentpage")
+        self.assertEqual(apps.get_model("myapp", "UserFile").objects.get(pk=file_id).extracted_text, SAMPLE_TEXT)
+
+    def test_0011_compresses_page_text(self):
+        apps = self._migrate("0010_documentartifact_extractor_version")
+        user_file = self._create_file(apps, SAMPLE_TEXT)
+        page_model = apps.get_model("myapp", "DocumentPage")
+        for number in range(1, 4):
+            page_model.objects.create(user_file=user_file, page_number=number, char_start=0, char_end=0, text=f"page {number} ₹")
+
+        apps = self._migrate("0011_compress_page_text")
+        pages = apps.get_model("myapp", "DocumentPage").objects.order_by("page_number")
+        self.assertEqual([page.text for page in pages], ["page 1 ₹", "page 2 ₹", "page 3 ₹"])
+
+        apps = self._migrate("0010_documentartifact_extractor_version")
+        pages = apps.get_model("myapp", "DocumentPage").objects.order_by("page_number")
+        self.assertEqual([page.text for page in pages], ["page 1 ₹", "page 2 ₹", "page 3 ₹"])
+
+    def test_0012_hashes_existing_text(self):
+        apps = self._migrate("0011_compress_page_text")
+        with_text = self._create_file(apps, SAMPLE_TEXT).pk
+        without_text = self._create_file(apps, None).pk
+
+        apps = self._migrate("0012_userfile_text_hash")
+        files = apps.get_model("myapp", "UserFile").objects
+        self.assertEqual(files.get(pk=with_text).text_hash, summary_store.text_hash(SAMPLE_TEXT))
+        self.assertEqual(files.get(pk=without_text).text_hash, "")
+
+
+# ================= DEDUPLICATION =================
+
+LEASE_BYTES = b"The Lessee shall pay the rent on the first day of every month.\n" * 20
+
+
+@override_settings(JOB_EAGER=True)
+@mock.patch.object(pipeline, "extract_legal_entities", return_value={"parties": ["Lessee"]})
+@mock.patch.object(pipeline, "gemini_summary", return_value="Rent is due monthly.")
+@mock.patch.object(pipeline, "bert_simplify", side_effect=lambda text, level: text)
+@mock.patch.object(pipeline, "extract_text_cached", side_effect=lambda path, digest: Path(path).read_text())
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        self.clients = {}
+        for name in ("alice", "bob"):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user(name))
+            self.clients[name] = client
+
+    def _upload(self, user, data=LEASE_BYTES):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients[user].post(
+                "/api/users/upload/", {"file": SimpleUploadedFile("lease.txt", data)}, format="multipart"
+            )
+        self.assertEqual(response.status_code, 202)
+        return UserFile.objects.get(id=response.json()["file_id"]), ProcessingJob.objects.get(id=response.json()["job_id"])
+
+    def test_second_upload_of_the_same_bytes_reuses_every_stage(self, extract, simplify, summarize, ner):
+        first_file, first_job = self._upload("alice")
+        second_file, second_job = self._upload("bob")
+
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual((simplify.call_count, summarize.call_count, ner.call_count), (1, 1, 1))
+        self.assertEqual(second_job.status, ProcessingJob.STATUS_SUCCEEDED)
+        self.assertTrue(second_job.stages["extract"]["reused"])
+        self.assertTrue(second_job.stages["summarize"]["reused"])
+        self.assertTrue(second_job.stages["ner"]["reused"])
+        self.assertEqual(second_job.result, first_job.result)
+
+        # Bob gets his own copies, not references to Alice's rows
+        self.assertNotEqual(second_file.file_path, first_file.file_path)
+        self.assertEqual(second_file.extracted_text, LEASE_BYTES.decode())
+        self.assertEqual(second_file.pages.count(), first_file.pages.count())
+        self.assertEqual(second_file.summaries.get().summary_text, "Rent is due monthly.")
+        self.assertEqual(DocumentArtifact.objects.count(), 1)
+
+    def test_different_bytes_are_not_shared(self, extract, simplify, summarize, ner):
+        self._upload("alice")
+        self._upload("bob", LEASE_BYTES + b"Signed.\n")
+
+        self.assertEqual(extract.call_count, 2)
+        self.assertEqual(DocumentArtifact.objects.count(), 2)
+
+    def test_one_users_cleanup_leaves_shared_results_for_others(self, extract, simplify, summarize, ner):
+        alice_file, _ = self._upload("alice")
+        bob_file, _ = self._upload("bob")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients["alice"].delete("/api/users/cleanup/")
+
+        self.assertEqual(response.json()["deleted"], 1)
+        self.assertFalse(os.path.exists(alice_file.file_path))
+        self.assertTrue(os.path.exists(bob_file.file_path))
+        bob_file.refresh_from_db()
+        self.assertEqual(bob_file.extracted_text, LEASE_BYTES.decode())
+        self.assertTrue(bob_file.pages.exists())
+        self.assertTrue(bob_file.summaries.exists())
+        self.assertEqual(self.clients["bob"].get(f"/api/users/history/{bob_file.id}/text/").status_code, 200)
+
+        # The artifact outlives Alice's files, so her next upload is still not extracted again
+        artifact = DocumentArtifact.objects.get(content_hash=bob_file.content_hash)
+        self.assertEqual(artifact.entities, {"parties": ["Lessee"]})
+        self._upload("alice")
+        self.assertEqual(extract.call_count, 1)
+
+    def test_deleting_a_user_leaves_shared_results_for_others(self, extract, simplify, summarize, ner):
+        self._upload("alice")
+        bob_file, _ = self._upload("bob")
+
+        User.objects.get(username="alice").delete()
+
+        self.assertTrue(DocumentArtifact.objects.filter(content_hash=bob_file.content_hash).exists())
+        self.assertEqual(UserFile.objects.get().id, bob_file.id)
+        self.assertTrue(bob_file.summaries.exists())
+
+
+# ================= FILE HISTORY =================
+
+
+class FileHistoryPaginationTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, timedelta, timezone
+
+        from rest_framework.test import APIClient
+
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # Minutes 0, 1, 1, 1, 1, 2, 3: a run of equal timestamps straddles page boundaries
+        base = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        self.files = []
+        for minutes in (0, 1, 1, 1, 1, 2, 3):
+            user_file = _user_file(self.user, name=f"{minutes}.txt")
+            UserFile.objects.filter(pk=user_file.pk).update(uploaded_at=base + timedelta(minutes=minutes))
+            user_file.refresh_from_db()
+            self.files.append(user_file)
+        _user_file(User.objects.create_user("bob"), name="bob.txt")
+
+    def _get(self, **params):
+        return self.client.get("/api/users/history/", params)
+
+    def _expected_ids(self):
+        return [f.id for f in sorted(self.files, key=lambda f: (f.uploaded_at, f.id), reverse=True)]
+
+    def test_cursor_walks_every_file_once_newest_first(self):
+        for limit in (1, 2, 3, 7):
+            with self.subTest(limit=limit):
+                ids, cursor, pages = [], None, 0
+                while True:
+                    data = self._get(limit=limit, **({"cursor": cursor} if cursor else {})).json()
+                    pages += 1
+                    self.assertLessEqual(len(data["file_history"]), limit)
+                    ids.extend(row["id"] for row in data["file_history"])
+                    cursor = data["next_cursor"]
+                    if cursor is None:
+                        break
+
+                self.assertEqual(ids, self._expected_ids())
+                self.assertEqual(pages, -(-len(self.files) // limit))
+
+    def test_cursor_inside_a_run_of_equal_timestamps(self):
+        first = self._get(limit=2).json()
+        second = self._get(limit=2, cursor=first["next_cursor"]).json()
+        third = self._get(limit=2, cursor=second["next_cursor"]).json()
+
+        expected = self._expected_ids()
+        self.assertEqual([row["id"] for row in second["file_history"]], expected[2:4])
+        self.assertEqual([row["id"] for row in third["file_history"]], expected[4:6])
+        self.assertEqual(second["file_history"][0]["uploaded_at"], second["file_history"][1]["uploaded_at"])
+
+    def test_total_only_when_asked_for(self):
+        self.assertNotIn("total", self._get(limit=2).json())
+        for flag in ("1", "true"):
+            self.assertEqual(self._get(limit=2, include_total=flag).json()["total"], 7)
+
+    @override_settings(FILE_HISTORY_PAGE_SIZE=3, FILE_HISTORY_MAX_PAGE_SIZE=5)
+    def test_limit_defaults_and_is_clamped(self):
+        self.assertEqual(len(self._get().json()["file_history"]), 3)
+        self.assertEqual(len(self._get(limit=100).json()["file_history"]), 5)
+        self.assertEqual(len(self._get(limit=0).json()["file_history"]), 1)
+        self.assertEqual(self._get(limit="ten").status_code, 400)
+
+    def test_malformed_cursor_gets_400(self):
+        bad = [
+            "not base64!",
+            base64.urlsafe_b64encode(b"no separator").decode(),
+            base64.urlsafe_b64encode(b"yesterday|1").decode(),
+            base64.urlsafe_b64encode(b"2024-01-01T12:00:00+00:00|one").decode(),
+            base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+        ]
+        for cursor in bad:
+            with self.subTest(cursor=cursor):
+                response = self._get(cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor"})
+
+
+# ================= PROCESSING JOBS =================
+
+JOB_TEXT = "The Lessee shall pay the rent.\fThe Lessor shall repair the roof."
+
+
+@mock.patch.object(pipeline, "extract_legal_entities", return_value={"parties": ["Lessee", "Lessor"]})
+@mock.patch.object(pipeline, "gemini_summary", return_value="Pay rent; landlord repairs.")
+@mock.patch.object(pipeline, "bert_simplify", side_effect=lambda text, level: text)
+@mock.patch.object(pipeline, "extract_text_cached", return_value=JOB_TEXT)
+class ProcessingJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        self.user_file = _user_file(self.user, name="lease.pdf", content_hash="ab" * 32)
+
+    def _run(self):
+        with override_settings(JOB_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            job = pipeline.enqueue_document_job(self.user_file)
+        job.refresh_from_db()
+        return job
+
+    def test_job_is_submitted_only_once_the_upload_commits(self, extract, simplify, summarize, ner):
+        with mock.patch.object(jobs, "submit") as submit:
+            with self.captureOnCommitCallbacks() as callbacks:
+                job = pipeline.enqueue_document_job(self.user_file)
+                submit.assert_not_called()
+
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+
+        submit.assert_called_once_with(pipeline.run_document_job, job.id)
+        self.assertEqual(job.status, ProcessingJob.STATUS_PENDING)
+        self.assertEqual(set(job.stages), set(ProcessingJob.STAGES))
+        self.assertEqual(pipeline.job_progress(job), 0)
+
+    def test_job_moves_through_every_stage(self, extract, simplify, summarize, ner):
+        seen = []
+
+        def record():
+            job = ProcessingJob.objects.get(user_file=self.user_file)
+            seen.append((job.status, job.current_stage, {stage: entry["status"] for stage, entry in job.stages.items()}))
+
+        simplify.side_effect = lambda text, level: record() or text
+        ner.side_effect = lambda text: record() or {}
+
+        job = self._run()
+
+        self.assertEqual(seen[0][:2], (ProcessingJob.STATUS_RUNNING, "simplify"))
+        self.assertEqual(seen[0][2], {"extract": "done", "simplify": "running", "summarize": "pending", "ner": "pending"})
+        self.assertEqual(seen[1][:2], (ProcessingJob.STATUS_RUNNING, "ner"))
+        self.assertEqual(seen[1][2]["summarize"], "done")
+        self.assertEqual(job.status, ProcessingJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.current_stage, "")
+        self.assertEqual(pipeline.job_progress(job), 1)
+        self.assertTrue(all("duration_ms" in entry for entry in job.stages.values()))
+        self.assertEqual(job.result["summarized_text"], "Pay rent; landlord repairs.")
+
+        self.user_file.refresh_from_db()
+        self.assertEqual(self.user_file.extracted_text, JOB_TEXT)
+        self.assertEqual(self.user_file.pages.count(), 2)
+
+    def test_failed_extraction_fails_the_job(self, extract, simplify, summarize, ner):
+        extract.side_effect = ValidationError("Failed to read DOCX file: bad zip")
+
+        job = self._run()
+
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        self.assertIn("bad zip", job.error)
+        self.assertEqual(job.stages["extract"]["status"], "failed")
+        self.assertIn("bad zip", job.stages["extract"]["error"])
+        self.assertEqual(job.stages["simplify"]["status"], "pending")
+        simplify.assert_not_called()
+
+    def test_empty_extraction_fails_the_job(self, extract, simplify, summarize, ner):
+        extract.return_value = ""
+
+        job = self._run()
+
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        self.assertEqual(job.error, "Could not extract text from file")
+
+    def test_unexpected_error_does_not_leave_the_job_running(self, extract, simplify, summarize, ner):
+        simplify.side_effect = RuntimeError("model crashed")
+
+        job = self._run()
+
+        self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+        self.assertEqual(job.error, "model crashed")
+        self.assertEqual(job.stages["simplify"]["status"], "failed")
+        self.assertEqual(job.stages["simplify"]["error"], "model crashed")
+
+    def _stale_job(self, status, **fields):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        job = ProcessingJob.objects.create(user=self.user, user_file=self.user_file, status=status, **fields)
+        ProcessingJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=2))
+        return job
+
+    @override_settings(JOB_STALE_SECONDS=3600)
+    def test_stale_jobs_are_requeued_or_failed(self, extract, simplify, summarize, ner):
+        pending = self._stale_job(ProcessingJob.STATUS_PENDING, stages={"extract": {"status": "pending"}})
+        running = self._stale_job(
+            ProcessingJob.STATUS_RUNNING, current_stage="extract", stages={"extract": {"status": "running"}}
+        )
+        fresh = ProcessingJob.objects.create(user=self.user, user_file=self.user_file, status=ProcessingJob.STATUS_RUNNING)
+
+        with mock.patch.object(jobs, "submit") as submit, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(pipeline.sweep_stale_jobs(), (1, 1))
+            # A second sweep (e.g. another worker) finds nothing left to do
+            self.assertEqual(pipeline.sweep_stale_jobs(), (0, 0))
+
+        submit.assert_called_once_with(pipeline.run_document_job, pending.id)
+        running.refresh_from_db()
+        self.assertEqual(running.status, ProcessingJob.STATUS_FAILED)
+        self.assertEqual(running.stages["extract"]["status"], "failed")
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, ProcessingJob.STATUS_RUNNING)
+
+    def test_job_that_is_no_longer_pending_is_not_run_again(self, extract, simplify, summarize, ner):
+        job = ProcessingJob.objects.create(
+            user=self.user, user_file=self.user_file, status=ProcessingJob.STATUS_SUCCEEDED
+        )
+
+        pipeline.run_document_job(job.id)
+
+        extract.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_SUCCEEDED)
+
+    def test_failed_optional_stage_is_recorded_and_the_job_still_succeeds(self, extract, simplify, summarize, ner):
+        ner.side_effect = RuntimeError("NER service down")
+
+        job = self._run()
+
+        self.assertEqual(job.status, ProcessingJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.stages["ner"]["status"], "failed")
+        self.assertEqual(job.stages["ner"]["error"], "NER service down")
+        self.assertEqual(job.stages["summarize"]["status"], "done")
+
+    def test_job_status_is_only_visible_to_its_owner(self, extract, simplify, summarize, ner):
+        from rest_framework.test import APIClient
+
+        job = self._run()
+        client = APIClient()
+
+        client.force_authenticate(User.objects.create_user("mallory"))
+        self.assertEqual(client.get(f"/api/users/jobs/{job.id}/").status_code, 404)
+
+        client.force_authenticate(self.user)
+        data = client.get(f"/api/users/jobs/{job.id}/").json()
+        self.assertEqual(data["status"], ProcessingJob.STATUS_SUCCEEDED)
+        self.assertEqual(data["progress"], 1)
+        self.assertEqual(data["result"]["entities"], {"parties": ["Lessee", "Lessor"]})
+
+    def test_job_status_has_no_result_until_the_job_succeeds(self, extract, simplify, summarize, ner):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(jobs, "submit"), self.captureOnCommitCallbacks(execute=True):
+            job = pipeline.enqueue_document_job(self.user_file)
+
+        data = client.get(f"/api/users/jobs/{job.id}/").json()
+        self.assertEqual(data["status"], ProcessingJob.STATUS_PENDING)
+        self.assertNotIn("result", data)
+
+
+@mock.patch.object(summary_store, "gemini_summary")
+@mock.patch.object(summary_store, "bert_simplify")
+@mock.patch.object(pipeline, "extract_text_cached")
+class FileDetailsTests(TestCase):
+    """file_details reports jobs and queues work; it never extracts or summarises inline."""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        submit = mock.patch.object(jobs, "submit")
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+
+    def _details(self, user_file):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(f"/api/users/history/{user_file.id}/").json()
+
+    def _job(self, user_file, status, **fields):
+        return ProcessingJob.objects.create(user=self.user, user_file=user_file, status=status, **fields)
+
+    def _assert_nothing_ran_inline(self, extract, simplify, summarize):
+        extract.assert_not_called()
+        simplify.assert_not_called()
+        summarize.assert_not_called()
+
+    def test_stored_summary_is_ready(self, extract, simplify, summarize):
+        user_file = _user_file(self.user, JOB_TEXT)
+        summary_store.store_summary(user_file, "Pay rent.")
+
+        data = self._details(user_file)
+
+        self.assertEqual((data["status"], data["summarized_text"], data["page_count"]), ("ready", "Pay rent.", 2))
+        self.assertNotIn("job_id", data)
+        self.assertFalse(ProcessingJob.objects.exists())
+        self._assert_nothing_ran_inline(extract, simplify, summarize)
+
+    def test_document_still_processing_reports_its_job(self, extract, simplify, summarize):
+        user_file = _user_file(self.user, None)
+        job = self._job(user_file, ProcessingJob.STATUS_RUNNING)
+
+        data = self._details(user_file)
+
+        self.assertEqual((data["status"], data["job_id"], data["summarized_text"]), ("running", job.id, ""))
+        self.assertEqual(data["status_url"], reverse("job_status", args=[job.id]))
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+        self._assert_nothing_ran_inline(extract, simplify, summarize)
+
+    def test_legacy_file_without_text_is_queued_not_extracted(self, extract, simplify, summarize):
+        handle = tempfile.NamedTemporaryFile(suffix=".txt", delete=False)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        user_file = UserFile.objects.create(user=self.user, file_name="old.txt", file_path=handle.name)
+
+        data = self._details(user_file)
+
+        job = ProcessingJob.objects.get()
+        self.assertEqual((data["status"], data["job_id"]), ("pending", job.id))
+        self.submit.assert_called_once_with(pipeline.run_document_job, job.id)
+        self._assert_nothing_ran_inline(extract, simplify, summarize)
+
+    def test_file_missing_from_disk_is_failed(self, extract, simplify, summarize):
+        data = self._details(_user_file(self.user, None))
+
+        self.assertEqual((data["status"], data["error"]), ("failed", "The uploaded file is missing"))
+        self.assertFalse(ProcessingJob.objects.exists())
+
+    def test_failed_extraction_is_reported_not_retried(self, extract, simplify, summarize):
+        user_file = _user_file(self.user, None)
+        job = self._job(user_file, ProcessingJob.STATUS_FAILED, error="Could not extract text from file")
+
+        data = self._details(user_file)
+
+        self.assertEqual((data["status"], data["job_id"], data["error"]), ("failed", job.id, job.error))
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+        self.submit.assert_not_called()
+
+    def test_missing_summary_is_regenerated_on_the_pool_once(self, extract, simplify, summarize):
+        user_file = _user_file(self.user, JOB_TEXT)
+        self._job(user_file, ProcessingJob.STATUS_SUCCEEDED)
+        with mock.patch.object(summary_store, "summary_pipeline_version", return_value="old"):
+            summary_store.store_summary(user_file, "Stale summary.")
+
+        first = self._details(user_file)
+        second = self._details(user_file)
+
+        self.assertEqual((first["status"], first["summarized_text"]), ("pending", ""))
+        self.assertEqual(second["job_id"], first["job_id"])
+        self.assertEqual(ProcessingJob.objects.count(), 2)
+        self.assertEqual(self.submit.call_count, 1)
+        self._assert_nothing_ran_inline(extract, simplify, summarize)
+
+    def test_recent_fallback_is_served_then_retried_on_the_pool(self, extract, simplify, summarize):
+        user_file = _user_file(self.user, JOB_TEXT)
+        job = self._job(
+            user_file,
+            ProcessingJob.STATUS_SUCCEEDED,
+            stages={"summarize": {"status": "done", "fallback": True}},
+            result={"summarized_text": "THE LESSEE SHALL PAY THE RENT."},
+        )
+
+        data = self._details(user_file)
+        self.assertEqual((data["status"], data["summarized_text"]), ("ready", "THE LESSEE SHALL PAY THE RENT."))
+        self.submit.assert_not_called()
+
+        with override_settings(SUMMARY_RETRY_SECONDS=0):
+            data = self._details(user_file)
+        self.assertEqual(data["status"], "pending")
+        self.assertNotEqual(data["job_id"], job.id)
+        self.assertEqual(self.submit.call_count, 1)
+        self._assert_nothing_ran_inline(extract, simplify, summarize)
+
+
+# ================= OCR =================
+
+
+class _TempDirMixin:
+    def _path(self, name):
+        if not hasattr(self, "directory"):
+            self.directory = tempfile.mkdtemp()
+        return os.path.join(self.directory, name)
+
+
+class TesseractFallbackTests(_TempDirMixin, SimpleTestCase):
+    @override_settings(OCR_ENGINE_ORDER=["gemini", "tesseract"])
+    def test_pages_gemini_could_not_read_go_to_tesseract(self):
+        with mock.patch.object(text_extractor, "ocr_pdf_pages", return_value=[(0, "gemini 1")]) as gemini, \
+                mock.patch.object(text_extractor, "_tesseract_can_ocr_pdf", return_value=True), \
+                mock.patch.object(tesseract_ocr, "ocr_pdf_pages", return_value=[(1, "tess 2"), (2, "tess 3")]) as tesseract:
+            results = text_extractor.ocr_pdf_pages_with_engines("scan.pdf", [2, 0, 1])
+
+        gemini.assert_called_once_with("scan.pdf", [0, 1, 2])
+        tesseract.assert_called_once_with("scan.pdf", [1, 2])
+        self.assertEqual(results, [(0, "gemini 1"), (1, "tess 2"), (2, "tess 3")])
+
+    @override_settings(OCR_ENGINE_ORDER=["gemini", "tesseract"])
+    def test_tesseract_is_skipped_when_it_cannot_run(self):
+        with mock.patch.object(text_extractor, "ocr_pdf_pages", return_value=[]), \
+                mock.patch.object(text_extractor, "_tesseract_can_ocr_pdf", return_value=False), \
+                mock.patch.object(tesseract_ocr, "ocr_pdf_pages") as tesseract:
+            self.assertEqual(text_extractor.ocr_pdf_pages_with_engines("scan.pdf", [0]), [])
+        tesseract.assert_not_called()
+
+    @override_settings(OCR_ENGINE_ORDER=["gemini", "tesseract"], OCR_IMAGE_PREPROCESS=True)
+    def test_image_falls_back_to_tesseract_with_the_preprocessed_image(self):
+        from PIL import Image
+
+        path = self._path("photo.png")
+        Image.new("RGB", (60, 40), "white").save(path)
+
+        with mock.patch.object(text_extractor, "extract_bytes_via_gemini", side_effect=Exception("quota")), \
+                mock.patch.object(tesseract_ocr, "is_available", return_value=True), \
+                mock.patch.object(tesseract_ocr, "ocr_image", return_value="From tesseract") as ocr_image:
+            self.assertEqual(text_extractor.extract_text_from_image(path), "From tesseract")
+
+        self.assertEqual(ocr_image.call_args.args[0].mode, "1")
+
+    @override_settings(OCR_ENGINE_ORDER=["gemini", "tesseract"])
+    def test_image_fails_when_no_engine_can_read_it(self):
+        from PIL import Image
+
+        path = self._path("photo.png")
+        Image.new("RGB", (60, 40), "white").save(path)
+
+        with mock.patch.object(text_extractor, "extract_bytes_via_gemini", side_effect=Exception("quota")), \
+                mock.patch.object(tesseract_ocr, "is_available", return_value=False):
+            with self.assertRaisesMessage(ValidationError, "gemini: quota"):
+                text_extractor.extract_text_from_image(path)
+
+    def _ocr_pages(self, pool, pages=(0, 1, 2), **kwargs):
+        with mock.patch.object(tesseract_ocr, "_ocr_settings", return_value=("tesseract", 300, "eng")), \
+                mock.patch.object(text_extractor, "_get_pdf_pool", return_value=pool), \
+                mock.patch.object(text_extractor, "_discard_pdf_pool") as discard:
+            return tesseract_ocr.ocr_pdf_pages("scan.pdf", pages, **kwargs), discard
+
+    def test_pdf_pages_are_ocrd_on_the_shared_pool(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def ocr_page(file_path, number, cmd, dpi, lang):
+            if number == 1:
+                raise RuntimeError("unreadable")
+            return f"page {number + 1}"
+
+        with ThreadPoolExecutor(max_workers=2) as pool, \
+                mock.patch.object(tesseract_ocr, "_ocr_pdf_page", side_effect=ocr_page):
+            with self.assertLogs("legify.ocr", "WARNING"):
+                results, discard = self._ocr_pages(pool, workers=1)
+
+        self.assertEqual(results, [(0, "page 1"), (2, "page 3")])
+        discard.assert_not_called()
+
+    def test_broken_pool_is_discarded_and_unfinished_pages_left_out(self):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        done, broken = Future(), Future()
+        done.set_result("page 1")
+        broken.set_exception(BrokenProcessPool("worker killed"))
+        pool = mock.Mock()
+        pool.submit.side_effect = [done, broken, Future()]
+
+        with self.assertLogs("legify.ocr", "WARNING"):
+            results, discard = self._ocr_pages(pool)
+
+        self.assertEqual(results, [(0, "page 1")])
+        discard.assert_called_once_with(pool)
+
+    def test_whole_pdf_ocr_keeps_one_page_per_page_break(self):
+        with mock.patch.object(tesseract_ocr, "pdf_page_count", return_value=3), \
+                mock.patch.object(tesseract_ocr, "ocr_pdf_pages", return_value=[(0, "one\n\f"), (1, "  "), (2, "three")]):
+            self.assertEqual(tesseract_ocr.ocr_pdf("scan.pdf"), text_extractor.PAGE_BREAK.join(["one", "", "three"]))
+
+    def test_whole_pdf_ocr_fails_when_a_page_is_missing(self):
+        with mock.patch.object(tesseract_ocr, "pdf_page_count", return_value=4), \
+                mock.patch.object(tesseract_ocr, "ocr_pdf_pages", return_value=[(0, "one"), (3, "four")]):
+            with self.assertRaisesMessage(RuntimeError, "2 of 4 PDF pages: 2-3"):
+                tesseract_ocr.ocr_pdf("scan.pdf")
+
+
+class ImagePreprocessTests(_TempDirMixin, SimpleTestCase):
+    def test_large_photo_is_downscaled_and_binarized(self):
+        from PIL import Image
+
+        from .utilities.image_preprocess import preprocess_image
+
+        path = self._path("photo.jpg")
+        Image.effect_noise((1200, 900), 60).convert("RGB").save(path, quality=95)
+
+        prepared = preprocess_image(path, target_dpi=50)
+
+        self.assertEqual(prepared.mime_type, "image/png")
+        self.assertEqual(prepared.image.mode, "1")
+        self.assertLess(prepared.image.width, 1200)
+        self.assertLess(prepared.processed_bytes, prepared.original_bytes)
+        self.assertEqual(len(prepared.data), prepared.processed_bytes)
+
+    def test_already_compact_scan_is_kept_as_it_is(self):
+        from PIL import Image
+
+        from .utilities.image_preprocess import preprocess_image
+
+        path = self._path("scan.png")
+        image = Image.new("1", (100, 100), 1)
+        image.paste(0, (20, 20, 80, 40))
+        image.save(path, optimize=True)
+
+        prepared = preprocess_image(path)
+
+        with open(path, "rb") as f:
+            self.assertEqual(prepared.data, f.read())
+        self.assertEqual(prepared.mime_type, "image/png")
+        self.assertEqual(prepared.processed_bytes, prepared.original_bytes)
+
+
+# ================= FORMAT EXTRACTORS =================
+
+
+class TabularExtractorTests(_TempDirMixin, SimpleTestCase):
+    @override_settings(TABULAR_CHUNK_ROWS=2)
+    def test_csv_is_read_in_chunks_and_capped(self):
+        path = self._path("rent.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("month,amount\n" + "".join(f"m{i},{i * 100}\n" for i in range(5)))
+
+        self.assertEqual(
+            text_extractor.extract_text(path).split("\n"),
+            ["month\tamount"] + [f"m{i}\t{i * 100}" for i in range(5)],
+        )
+        self.assertEqual(
+            list(text_extractor.iter_csv_lines(path, max_rows=3)),
+            ["month\tamount", "m0\t0", "m1\t100", "m2\t200", "[truncated after 3 rows]"],
+        )
+
+    def test_xlsx_streams_every_sheet(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.active.title = "Rent"
+        workbook.active.append(["month", "amount"])
+        workbook.active.append(["Jan", 100])
+        workbook.create_sheet("Parties").append(["Lessee", "Asha"])
+        path = self._path("lease.xlsx")
+        workbook.save(path)
+
+        self.assertEqual(
+            text_extractor.extract_text(path).split("\n"),
+            ["## Rent", "month\tamount", "Jan\t100", "## Parties", "Lessee\tAsha"],
+        )
+
+
+class JsonExtractorTests(_TempDirMixin, SimpleTestCase):
+    def test_json_is_flattened_event_by_event(self):
+        path = self._path("lease.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"parties": [{"name": "Asha"}, {"name": "Ravi"}], "rent": 100, "signed": True}, f)
+
+        self.assertEqual(
+            text_extractor.extract_text(path).split("\n"),
+            ["parties.item.name: Asha", "parties.item.name: Ravi", "rent: 100"],
+        )
+        self.assertEqual(
+            list(text_extractor.iter_json_lines(path, max_bytes=30)),
+            ["parties.item.name: Asha", "[truncated after 30 bytes]"],
+        )
+
+
+class DocxExtractorTests(_TempDirMixin, SimpleTestCase):
+    def test_docx_includes_tables_headers_and_footers(self):
+        document = docx.Document()
+        document.sections[0].header.paragraphs[0].text = "LEASE AGREEMENT"
+        document.sections[0].footer.paragraphs[0].text = "Page footer"
+        document.add_paragraph("The Lessee shall pay rent.")
+        table = document.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = "Rent"
+        table.cell(0, 1).text = "₹10,000"
+        path = self._path("lease.docx")
+        document.save(path)
+
+        lines = text_extractor.extract_text(path).split("\n")
+
+        self.assertEqual(lines[0], "LEASE AGREEMENT")
+        self.assertIn("The Lessee shall pay rent.", lines)
+        self.assertIn("Rent | ₹10,000", lines)
+        self.assertEqual(lines[-1], "Page footer")
+
+    def test_text_box_inside_a_paragraph_is_read_once_in_place(self):
+        w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+        mc = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+        box = "<w:txbxContent><w:p><w:r><w:t>Boxed clause</w:t></w:r></w:p></w:txbxContent>"
+        part = (
+            f'<w:document xmlns:w="{w}" xmlns:mc="{mc}"><w:body>'
+            "<w:p><w:r><w:t>Before box. </w:t></w:r>"
+            f"<w:r><mc:AlternateContent><mc:Choice>{box}</mc:Choice><mc:Fallback>{box}</mc:Fallback></mc:AlternateContent></w:r>"
+            "<w:r><w:t>After box.</w:t></w:r></w:p>"
+            "<w:p><w:r><w:t>Next paragraph.</w:t></w:r></w:p>"
+            "</w:body></w:document>"
+        ).encode("utf-8")
+
+        paragraphs = list(text_extractor._iter_docx_part(io.BytesIO(part)))
+
+        self.assertEqual(paragraphs, ["Before box. \nBoxed clause\nAfter box.", "Next paragraph."])
+
+    def test_consumed_elements_are_detached(self):
+        w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+        body = "".join(f"<w:p><w:r><w:t>Clause {n}</w:t></w:r></w:p>" for n in range(100))
+        part = f'<w:document xmlns:w="{w}"><w:body>{body}</w:body></w:document>'.encode("utf-8")
+        parsers = []
+        real_iterparse = text_extractor.ET.iterparse
+
+        def iterparse(*args, **kwargs):
+            parsers.append(real_iterparse(*args, **kwargs))
+            return parsers[0]
+
+        with mock.patch.object(text_extractor.ET, "iterparse", side_effect=iterparse):
+            self.assertEqual(len(list(text_extractor._iter_docx_part(io.BytesIO(part)))), 100)
+        self.assertEqual(len(parsers[0].root), 0)
+
+
+class TextExtractorTests(_TempDirMixin, SimpleTestCase):
+    def test_txt_in_detected_encodings(self):
+        for name, data in (
+            ("utf8.txt", "Clause 1 – ₹500".encode("utf-8")),
+            ("utf16.txt", "Clause 1 – ₹500".encode("utf-16")),
+            ("cp1252.txt", "Clause 1 – fee".encode("windows-1252")),
+        ):
+            with self.subTest(name=name):
+                path = self._path(name)
+                with open(path, "wb") as f:
+                    f.write(data)
+                self.assertTrue(text_extractor.extract_text(path).startswith("Clause 1 –"))
+
+    def test_txt_paragraphs_are_streamed(self):
+        path = self._path("notes.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("one\ntwo\n\n\nthree\r\n")
+
+        self.assertEqual(list(text_extractor.iter_text_paragraphs(path)), ["one\ntwo", "three"])
+
+    def test_unsupported_extension_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, "Unsupported file type: .exe"):
+            text_extractor.extract_text(self._path("setup.exe"))
+
+
+# ================= PDF BACKENDS =================
+
+
+class PdfBackendFallbackTests(_TempDirMixin, SimpleTestCase):
+    def test_unknown_or_missing_backend_falls_back_to_pypdf2(self):
+        self.assertEqual(pdf_backends.backend_name("no-such-backend"), "pypdf2")
+        missing = pdf_backends.BACKENDS["pymupdf"]._replace(available=False)
+        with mock.patch.dict(pdf_backends.BACKENDS, {"pymupdf": missing}), override_settings(PDF_BACKEND="pymupdf"):
+            self.assertEqual(pdf_backends.backend_name(), "pypdf2")
+            self.assertEqual(pdf_backends.get_backend().name, "pypdf2")
+
+    def test_every_installed_backend_reads_the_same_pages(self):
+        if pdf_backends.fitz is None:
+            self.skipTest("PyMuPDF is needed to write test PDFs with text")
+        path = self._path("lease.pdf")
+        _make_text_pdf(path, 3)
+
+        for name, backend in pdf_backends.BACKENDS.items():
+            if not backend.available:
+                continue
+            with self.subTest(backend=name):
+                self.assertEqual(backend.page_count(path), 3)
+                pages = backend.extract_range(path, 1, 3)
+                self.assertEqual(len(pages), 2)
+                self.assertIn("Page 2 of the lease", pages[0][0])
+                self.assertFalse(pages[0][1])
+
+    def test_pdf_without_text_or_images_falls_back_to_whole_document_ocr(self):
+        path = self._path("outlined.pdf")
+        _make_pdf(path, 2)
+
+        with mock.patch.object(text_extractor, "ocr_whole_pdf", return_value="OCR text") as ocr_whole_pdf:
+            self.assertEqual(text_extractor.extract_text_from_pdf(path), "OCR text")
+        ocr_whole_pdf.assert_called_once_with(path)
+
+
+def _light_extract(path, start, end):
+    return [("Clause 1.", False)]
+
+
+def _heavy_extract(path, start, end):
+    buffer = b"x" * (64 << 20)  # written, so every page is resident
+    return [(f"Clause {len(buffer)}.", False)]
+
+
+class BenchmarkPdfBackendTests(SimpleTestCase):
+    def test_rss_growth_is_the_runs_own(self):
+        from .management.commands import benchmark_extractors
+
+        if not benchmark_extractors._reset_peak_rss():
+            self.skipTest("Needs /proc/self/clear_refs to reset the peak RSS")
+        backends = {
+            "light": pdf_backends.PdfBackend("light", True, lambda path: 1, _light_extract),
+            "heavy": pdf_backends.PdfBackend("heavy", True, lambda path: 1, _heavy_extract),
+        }
+        with mock.patch.dict(pdf_backends.BACKENDS, backends):
+            # The heavy run first: its peak must not be charged to the light one
+            heavy = benchmark_extractors._run_pdf_backend("heavy", "unused.pdf", 1)
+            light = benchmark_extractors._run_pdf_backend("light", "unused.pdf", 1)
+
+        self.assertGreater(heavy[3], 48 * 1024)
+        self.assertLess(light[3], 16 * 1024)
+
+
+# ================= UPLOAD STORAGE =================
+
+
+class RemoveFilesTests(_TempDirMixin, SimpleTestCase):
+    def test_removes_files_and_ignores_missing_ones(self):
+        paths = [self._path(name) for name in ("a.txt", "b.txt")]
+        for path in paths:
+            open(path, "w").close()
+
+        self.assertEqual(storage.remove_files(paths + [self._path("gone.txt")]), 2)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+
+class CleanupFilesViewTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.directory = tempfile.mkdtemp()
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _stored_file(self, user, name):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(name)
+        return UserFile.objects.create(user=user, file_name=name, file_path=path)
+
+    @override_settings(JOB_EAGER=True)
+    def test_cleanup_removes_only_the_users_files_after_commit(self):
+        mine = [self._stored_file(self.user, "a.txt"), self._stored_file(self.user, "b.txt")]
+        theirs = self._stored_file(User.objects.create_user("bob"), "c.txt")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete("/api/users/cleanup/")
+        self.assertEqual(response.json()["deleted"], 2)
+        self.assertFalse(UserFile.objects.filter(user=self.user).exists())
+        self.assertTrue(all(os.path.exists(f.file_path) for f in mine))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(os.path.exists(f.file_path) for f in mine))
+        self.assertTrue(os.path.exists(theirs.file_path))
+
+    def test_cleanup_does_not_load_the_extracted_text(self):
+        from django.test.utils import CaptureQueriesContext
+
+        user_file = self._stored_file(self.user, "a.txt")
+        UserFile.objects.filter(pk=user_file.pk).update(extracted_text=SAMPLE_TEXT)
+        DocumentPage.objects.create(user_file=user_file, page_number=1, char_start=0, char_end=4, text="text")
+
+        with mock.patch.object(jobs, "submit"), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.delete("/api/users/cleanup/").json()["deleted"], 1)
+
+        selects = [query["sql"] for query in queries if query["sql"].startswith("SELECT")]
+        self.assertFalse([sql for sql in selects if "extracted_text" in sql or '"text"' in sql])
+        self.assertFalse(DocumentPage.objects.exists())
+
+
+class ReconcileUploadsTests(TestCase):
+    def setUp(self):
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(storage.uploads_root())
+        self.user = User.objects.create_user("alice")
+
+        self.kept = self._row(self._file("kept.txt"))
+        self.orphan_file = self._file("orphan.txt")
+        self.recent_file = self._file("recent.txt", age=0)
+        self.partial_file = self._file("upload.txt.part")
+        self.orphan_row = self._row(os.path.join(storage.uploads_root(), "gone.txt"))
+
+    def _file(self, name, age=7200):
+        path = storage.upload_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(name)
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def _row(self, path):
+        return UserFile.objects.create(user=self.user, file_name=os.path.basename(path), file_path=path)
+
+    def _reconcile(self, **options):
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command("reconcile_uploads", stdout=out, batch_size=1, **options)
+        return out.getvalue()
+
+    def test_report_only_finds_orphans_and_changes_nothing(self):
+        output = self._reconcile()
+
+        self.assertIn(f"orphan file: {self.orphan_file}", output)
+        self.assertIn(f"orphan row: UserFile {self.orphan_row.id}", output)
+        self.assertIn("1 orphan file(s), 1 orphan row(s)", output)
+        for path in (self.kept.file_path, self.orphan_file, self.recent_file, self.partial_file):
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(UserFile.objects.count(), 2)
+
+    def test_delete_removes_orphan_files_and_rows_only(self):
+        output = self._reconcile(delete_files=True, delete_rows=True)
+
+        self.assertIn("1 orphan file(s) deleted, 1 orphan row(s) deleted", output)
+        self.assertFalse(os.path.exists(self.orphan_file))
+        # Recent and in-progress uploads may not have their row yet
+        for path in (self.kept.file_path, self.recent_file, self.partial_file):
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(list(UserFile.objects.values_list("id", flat=True)), [self.kept.id])
+
+
+class ShardUploadsTests(TestCase):
+    def setUp(self):
+        media = override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(storage.uploads_root())
+        self.user = User.objects.create_user("alice")
+
+    def _flat_file(self, name, exists=True):
+        path = os.path.join(storage.uploads_root(), name)
+        if exists:
+            with open(path, "w") as f:
+                f.write(name)
+        return UserFile.objects.create(user=self.user, file_name=name, file_path=path)
+
+    def _shard(self, **options):
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command("shard_uploads", stdout=out, **options)
+        return out.getvalue()
+
+    def test_files_are_moved_and_paths_rewritten(self):
+        files = [self._flat_file(f"{i}_lease.txt") for i in range(3)]
+        missing = self._flat_file("gone.txt", exists=False)
+
+        output = self._shard(batch_size=2)
+
+        self.assertIn("3 file(s) moved, 1 missing, 0 conflicting", output)
+        for user_file in files:
+            old_path = user_file.file_path
+            user_file.refresh_from_db()
+            self.assertEqual(user_file.file_path, storage.upload_path(user_file.file_name))
+            self.assertFalse(os.path.exists(old_path))
+            with open(user_file.file_path) as f:
+                self.assertEqual(f.read(), user_file.file_name)
+            self.assertTrue(storage.file_url_for(user_file).endswith(storage.upload_relpath(user_file.file_name)))
+        missing.refresh_from_db()
+        self.assertEqual(missing.file_path, os.path.join(storage.uploads_root(), "gone.txt"))
+
+        self.assertIn("0 file(s) moved", self._shard())
+
+    def test_dry_run_moves_nothing(self):
+        user_file = self._flat_file("lease.txt")
+
+        self.assertIn("1 file(s) would be moved", self._shard(dry_run=True))
+        user_file.refresh_from_db()
+        self.assertTrue(os.path.exists(user_file.file_path))
+        self.assertEqual(os.path.dirname(user_file.file_path), storage.uploads_root())
+
+    def test_rows_are_updated_when_the_file_was_already_moved(self):
+        user_file = self._flat_file("lease.txt")
+        target = storage.upload_path("lease.txt")
+        os.makedirs(os.path.dirname(target))
+        os.replace(user_file.file_path, target)
+
+        self._shard()
+
+        user_file.refresh_from_db()
+        self.assertEqual(user_file.file_path, target)
+
+    def test_prefixed_uploads_with_the_same_name_keep_their_own_bytes(self):
+        first = self._flat_file("ab12cd34_7_20240101_120000_lease.txt")
+        second = self._flat_file("ef56ab78_7_20240101_120000_lease.txt")
+        for user_file in (first, second):
+            UserFile.objects.filter(pk=user_file.pk).update(file_name="7_20240101_120000_lease.txt")
+
+        self._shard()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertNotEqual(first.file_path, second.file_path)
+        self.assertEqual(first.file_path, storage.upload_path("ab12cd34_7_20240101_120000_lease.txt"))
+        with open(first.file_path) as f:
+            self.assertEqual(f.read(), "ab12cd34_7_20240101_120000_lease.txt")
+        with open(second.file_path) as f:
+            self.assertEqual(f.read(), "ef56ab78_7_20240101_120000_lease.txt")
+
+    def test_uploads_already_sharded_are_left_alone(self):
+        path = storage.upload_path("ab12cd34_lease.txt")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write("sharded")
+        user_file = UserFile.objects.create(user=self.user, file_name="lease.txt", file_path=path)
+
+        with mock.patch("os.replace") as replace:
+            output = self._shard()
+
+        self.assertIn("0 file(s) moved", output)
+        replace.assert_not_called()
+        user_file.refresh_from_db()
+        self.assertEqual(user_file.file_path, path)
+
+    def test_existing_target_is_never_overwritten(self):
+        user_file = self._flat_file("lease.txt")
+        target = storage.upload_path("lease.txt")
+        os.makedirs(os.path.dirname(target))
+        with open(target, "w") as f:
+            f.write("someone else's upload")
+
+        output = self._shard()
+
+        self.assertIn("0 file(s) moved, 0 missing, 1 conflicting", output)
+        with open(target) as f:
+            self.assertEqual(f.read(), "someone else's upload")
+        user_file.refresh_from_db()
+        self.assertTrue(os.path.exists(user_file.file_path))
+        self.assertEqual(os.path.dirname(user_file.file_path), storage.uploads_root())
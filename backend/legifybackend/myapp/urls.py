@@ -26,6 +26,7 @@ from .views import (
     delete_user,
     file_upload,
     file_history,
+    job_status,
     cleanup_files,
     user_login,
     user_logout,
@@ -47,6 +48,8 @@ urlpatterns = [
     path('users/cleanup/', cleanup_files, name='cleanup_files'),
     path('users/history/', file_history, name='file_history'),
     path('users/history/<int:file_id>/', views.file_details, name='file_details'),
+    path('users/history/<int:file_id>/text/', views.file_text, name='file_text'),
+    path('users/jobs/<int:job_id>/', job_status, name='job_status'),
 
     path('users/login/', user_login, name='login'),
     path('users/logout/', user_logout, name='logout'),
@@ -54,6 +57,8 @@ urlpatterns = [
     path('users/chat/', chat, name='chat'),
     path('users/ncr/', getners, name='ners'),
 
+    path('health/ready/', views.readiness, name='readiness'),
+
     # ✅ SETTINGS API (FIXED)
     path('settings/', user_settings, name='user_settings'),
 
@@ -0,0 +1,58 @@
+"""
+Content-addressed artifacts.
+
+Every upload is hashed (SHA-256 of its bytes) while it is written to disk.
+Extracted text and entity results are stored once per hash in
+``DocumentArtifact`` and reused for any later byte-identical upload, by the
+same user or another one.
+
+Extracted text is only reused when it was produced by the current
+``EXTRACTOR_VERSION``; bumping the version makes every artifact's text (and
+the entities found in it) stale, and the next upload of those bytes
+extracts again.
+"""
+
+import logging
+
+from django.db import IntegrityError
+
+from ..models import DocumentArtifact
+from .text_extractor import EXTRACTOR_VERSION
+
+logger = logging.getLogger("legify.artifacts")
+
+
+def get_artifact(content_hash):
+    if not content_hash:
+        return None
+    return DocumentArtifact.objects.filter(content_hash=content_hash).first()
+
+
+def current_text(artifact):
+    """The artifact's extracted text if the current extractor produced it, else None."""
+    if artifact is None or artifact.extractor_version != EXTRACTOR_VERSION:
+        return None
+    return artifact.extracted_text or None
+
+
+def _save_artifact_field(content_hash, **fields):
+    if not content_hash:
+        return
+    try:
+        DocumentArtifact.objects.update_or_create(
+            content_hash=content_hash, defaults=fields
+        )
+    except IntegrityError:
+        # A concurrent upload of the same bytes created the row first
+        DocumentArtifact.objects.filter(content_hash=content_hash).update(**fields)
+
+
+def save_extracted_text(content_hash, text):
+    # Entities found in text from an older extractor no longer apply
+    _save_artifact_field(
+        content_hash, extracted_text=text, extractor_version=EXTRACTOR_VERSION, entities=None
+    )
+
+
+def save_entities(content_hash, entities):
+    _save_artifact_field(content_hash, entities=entities)
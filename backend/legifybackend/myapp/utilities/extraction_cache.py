@@ -0,0 +1,218 @@
+"""
+Disk-backed extraction cache.
+
+Extracted text is cached on the local filesystem under
+``EXTRACTION_CACHE_DIR/v<EXTRACTOR_VERSION>/``, keyed by the file's content
+hash and the extractor backend that produced it.  Re-extracting the same
+bytes (legacy rows in file_details, re-processing, migrations) becomes a
+file read instead of another parse or OCR round trip.
+
+Bumping ``EXTRACTOR_VERSION`` moves the cache to a new directory; the
+``v<N>`` directories of older versions are removed the first time the cache is
+used (anything else under the root, including newer versions still used by
+workers that have not been restarted yet, is left alone).
+
+When the cache outgrows ``EXTRACTION_CACHE_MAX_BYTES`` the least recently
+used entries are deleted until it is back under a low-water mark (90% of the
+budget), so a full cache is not rescanned on every write.  Each process keeps
+its own running total of the cache size and only learns about other
+processes' writes when it rescans the directory, which it does when its own
+total crosses the budget; with N workers the cache can therefore briefly
+exceed the budget by what the other N-1 wrote since their last rescan.
+``stats()`` (reported per worker by the readiness endpoint) counts hits,
+misses, writes and evictions.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+
+from .text_extractor import EXTRACTOR_VERSION, extract_text, extractor_backend
+
+logger = logging.getLogger("legify.extraction_cache")
+
+_lock = Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_state = {"initialized": False, "size": 0}
+
+# Evicting stops once the cache is down to this fraction of its budget
+_LOW_WATER = 0.9
+
+_VERSION_DIR_RE = re.compile(r"^v(\d+)$")
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file on disk, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_root():
+    return Path(getattr(settings, "EXTRACTION_CACHE_DIR", Path(settings.BASE_DIR) / "cache" / "extraction"))
+
+
+def _version_dir():
+    return _cache_root() / f"v{EXTRACTOR_VERSION}"
+
+
+def _entry_path(content_hash, backend):
+    key = hashlib.sha256(f"{content_hash}:{backend}".encode("utf-8")).hexdigest()
+    return _version_dir() / key[:2] / f"{key}.txt.gz"
+
+
+def _iter_entries():
+    version_dir = _version_dir()
+    if not version_dir.exists():
+        return
+    for path in version_dir.glob("*/*.txt.gz"):
+        try:
+            yield path, path.stat()
+        except FileNotFoundError:
+            continue
+
+
+def _is_older_version(name):
+    match = _VERSION_DIR_RE.match(name)
+    return bool(match) and EXTRACTOR_VERSION.isdigit() and int(match.group(1)) < int(EXTRACTOR_VERSION)
+
+
+def _initialize():
+    """Drop directories of older extractor versions and measure the cache. Caller holds _lock."""
+    if _state["initialized"]:
+        return
+    root = _cache_root()
+    if root.exists():
+        for child in root.iterdir():
+            if child.is_dir() and _is_older_version(child.name):
+                logger.info(f"Removing stale extraction cache {child}")
+                shutil.rmtree(child, ignore_errors=True)
+    _state["size"] = sum(stat.st_size for _, stat in _iter_entries())
+    _state["initialized"] = True
+
+
+def _evict(target_bytes):
+    """
+    Re-measure the cache on disk (other processes write to it too) and delete
+    least recently used entries until it is no larger than *target_bytes*.
+    Caller holds _lock.
+    """
+    entries = list(_iter_entries())
+    size = sum(stat.st_size for _, stat in entries)
+    if size > target_bytes:
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        for path, stat in entries:
+            if size <= target_bytes:
+                break
+            try:
+                path.unlink()
+                size -= stat.st_size
+                _stats["evictions"] += 1
+            except FileNotFoundError:
+                size -= stat.st_size
+    _state["size"] = size
+
+
+def get(content_hash, backend):
+    """Cached text for (content_hash, backend), or None."""
+    path = _entry_path(content_hash, backend)
+    with _lock:
+        _initialize()
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    except (OSError, EOFError, zlib.error, UnicodeDecodeError) as e:
+        # Truncated or corrupt entry: treat as a miss and drop it so it is rewritten
+        logger.warning(f"Discarding corrupt extraction cache entry {path}: {e}")
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    # Touch the entry so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    with _lock:
+        _stats["hits"] += 1
+    return text
+
+
+def put(content_hash, backend, text):
+    """Store *text* for (content_hash, backend) and evict if over budget."""
+    path = _entry_path(content_hash, backend)
+    with _lock:
+        # Measure the cache before adding to it, or the new entry is counted twice
+        _initialize()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file and rename, so readers never see partial entries
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            f.write(text.encode("utf-8"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    with _lock:
+        _state["size"] += path.stat().st_size
+        _stats["writes"] += 1
+        max_bytes = getattr(settings, "EXTRACTION_CACHE_MAX_BYTES", 1024 ** 3)
+        if _state["size"] > max_bytes:
+            _evict(int(max_bytes * _LOW_WATER))
+
+
+def stats():
+    """Hit/miss/write/eviction counters for this process plus the cache size on disk."""
+    with _lock:
+        _initialize()
+        return dict(_stats, size_bytes=_state["size"])
+
+
+def extract_text_cached(file_path, content_hash=None):
+    """
+    ``extract_text`` through the cache.
+
+    *content_hash* is the SHA-256 of the file; it is computed from the file
+    when not given (e.g. for rows uploaded before hashes were stored).
+    """
+    if not getattr(settings, "EXTRACTION_CACHE_ENABLED", True):
+        return extract_text(file_path)
+
+    if not content_hash:
+        content_hash = hash_file(file_path)
+    backend = extractor_backend(file_path)
+
+    text = get(content_hash, backend)
+    if text is not None:
+        return text
+
+    text = extract_text(file_path)
+    if text:
+        try:
+            put(content_hash, backend, str(text))
+        except OSError as e:
+            logger.warning(f"Could not write extraction cache entry: {e}")
+    return text
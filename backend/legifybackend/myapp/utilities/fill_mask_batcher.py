@@ -0,0 +1,150 @@
+"""
+Dynamic micro-batching for masked-LM inference.
+
+Callers on any thread submit one masked sentence at a time; a single
+inference thread collects requests until it has FILL_MASK_MAX_BATCH of them
+or FILL_MASK_MAX_WAIT_MS has passed since the first one arrived, runs them
+as one padded forward pass and hands every caller its own top-k predictions
+(the same ``{"token_str", "token", "score"}`` dicts the fill-mask pipeline
+returns).  Under load, concurrent level-3 simplifications share forward
+passes instead of queuing behind single-sentence ones.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+from django.conf import settings
+
+logger = logging.getLogger("legify.fill_mask")
+
+
+class FillMaskBatcher:
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device="cpu",
+        max_batch_size=None,
+        max_wait_ms=None,
+        top_k=5,
+        max_length=512,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max_batch_size or getattr(settings, "FILL_MASK_MAX_BATCH", 16)
+        if max_wait_ms is None:
+            max_wait_ms = getattr(settings, "FILL_MASK_MAX_WAIT_MS", 10)
+        self.max_wait = max_wait_ms / 1000
+        self.top_k = top_k
+        self.max_length = max_length
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    # ── Submitting ───────────────────────────────────────────────────────────
+
+    def _ensure_worker(self):
+        # Threads do not survive fork: a worker process that inherited this
+        # object from a preloading master starts its own inference thread
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._run,
+                    args=(self._queue,),
+                    name="fill-mask-batcher",
+                    daemon=True,
+                ).start()
+            return self._queue
+
+    def submit(self, masked_text):
+        """Queue *masked_text* (containing one mask token) and return a Future of its predictions."""
+        future = Future()
+        self._ensure_worker().put((masked_text, future))
+        return future
+
+    def fill(self, masked_text):
+        """Top-k predictions for the mask in *masked_text*, batched with concurrent callers."""
+        return self.submit(masked_text).result()
+
+    def fill_many(self, masked_texts):
+        """Predictions for several masked texts, submitted together so they share batches."""
+        futures = [self.submit(text) for text in masked_texts]
+        return [future.result() for future in futures]
+
+    # ── Inference thread ─────────────────────────────────────────────────────
+
+    def _collect(self, requests_queue):
+        batch = [requests_queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(requests_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, requests_queue):
+        while True:
+            batch = self._collect(requests_queue)
+            try:
+                results = self._predict([text for text, _ in batch])
+            except Exception as e:
+                logger.warning(f"Fill-mask batch of {len(batch)} failed ({e}); retrying one by one")
+                self._run_individually(batch)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_individually(self, batch):
+        # One bad input must not fail the requests it happened to be batched with
+        for text, future in batch:
+            try:
+                future.set_result(self._predict([text])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def _predict(self, texts):
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        ).to(self.device)
+
+        with torch.inference_mode():
+            output = self.model(**encoded)
+        # Masked-LM heads return .logits; BERT pre-training heads .prediction_logits
+        logits = output.logits if hasattr(output, "logits") else output.prediction_logits
+
+        results = []
+        mask_positions = encoded["input_ids"] == self.tokenizer.mask_token_id
+        for row in range(len(texts)):
+            positions = mask_positions[row].nonzero(as_tuple=True)[0]
+            if len(positions) == 0:
+                # The mask was truncated away (sentence longer than max_length)
+                results.append([])
+                continue
+            probs = logits[row, positions[0]].float().softmax(dim=-1)
+            scores, token_ids = probs.topk(self.top_k)
+            results.append([
+                {
+                    "token": int(token_id),
+                    "token_str": self.tokenizer.decode([int(token_id)]).strip(),
+                    "score": float(score),
+                }
+                for score, token_id in zip(scores, token_ids)
+            ])
+        return results
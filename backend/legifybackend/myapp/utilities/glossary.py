@@ -0,0 +1,186 @@
+"""
+Legal-term glossary replacement.
+
+All glossary terms are compiled into one regular expression, built from a
+character trie so terms sharing a prefix share a branch, and a document is
+rewritten in a single ``re.sub`` pass.  At each position the longest term
+wins ("hereinafter" before "herein"), matching is case-insensitive, spaces
+in multi-word terms match any run of whitespace, and each replacement takes
+the case of the text it replaces ("Notwithstanding" -> "Despite").
+
+The glossary is a JSON object of ``{"term": "replacement"}`` read from
+LEGAL_GLOSSARY_PATH.  ``Glossary.replace`` checks the file's mtime and
+recompiles when it has changed, so terms can be edited without a restart;
+a file that fails to load leaves the previous glossary in place.
+``fingerprint`` identifies the file's current contents, so results built with
+one glossary (stored summaries) can tell when it has been edited.
+
+``replace_terms_loop`` is the previous implementation (one ``re.sub`` per
+term), kept for ``benchmark_simplifier glossary``.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from threading import Lock
+
+from django.conf import settings
+
+logger = logging.getLogger("legify.glossary")
+
+
+def default_path():
+    return getattr(settings, "LEGAL_GLOSSARY_PATH", None) or os.path.join(
+        settings.BASE_DIR, "myapp", "data", "legal_terms.json"
+    )
+
+
+_fingerprints = {}
+
+
+def fingerprint(path=None):
+    """
+    Short hash of the glossary file's bytes ("missing" if it cannot be read).
+    Rehashed only when the file's mtime or size changes.
+    """
+    path = path or default_path()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _fingerprints.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return "missing"
+    _fingerprints[path] = (key, digest)
+    return digest
+
+
+def _normalize(term):
+    return " ".join(term.lower().split())
+
+
+# ── Compiling ────────────────────────────────────────────────────────────────
+
+
+def _char_pattern(char):
+    return r"\s+" if char == " " else re.escape(char)
+
+
+def _node_pattern(node):
+    # "" marks the end of a term; a node that ends a term and also continues
+    # becomes an optional group, and greedy "?" tries the longer term first
+    alternatives = [_char_pattern(char) + _node_pattern(child) for char, child in node.items() if char]
+    if not alternatives:
+        return ""
+    if len(alternatives) == 1 and "" not in node:
+        return alternatives[0]
+    group = "(?:" + "|".join(alternatives) + ")"
+    return group + "?" if "" in node else group
+
+
+def compile_terms(terms):
+    """One case-insensitive pattern matching any of *terms* as whole words, longest first."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    if not trie:
+        return None
+    return re.compile(r"\b" + _node_pattern(trie) + r"\b", re.IGNORECASE)
+
+
+def match_case(replacement, original):
+    """*replacement* in the case of *original*: UPPER, Capitalized or as given."""
+    if len(original) > 1 and original.isupper():
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+# ── Glossary ─────────────────────────────────────────────────────────────────
+
+
+class Glossary:
+    def __init__(self, path=None, terms=None):
+        """Load from *path* (default LEGAL_GLOSSARY_PATH), or use *terms* and never reload."""
+        self.path = None if terms is not None else (path or default_path())
+        self._lock = Lock()
+        self._mtime = None
+        self._compiled = (None, {})
+        if terms is not None:
+            self._compiled = self._compile(terms)
+        else:
+            self._reload_if_changed()
+
+    @staticmethod
+    def _compile(terms):
+        terms = {_normalize(term): replacement for term, replacement in terms.items() if _normalize(term)}
+        return compile_terms(terms), terms
+
+    def _reload_if_changed(self):
+        if self.path is None:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            if self._mtime is None:
+                logger.error(f"Glossary {self.path} not found: {e}")
+                self._mtime = 0
+            return
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    terms = json.load(f)
+                if not isinstance(terms, dict):
+                    raise ValueError("expected a JSON object of term: replacement")
+                compiled = self._compile(terms)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load glossary {self.path}: {e}; keeping the previous one")
+            else:
+                # One assignment, so concurrent replace() calls see either glossary, never a mix
+                self._compiled = compiled
+                logger.info(f"Loaded {len(compiled[1])} glossary terms from {self.path}")
+            self._mtime = mtime
+
+    @property
+    def terms(self):
+        """{normalized term: replacement} as of the last replace() (which checks for changes)."""
+        return self._compiled[1]
+
+    def replace(self, text):
+        """*text* with every glossary term replaced, in one pass."""
+        self._reload_if_changed()
+        pattern, terms = self._compiled
+        if pattern is None or not text:
+            return text
+
+        def substitute(match):
+            original = match.group()
+            replacement = terms.get(_normalize(original))
+            return original if replacement is None else match_case(replacement, original)
+
+        return pattern.sub(substitute, text)
+
+
+def replace_terms_loop(text, terms):
+    """The previous replacement: one freshly built pattern and scan per term."""
+    for term, replacement in terms.items():
+        pattern = r"\b" + re.escape(term) + r"\b"
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    return text
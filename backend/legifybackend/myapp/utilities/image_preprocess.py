@@ -0,0 +1,108 @@
+"""
+Image pre-processing before OCR.
+
+Phone photos of documents are often 10-20 MB of colour JPEG at far more
+resolution than OCR needs.  ``preprocess_image`` straightens them using the
+EXIF orientation, converts to grayscale, downscales to OCR_IMAGE_TARGET_DPI,
+binarizes (Otsu threshold) and re-encodes as a compact PNG, which is what we
+send to Gemini or Tesseract instead of the original bytes.
+"""
+
+import io
+import logging
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+logger = logging.getLogger("legify.ocr")
+
+# Used to guess the resolution of photos that carry no DPI metadata: the long
+# side of the image is assumed to span the long side of an A4 page
+_PAGE_LONG_SIDE_INCHES = 11.69
+
+PreprocessedImage = namedtuple(
+    "PreprocessedImage",
+    ["image", "data", "mime_type", "original_bytes", "processed_bytes"],
+)
+
+
+def _source_dpi(image):
+    dpi = image.info.get("dpi")
+    # Cameras write a nominal 72/96 DPI; only scanner values mean anything
+    if dpi and dpi[0] and dpi[0] >= 100:
+        return float(dpi[0])
+    return max(image.size) / _PAGE_LONG_SIDE_INCHES
+
+
+def _otsu_threshold(image):
+    """Gray level that best separates ink from paper (Otsu's method)."""
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+
+    sum_background = 0
+    weight_background = 0
+    best_threshold, best_variance = 127, 0.0
+    for level, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def preprocess_image(file_path, target_dpi=None, binarize=None):
+    """
+    Prepare an image file for OCR and return a ``PreprocessedImage``.
+
+    ``image`` is the processed PIL image (for Tesseract) and ``data`` its
+    PNG encoding (for Gemini).  If the result is not smaller than the
+    original file, the original bytes are kept instead.
+    """
+    if target_dpi is None:
+        target_dpi = getattr(settings, "OCR_IMAGE_TARGET_DPI", 200)
+    if binarize is None:
+        binarize = getattr(settings, "OCR_IMAGE_BINARIZE", True)
+
+    original_bytes = os.path.getsize(file_path)
+
+    with Image.open(file_path) as source:
+        original_format = source.format
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("L")
+
+        scale = target_dpi / _source_dpi(source)
+        if scale < 1:
+            new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(new_size, Image.LANCZOS)
+
+    if binarize:
+        threshold = _otsu_threshold(image)
+        image = image.point(lambda level: 255 if level > threshold else 0, mode="1")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True, dpi=(target_dpi, target_dpi))
+    data = buffer.getvalue()
+    mime_type = "image/png"
+
+    if len(data) >= original_bytes:
+        # Already compact (e.g. a clean 1-bit scan); send it as it is
+        with open(file_path, "rb") as f:
+            data = f.read()
+        mime_type = Image.MIME.get(original_format, mime_type)
+
+    logger.info(
+        f"Pre-processed {os.path.basename(file_path)} for OCR: "
+        f"{original_bytes} -> {len(data)} bytes ({original_bytes - len(data)} saved)"
+    )
+    return PreprocessedImage(image, data, mime_type, original_bytes, len(data))
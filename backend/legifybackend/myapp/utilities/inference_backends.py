@@ -0,0 +1,101 @@
+"""
+InLegalBERT inference backends.
+
+Each backend loads only the masked-LM head (the pre-training model's
+next-sentence head is never used by fill-mask) and returns a model that can
+be called like a transformers masked LM, returning ``.logits``.  The active
+one is chosen with the LEGALBERT_INFERENCE_BACKEND setting;
+``benchmark_simplifier backends`` compares memory, latency and top-k
+agreement of every installed one.
+
+    fp32   full-precision PyTorch, on GPU when there is one
+    int8   PyTorch with dynamic int8 quantization of the Linear layers (CPU)
+    onnx   ONNX Runtime graph exported with optimum (CPU); the export is
+           saved under LEGALBERT_ONNX_DIR and reused by later loads
+"""
+
+import logging
+import os
+from collections import namedtuple
+
+import torch
+from django.conf import settings
+from transformers import AutoModelForMaskedLM
+
+try:
+    from optimum.onnxruntime import ORTModelForMaskedLM
+except ImportError:
+    ORTModelForMaskedLM = None
+
+logger = logging.getLogger("legify.inference")
+
+DEFAULT_BACKEND = "fp32"
+
+_warned = set()
+
+InferenceBackend = namedtuple("InferenceBackend", ["name", "available", "cpu_only", "load"])
+
+
+def _load_fp32(model_name, device):
+    return AutoModelForMaskedLM.from_pretrained(model_name).to(device).eval()
+
+
+def _load_int8(model_name, device):
+    model = AutoModelForMaskedLM.from_pretrained(model_name).eval()
+    # Weights of every Linear layer (attention, feed-forward, MLM head) are
+    # stored as int8; activations are quantized on the fly per batch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _onnx_dir(model_name):
+    root = getattr(settings, "LEGALBERT_ONNX_DIR", None) or os.path.join(settings.BASE_DIR, "models", "onnx")
+    return os.path.join(root, model_name.strip("/").replace("/", "--"))
+
+
+def _load_onnx(model_name, device):
+    directory = _onnx_dir(model_name)
+    if os.path.exists(os.path.join(directory, "model.onnx")):
+        return ORTModelForMaskedLM.from_pretrained(directory)
+
+    logger.info(f"Exporting {model_name} to ONNX in {directory}")
+    model = ORTModelForMaskedLM.from_pretrained(model_name, export=True)
+    model.save_pretrained(directory)
+    return model
+
+
+BACKENDS = {
+    "fp32": InferenceBackend("fp32", True, False, _load_fp32),
+    "int8": InferenceBackend("int8", True, True, _load_int8),
+    "onnx": InferenceBackend("onnx", ORTModelForMaskedLM is not None, True, _load_onnx),
+}
+
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.available]
+
+
+def backend_name(name=None):
+    """
+    The backend to use: *name*, else LEGALBERT_INFERENCE_BACKEND, falling back
+    to fp32 when the configured one is unknown or not installed.
+    """
+    name = (name or getattr(settings, "LEGALBERT_INFERENCE_BACKEND", DEFAULT_BACKEND) or DEFAULT_BACKEND).lower()
+    backend = BACKENDS.get(name)
+    if backend is None or not backend.available:
+        if name not in _warned:
+            _warned.add(name)
+            logger.warning(f"Inference backend {name!r} is not available; using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return name
+
+
+def load_masked_lm(model_name, backend=None, device="cpu"):
+    """
+    (model, device) for *model_name* under *backend*.  CPU-only backends
+    ignore a requested GPU and report "cpu".
+    """
+    backend = BACKENDS[backend_name(backend)]
+    if backend.cpu_only and device != "cpu":
+        logger.info(f"Inference backend {backend.name} runs on CPU; ignoring device {device!r}")
+        device = "cpu"
+    return backend.load(model_name, device), device
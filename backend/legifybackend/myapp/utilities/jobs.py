@@ -0,0 +1,68 @@
+"""
+Local background worker pool.
+
+Work is handed to an in-process thread pool so request threads return
+immediately.  Job state itself lives in the database (see ``ProcessingJob``),
+so no broker or outside service is required.  Set ``JOB_EAGER = True`` to run
+everything inline (handy for tests and one-off scripts).
+"""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger("legify.jobs")
+
+# ── Executor (created lazily so forked workers each get their own) ───────────
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "JOB_WORKERS", 2),
+                thread_name_prefix="legify-job",
+            )
+    return _executor
+
+
+def _run_with_connection_cleanup(fn, *args, **kwargs):
+    # Worker threads open their own DB connections; make sure they do not leak.
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {getattr(fn, '__name__', fn)} failed")
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Run ``fn(*args, **kwargs)`` on the background pool and return a Future.
+
+    With ``JOB_EAGER`` enabled the call runs inline and the returned Future is
+    already resolved.
+    """
+    if getattr(settings, "JOB_EAGER", False):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            logger.exception(f"Task {getattr(fn, '__name__', fn)} failed")
+            future.set_exception(e)
+        return future
+
+    return _get_executor().submit(_run_with_connection_cleanup, fn, *args, **kwargs)
+
+
+def submit_on_commit(fn, *args, **kwargs):
+    """Like ``submit`` but waits until the surrounding transaction commits."""
+    transaction.on_commit(lambda: submit(fn, *args, **kwargs))
@@ -0,0 +1,178 @@
+"""
+Process-wide registry of NLP models.
+
+Every model the app uses (NLTK sentence tokenizer data, spaCy
+``en_core_web_sm``, InLegalBERT) is loaded through ``get(name)``, which loads
+it once per process under a lock and records how long the load took.
+
+``MODEL_PRELOAD`` ("all" or a comma-separated list of names) makes
+``MyappConfig.ready`` load those models at startup.  Under gunicorn with
+``preload_app`` (see gunicorn.conf.py) that happens once in the master, and
+the forked workers share the loaded weights copy-on-write instead of each
+loading its own copy on the first request.  ``status()`` feeds the readiness
+endpoint.
+
+A model that fails to load is not retried on every call: for
+MODEL_RETRY_SECONDS the stored error is raised again straight away, so a
+missing model costs callers nothing but the exception.
+"""
+
+import logging
+import os
+import time
+from threading import Lock
+
+from django.conf import settings
+
+logger = logging.getLogger("legify.models")
+
+_STATE_COLD = "cold"
+_STATE_LOADING = "loading"
+_STATE_READY = "ready"
+_STATE_FAILED = "failed"
+
+
+# ── Loaders ──────────────────────────────────────────────────────────────────
+
+
+def _load_nltk():
+    import nltk
+
+    # Both punkt variants, so sent_tokenize works on NLTK 3.7 and 3.8+
+    found = []
+    for resource in ("punkt", "punkt_tab"):
+        try:
+            nltk.data.find(f"tokenizers/{resource}")
+        except LookupError:
+            if not nltk.download(resource, quiet=True):
+                continue
+        found.append(resource)
+    if not found:
+        raise LookupError("NLTK punkt tokenizer data is not installed and could not be downloaded")
+    return found
+
+
+def _load_spacy():
+    import spacy
+
+    try:
+        return spacy.load("en_core_web_sm")
+    except OSError as e:
+        # Installed from requirements.txt at deploy time, never from a request
+        raise OSError(
+            "spaCy model en_core_web_sm is not installed "
+            "(pip install -r requirements.txt, or python -m spacy download en_core_web_sm)"
+        ) from e
+
+
+def _load_inlegalbert():
+    from .text_summarizer import LegalBertSimplifier
+
+    return LegalBertSimplifier()
+
+
+class _Entry:
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = Lock()
+        self.value = None
+        self.state = _STATE_COLD
+        self.load_seconds = None
+        self.error = ""
+        self.exception = None
+        self.failed_at = None
+
+
+_models = {
+    "nltk": _Entry(_load_nltk),
+    "spacy": _Entry(_load_spacy),
+    "inlegalbert": _Entry(_load_inlegalbert),
+}
+
+
+def names():
+    return list(_models)
+
+
+def _raise_if_backing_off(entry):
+    """Re-raise the last load error of *entry* while it is within MODEL_RETRY_SECONDS."""
+    if entry.state != _STATE_FAILED:
+        return
+    if time.monotonic() - entry.failed_at < getattr(settings, "MODEL_RETRY_SECONDS", 300):
+        raise entry.exception.with_traceback(None)
+
+
+def get(name):
+    """
+    The model called *name*, loading it on first use.  Raises if loading
+    fails, and keeps raising that error without retrying for MODEL_RETRY_SECONDS.
+    """
+    entry = _models[name]
+    if entry.state == _STATE_READY:
+        return entry.value
+    _raise_if_backing_off(entry)
+
+    with entry.lock:
+        # Another thread may have finished (or failed) loading while we waited
+        if entry.state == _STATE_READY:
+            return entry.value
+        _raise_if_backing_off(entry)
+
+        entry.state = _STATE_LOADING
+        started = time.monotonic()
+        try:
+            value = entry.loader()
+        except Exception as e:
+            entry.state = _STATE_FAILED
+            entry.error = str(e)
+            entry.exception = e
+            entry.failed_at = time.monotonic()
+            entry.load_seconds = round(entry.failed_at - started, 3)
+            logger.error(f"Loading {name} failed after {entry.load_seconds}s: {e}")
+            raise
+
+        entry.value = value
+        entry.load_seconds = round(time.monotonic() - started, 3)
+        entry.error = ""
+        entry.exception = None
+        entry.state = _STATE_READY
+        logger.info(f"Loaded {name} in {entry.load_seconds}s (pid {os.getpid()})")
+        return value
+
+
+def preload_names():
+    """Models listed in MODEL_PRELOAD ("all" means every registered model)."""
+    configured = getattr(settings, "MODEL_PRELOAD", [])
+    if "all" in configured:
+        return names()
+    unknown = [name for name in configured if name not in _models]
+    if unknown:
+        logger.warning(f"Unknown models in MODEL_PRELOAD: {', '.join(unknown)}")
+    return [name for name in configured if name in _models]
+
+
+def preload(model_names=None):
+    """Load *model_names* (default: MODEL_PRELOAD), logging instead of raising on failure."""
+    for name in preload_names() if model_names is None else model_names:
+        try:
+            get(name)
+        except Exception:
+            # Recorded in status(); the app still serves requests that do not need it
+            continue
+
+
+def status():
+    """{name: {"state", "load_seconds", "error"}} for every registered model."""
+    return {
+        name: {
+            "state": entry.state,
+            "load_seconds": entry.load_seconds,
+            "error": entry.error,
+        }
+        for name, entry in _models.items()
+    }
+
+
+def is_ready():
+    """True once every model in MODEL_PRELOAD has loaded."""
+    return all(_models[name].state == _STATE_READY for name in preload_names())
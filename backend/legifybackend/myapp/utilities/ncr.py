@@ -1,18 +1,12 @@
 import re
-import spacy
 from collections import defaultdict
 
-# Load a basic spaCy model
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    # If model not installed, download it
-    import os
-    os.system("python -m spacy download en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+from . import model_registry
 
 def extract_legal_entities(text):
-    # Process with spaCy for basic entities
+    # Process with spaCy for basic entities (en_core_web_sm, loaded once per
+    # process by the model registry)
+    nlp = model_registry.get("spacy")
     doc = nlp(text)
     
     # Initialize entity dictionary
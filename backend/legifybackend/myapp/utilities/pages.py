@@ -0,0 +1,122 @@
+"""
+Page-level storage of extracted text.
+
+After extraction the text is split into ``DocumentPage`` rows: one per PDF
+page (pages are separated by ``PAGE_BREAK`` in the extracted text), or
+chunks of about DOCUMENT_PAGE_CHARS characters, cut at line breaks, for
+formats without pages.  Endpoints that accept a ``pages`` range ("3",
+"3-5", "3-") read only those rows instead of the whole document.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import DocumentPage, UserFile
+from .text_extractor import PAGE_BREAK
+
+logger = logging.getLogger("legify.pages")
+
+
+def split_pages(text, max_chars=None):
+    """
+    Return (char_start, char_end) spans of the pages of *text*.
+
+    Text containing PAGE_BREAK is split on it, keeping empty pages so page
+    numbers match the source; other text is chunked at line breaks.
+    """
+    if not text:
+        return []
+
+    if PAGE_BREAK in text:
+        spans = []
+        start = 0
+        for page in text.split(PAGE_BREAK):
+            spans.append((start, start + len(page)))
+            start += len(page) + len(PAGE_BREAK)
+        return spans
+
+    if max_chars is None:
+        max_chars = getattr(settings, "DOCUMENT_PAGE_CHARS", 4000)
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Prefer to end the chunk after the last line break inside it
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def parse_page_range(value):
+    """
+    Parse "3", "3-5" or "3-" into a (first, last) tuple; last is None for an
+    open range.  Returns None for an empty value, raises ValueError otherwise.
+    """
+    if value in (None, ""):
+        return None
+    value = str(value).strip()
+    first, sep, last = value.partition("-")
+    try:
+        first = int(first)
+        last = (int(last) if last.strip() else None) if sep else first
+    except ValueError:
+        raise ValueError(f"Invalid page range {value!r}; use e.g. 3, 3-5 or 3-")
+    if first < 1 or (last is not None and last < first):
+        raise ValueError(f"Invalid page range {value!r}")
+    return first, last
+
+
+def store_pages(user_file, text):
+    """Replace the stored pages of *user_file* with the pages of *text*."""
+    pages = [
+        DocumentPage(
+            user_file=user_file,
+            page_number=number,
+            char_start=start,
+            char_end=end,
+            text=text[start:end],
+        )
+        for number, (start, end) in enumerate(split_pages(text), start=1)
+    ]
+    with transaction.atomic():
+        DocumentPage.objects.filter(user_file=user_file).delete()
+        DocumentPage.objects.bulk_create(pages, batch_size=500)
+    return len(pages)
+
+
+def ensure_pages(user_file):
+    """Split and store the text of files extracted before pages existed."""
+    if user_file.pages.exists():
+        return
+    text = UserFile.objects.filter(pk=user_file.pk).values_list("extracted_text", flat=True).first()
+    if text:
+        logger.info(f"Storing pages for file {user_file.pk}")
+        store_pages(user_file, text)
+
+
+def page_count(user_file):
+    ensure_pages(user_file)
+    return user_file.pages.count()
+
+
+def get_pages(user_file, page_range=None):
+    """(page_number, text) of the pages of *user_file* in *page_range* (all if None)."""
+    ensure_pages(user_file)
+    pages = user_file.pages.order_by("page_number")
+    if page_range is not None:
+        first, last = page_range
+        pages = pages.filter(page_number__gte=first)
+        if last is not None:
+            pages = pages.filter(page_number__lte=last)
+    return list(pages.values_list("page_number", "text"))
+
+
+def page_text(user_file, page_range):
+    """Text of the pages of *user_file* in *page_range*, joined with newlines."""
+    return "\n".join(text for _, text in get_pages(user_file, page_range))
@@ -0,0 +1,196 @@
+"""
+PDF text-layer backends.
+
+Each backend exposes ``page_count(path)`` and ``extract_range(path, start,
+stop)``, which returns ``(text, has_images)`` for pages [start, stop).  The
+active one is chosen with the PDF_BACKEND setting; ``benchmark_extractors
+pdf`` compares every installed backend on a local corpus.
+
+    pypdf2     always installed; pure Python and the slowest
+    pypdfium2  PDFium bindings; fast, permissively licensed
+    pymupdf    MuPDF bindings; fastest, AGPL
+    pdfminer   pdfminer.six; pure Python, best layout fidelity
+"""
+
+import logging
+from collections import namedtuple
+
+import PyPDF2
+from django.conf import settings
+
+try:
+    import pypdfium2
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pypdfium2 = None
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24
+    except ImportError:
+        fitz = None
+
+try:
+    from pdfminer.high_level import extract_pages as pdfminer_extract_pages
+    from pdfminer.layout import LTContainer, LTImage, LTTextContainer
+except ImportError:
+    pdfminer_extract_pages = None
+
+logger = logging.getLogger("legify.pdf")
+
+DEFAULT_BACKEND = "pypdf2"
+
+_warned = set()
+
+PdfBackend = namedtuple("PdfBackend", ["name", "available", "page_count", "extract_range"])
+
+
+# ── PyPDF2 ───────────────────────────────────────────────────────────────────
+
+
+def _pypdf2_has_images(page, depth=0):
+    """True if a page (or a form XObject it draws) places a raster image."""
+    try:
+        if "/Resources" not in page or "/XObject" not in page["/Resources"]:
+            return False
+        xobjects = page["/Resources"]["/XObject"]
+        for name in xobjects:
+            xobject = xobjects[name]
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                return True
+            # Scanners often wrap the page image in a form XObject
+            if subtype == "/Form" and depth < 2 and _pypdf2_has_images(xobject, depth + 1):
+                return True
+    except Exception:
+        pass
+    return False
+
+
+def _pypdf2_page_count(file_path):
+    with open(file_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _pypdf2_extract_range(file_path, start, stop):
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [
+            (reader.pages[i].extract_text() or "", _pypdf2_has_images(reader.pages[i]))
+            for i in range(start, stop)
+        ]
+
+
+# ── pypdfium2 ────────────────────────────────────────────────────────────────
+
+
+def _pdfium_page_count(file_path):
+    document = pypdfium2.PdfDocument(file_path)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def _pdfium_extract_range(file_path, start, stop):
+    document = pypdfium2.PdfDocument(file_path)
+    results = []
+    try:
+        for i in range(start, stop):
+            page = document[i]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            has_images = any(
+                True for _ in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE], max_depth=3)
+            )
+            textpage.close()
+            page.close()
+            results.append((text.replace("\r\n", "\n"), has_images))
+    finally:
+        document.close()
+    return results
+
+
+# ── PyMuPDF ──────────────────────────────────────────────────────────────────
+
+
+def _pymupdf_page_count(file_path):
+    with fitz.open(file_path) as document:
+        return document.page_count
+
+
+def _pymupdf_extract_range(file_path, start, stop):
+    with fitz.open(file_path) as document:
+        return [
+            (document[i].get_text(), bool(document[i].get_images(full=True)))
+            for i in range(start, stop)
+        ]
+
+
+# ── pdfminer.six ─────────────────────────────────────────────────────────────
+
+
+def _pdfminer_walk(element, parts):
+    """Collect text from a layout tree; True if it contains an image."""
+    if isinstance(element, LTTextContainer):
+        parts.append(element.get_text())
+        return False
+    if isinstance(element, LTImage):
+        return True
+    has_images = False
+    if isinstance(element, LTContainer):
+        for child in element:
+            has_images = _pdfminer_walk(child, parts) or has_images
+    return has_images
+
+
+def _pdfminer_page_count(file_path):
+    # pdfminer has no cheap page count; PyPDF2 reads only the page tree
+    return _pypdf2_page_count(file_path)
+
+
+def _pdfminer_extract_range(file_path, start, stop):
+    results = []
+    for layout in pdfminer_extract_pages(file_path, page_numbers=range(start, stop)):
+        parts = []
+        has_images = _pdfminer_walk(layout, parts)
+        results.append(("".join(parts), has_images))
+    return results
+
+
+# ── Registry ─────────────────────────────────────────────────────────────────
+
+BACKENDS = {
+    "pypdf2": PdfBackend("pypdf2", True, _pypdf2_page_count, _pypdf2_extract_range),
+    "pypdfium2": PdfBackend("pypdfium2", pypdfium2 is not None, _pdfium_page_count, _pdfium_extract_range),
+    "pymupdf": PdfBackend("pymupdf", fitz is not None, _pymupdf_page_count, _pymupdf_extract_range),
+    "pdfminer": PdfBackend(
+        "pdfminer", pdfminer_extract_pages is not None, _pdfminer_page_count, _pdfminer_extract_range
+    ),
+}
+
+
+def available_backends():
+    """Names of the backends whose libraries are installed."""
+    return [name for name, backend in BACKENDS.items() if backend.available]
+
+
+def backend_name(name=None):
+    """
+    The backend to use: *name*, else PDF_BACKEND, falling back to PyPDF2 when
+    the configured one is unknown or not installed.
+    """
+    name = (name or getattr(settings, "PDF_BACKEND", DEFAULT_BACKEND) or DEFAULT_BACKEND).lower()
+    backend = BACKENDS.get(name)
+    if backend is None or not backend.available:
+        if name not in _warned:
+            _warned.add(name)
+            logger.warning(f"PDF backend {name!r} is not available; using {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return name
+
+
+def get_backend(name=None):
+    return BACKENDS[backend_name(name)]
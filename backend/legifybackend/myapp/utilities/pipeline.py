@@ -0,0 +1,303 @@
+"""
+Staged document processing pipeline.
+
+An upload becomes a ``ProcessingJob`` that runs these stages in order on the
+local worker pool (``utilities.jobs``):
+
+    extract   → text from the stored file (PDF/DOCX/OCR/...), also stored per page
+    simplify  → InLegalBERT rule + structural simplification
+    summarize → Gemini summary of the simplified text
+    ner       → legal entity extraction
+
+Each stage records its status and timing in ``job.stages`` so the job status
+endpoint can report progress while the job runs.  Stages whose output already
+exists for byte-identical content (see ``utilities.artifacts``) are marked
+``reused`` instead of being recomputed.
+
+The pool is in memory, so jobs queued or running in a process that exits are
+lost.  ``sweep_stale_jobs`` finds them by the age of ``updated_at``; it runs
+when a process first enqueues or reports on a job and then at most every
+JOB_SWEEP_SECONDS.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import ProcessingJob, UserFile
+from .artifacts import current_text, get_artifact, save_entities, save_extracted_text
+from .jobs import submit_on_commit
+from .pages import store_pages
+from .summary_store import fallback_summary, find_shared_summary, set_extracted_text, store_summary
+from .ncr import extract_legal_entities
+from .extraction_cache import extract_text_cached
+from .text_summarizer import bert_simplify, gemini_summary
+
+logger = logging.getLogger("legify.pipeline")
+
+SUMMARY_LEVEL = 2
+
+_sweep_lock = Lock()
+_sweep_state = {"last": None}
+
+
+def enqueue_document_job(user_file):
+    """Create a pending job for *user_file* and hand it to the worker pool."""
+    sweep_stale_jobs_if_due()
+    job = ProcessingJob.objects.create(
+        user=user_file.user,
+        user_file=user_file,
+        stages={stage: {"status": "pending"} for stage in ProcessingJob.STAGES},
+    )
+    submit_on_commit(run_document_job, job.id)
+    return job
+
+
+def latest_job(user_file):
+    return user_file.jobs.order_by("-created_at", "-id").first()
+
+
+def ensure_document_job(user_file):
+    """
+    The file's pending or running job, or a newly enqueued one.  For requests
+    that find results missing: the work always goes to the pool, never inline.
+    """
+    with transaction.atomic():
+        # Serialises concurrent requests for the same file, so only one enqueues
+        UserFile.objects.select_for_update().filter(pk=user_file.pk).exists()
+        job = latest_job(user_file)
+        if job is not None and job.status in ProcessingJob.ACTIVE_STATUSES:
+            return job
+        return enqueue_document_job(user_file)
+
+
+def finished_recently(job):
+    """True if *job* finished less than SUMMARY_RETRY_SECONDS ago (too soon to retry it)."""
+    if job is None or job.status in ProcessingJob.ACTIVE_STATUSES:
+        return False
+    age = (timezone.now() - job.updated_at).total_seconds()
+    return age < getattr(settings, "SUMMARY_RETRY_SECONDS", 300)
+
+
+def recent_fallback_summary(job):
+    """
+    The unsaved fallback summary *job* produced (Gemini failed), if it
+    finished recently; past that the caller should queue a retry.
+    """
+    if not finished_recently(job) or job.status != ProcessingJob.STATUS_SUCCEEDED:
+        return None
+    if not job.stages.get("summarize", {}).get("fallback"):
+        return None
+    return job.result.get("summarized_text")
+
+
+def sweep_stale_jobs():
+    """
+    Recover jobs not updated for JOB_STALE_SECONDS, whose process is gone:
+    pending ones never started and are queued again; running ones are failed
+    rather than rerun, since what stopped them (e.g. running out of memory)
+    would likely stop them again.  Returns (requeued, failed) counts.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, "JOB_STALE_SECONDS", 1800))
+    stale = ProcessingJob.objects.filter(status__in=ProcessingJob.ACTIVE_STATUSES, updated_at__lt=cutoff)
+    requeued = failed = 0
+    for job in stale.only("id", "status", "current_stage", "stages"):
+        # Each update re-checks the row, so concurrent sweeps claim a job only once
+        claim = ProcessingJob.objects.filter(id=job.id, status=job.status, updated_at__lt=cutoff)
+        if job.status == ProcessingJob.STATUS_PENDING:
+            with transaction.atomic():
+                if claim.update(updated_at=now):
+                    submit_on_commit(run_document_job, job.id)
+                    requeued += 1
+        else:
+            error = "The worker running this job stopped"
+            _mark_stage_failed(job, error)
+            failed += claim.update(
+                status=ProcessingJob.STATUS_FAILED, error=error, stages=job.stages, updated_at=now
+            )
+    if requeued or failed:
+        logger.warning(f"Stale jobs: {requeued} requeued, {failed} failed")
+    return requeued, failed
+
+
+def sweep_stale_jobs_if_due():
+    """``sweep_stale_jobs`` on this process's first call, then at most every JOB_SWEEP_SECONDS."""
+    with _sweep_lock:
+        last = _sweep_state["last"]
+        if last is not None and time.monotonic() - last < getattr(settings, "JOB_SWEEP_SECONDS", 300):
+            return
+        _sweep_state["last"] = time.monotonic()
+    try:
+        sweep_stale_jobs()
+    except Exception:
+        logger.exception("Stale job sweep failed")
+
+
+def job_progress(job):
+    """Fraction (0-1) of stages that have finished, successfully or not."""
+    finished = sum(
+        1
+        for stage in ProcessingJob.STAGES
+        if job.stages.get(stage, {}).get("status") in ("done", "failed")
+    )
+    return round(finished / len(ProcessingJob.STAGES), 2)
+
+
+def _start_stage(job, stage):
+    job.current_stage = stage
+    job.stages[stage] = {
+        "status": "running",
+        "started_at": timezone.now().isoformat(),
+    }
+    job.save(update_fields=["current_stage", "stages", "updated_at"])
+    return time.monotonic()
+
+
+def _reuse_stage(job, stage):
+    job.stages[stage] = {"status": "done", "duration_ms": 0, "reused": True}
+    job.save(update_fields=["stages", "result", "updated_at"])
+
+
+def _mark_stage_failed(job, error):
+    """Mark the stage *job* was in the middle of as failed (it is left "running" otherwise)."""
+    entry = job.stages.get(job.current_stage)
+    if entry is not None and entry.get("status") == "running":
+        entry["status"] = "failed"
+        entry["error"] = str(error)
+
+
+def _finish_stage(job, stage, started, error=None):
+    entry = job.stages.get(stage, {})
+    entry["status"] = "failed" if error else "done"
+    entry["duration_ms"] = int((time.monotonic() - started) * 1000)
+    if error:
+        entry["error"] = str(error)
+    job.stages[stage] = entry
+    job.save(update_fields=["stages", "result", "updated_at"])
+
+
+# ── Stages ───────────────────────────────────────────────────────────────────
+
+
+def _stage_extract(job, user_file):
+    extracted_text = current_text(get_artifact(user_file.content_hash))
+    if extracted_text:
+        job.stages["extract"]["reused"] = True
+    else:
+        extracted_text = extract_text_cached(user_file.file_path, user_file.content_hash)
+        if not extracted_text:
+            raise ValueError("Could not extract text from file")
+        save_extracted_text(user_file.content_hash, str(extracted_text))
+
+    set_extracted_text(user_file, str(extracted_text))
+    store_pages(user_file, user_file.extracted_text)
+    return user_file.extracted_text
+
+
+def _stage_simplify(job, text):
+    return bert_simplify(text, SUMMARY_LEVEL)
+
+
+def _stage_summarize(job, user_file, text, simplified):
+    summary = gemini_summary(simplified, SUMMARY_LEVEL)
+    if summary:
+        store_summary(user_file, summary, SUMMARY_LEVEL)
+    else:
+        # The BERT result is still worth showing, but it is not stored, so
+        # file_details asks Gemini again instead of serving it for good
+        job.stages["summarize"]["fallback"] = True
+        summary = fallback_summary(text, simplified)
+    job.result["summarized_text"] = summary
+    return summary
+
+
+def _stage_ner(job, user_file, text):
+    artifact = get_artifact(user_file.content_hash)
+    if artifact and artifact.entities is not None:
+        job.stages["ner"]["reused"] = True
+        entities = artifact.entities
+    else:
+        entities = extract_legal_entities(text) or {}
+        save_entities(user_file.content_hash, entities)
+    job.result["entities"] = entities
+    return entities
+
+
+# ── Runner ───────────────────────────────────────────────────────────────────
+
+
+def run_document_job(job_id):
+    """Run every stage of job *job_id*.  Called on a worker thread."""
+    # Only a pending job is started, so a job requeued by sweep_stale_jobs
+    # never runs twice
+    claimed = ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.STATUS_PENDING).update(
+        status=ProcessingJob.STATUS_RUNNING, updated_at=timezone.now()
+    )
+    if not claimed:
+        logger.info(f"Job {job_id} is no longer pending; not running it")
+        return
+    job = ProcessingJob.objects.select_related("user_file").get(id=job_id)
+
+    try:
+        _run_stages(job, job.user_file)
+    except Exception as e:
+        # Anything unexpected must not leave the job (or its stage) stuck in "running"
+        logger.exception(f"Job {job.id} crashed")
+        _mark_stage_failed(job, e)
+        job.status = ProcessingJob.STATUS_FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "stages", "updated_at"])
+
+
+def _run_stages(job, user_file):
+    # Extraction is the only stage the others cannot do without
+    started = _start_stage(job, "extract")
+    try:
+        text = _stage_extract(job, user_file)
+    except Exception as e:
+        logger.exception(f"Extraction failed for job {job.id}")
+        _finish_stage(job, "extract", started, error=e)
+        job.status = ProcessingJob.STATUS_FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+        return
+    _finish_stage(job, "extract", started)
+
+    shared_summary = find_shared_summary(user_file.text_hash, SUMMARY_LEVEL)
+    if shared_summary is not None:
+        # Identical text was summarised before; skip BERT and Gemini entirely
+        store_summary(user_file, shared_summary, SUMMARY_LEVEL)
+        job.result["summarized_text"] = shared_summary
+        _reuse_stage(job, "simplify")
+        _reuse_stage(job, "summarize")
+    else:
+        started = _start_stage(job, "simplify")
+        simplified = _stage_simplify(job, text)
+        _finish_stage(job, "simplify", started)
+
+        started = _start_stage(job, "summarize")
+        try:
+            _stage_summarize(job, user_file, text, simplified)
+            _finish_stage(job, "summarize", started)
+        except Exception as e:
+            logger.exception(f"Summary failed for job {job.id}")
+            job.result["summarized_text"] = "Summary generation failed: " + str(e)
+            _finish_stage(job, "summarize", started, error=e)
+
+    started = _start_stage(job, "ner")
+    try:
+        _stage_ner(job, user_file, text)
+        _finish_stage(job, "ner", started)
+    except Exception as e:
+        logger.exception(f"NER failed for job {job.id}")
+        _finish_stage(job, "ner", started, error=e)
+
+    job.status = ProcessingJob.STATUS_SUCCEEDED
+    job.current_stage = ""
+    job.save(update_fields=["status", "current_stage", "updated_at"])
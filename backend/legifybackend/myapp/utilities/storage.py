@@ -0,0 +1,78 @@
+"""
+Upload files on disk.
+
+Uploads are fanned out over two levels of hashed subdirectories,
+``MEDIA_ROOT/uploads/ab/cd/<file name>`` where ``abcd`` are the first hex
+digits of the SHA-256 of the stored file name, so no directory grows past a
+few hundred entries.  The name is known before the upload is written, so the
+location (and URL) of a file follows from its stored name alone (new uploads
+are stored as ``<random>_<file name>``).  Files from before
+the fan-out live directly in ``uploads/`` until ``manage.py shard_uploads``
+moves them.
+
+Also: background removal of deleted uploads and walking the store for
+reconciliation against ``UserFile.file_path``.
+"""
+
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+
+logger = logging.getLogger("legify.storage")
+
+
+def uploads_root():
+    return os.path.join(settings.MEDIA_ROOT, "uploads")
+
+
+def upload_relpath(file_name):
+    """Location of *file_name* inside the uploads store, e.g. "3f/a2/<file name>"."""
+    digest = hashlib.sha256(file_name.encode("utf-8")).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{file_name}"
+
+
+def upload_path(file_name):
+    """Absolute path a newly stored upload called *file_name* is written to."""
+    return os.path.join(uploads_root(), *upload_relpath(file_name).split("/"))
+
+
+def file_url_for(user_file):
+    """Media URL of a stored upload, for both fanned-out and legacy flat paths."""
+    relative = os.path.relpath(user_file.file_path, uploads_root())
+    if relative.startswith(os.pardir):
+        # Not under the uploads store (should not happen); fall back to the name
+        relative = user_file.file_name
+    return f"{settings.MEDIA_URL}uploads/{relative.replace(os.sep, '/')}"
+
+
+def remove_files(paths):
+    """Delete *paths*, ignoring ones that are already gone.  Returns how many were removed."""
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {e}")
+    logger.info(f"Removed {removed} of {len(paths)} upload files")
+    return removed
+
+
+def iter_upload_files(root=None):
+    """Yield (path, DirEntry) for every file under the uploads store, depth first."""
+    stack = [root or uploads_root()]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry
+        except FileNotFoundError:
+            continue
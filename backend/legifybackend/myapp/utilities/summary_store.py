@@ -0,0 +1,113 @@
+"""
+Persistent summaries.
+
+Summaries are keyed by (file, level, pipeline version) and remember a hash of
+the text they were built from.  A stored summary is served as long as the
+text and ``summary_pipeline_version()`` (SUMMARY_PIPELINE_VERSION plus the
+glossary's fingerprint) are unchanged; otherwise it is regenerated and
+overwritten.  The hash of a file's text is stored on the file along with the
+text (``set_extracted_text``), so checking a summary never decompresses or
+rehashes the text.  Summaries are also shared between files whose extracted
+text is identical (e.g. the same template uploaded twice).
+
+Only Gemini summaries are stored.  When Gemini fails the simplified text is
+returned as a stand-in but not saved, so the next request tries Gemini
+again instead of serving (and sharing) the stand-in forever.
+"""
+
+import hashlib
+import logging
+
+from ..models import DocumentSummary
+from .text_summarizer import bert_simplify, gemini_summary, summary_pipeline_version
+
+logger = logging.getLogger("legify.summaries")
+
+
+def text_hash(text):
+    """SHA-256 hex digest of *text* (the key a summary is valid for)."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def set_extracted_text(user_file, text):
+    """Save *text* as the extracted text of *user_file*, together with its hash."""
+    user_file.extracted_text = text
+    user_file.text_hash = text_hash(text) if text else ""
+    user_file.save(update_fields=["extracted_text", "text_hash"])
+
+
+def get_stored_summary(user_file, level=2):
+    """Return the stored summary for *user_file*, or None if missing or stale."""
+    if not user_file.text_hash:
+        return None
+    summary = (
+        DocumentSummary.objects.filter(
+            user_file=user_file,
+            level=level,
+            pipeline_version=summary_pipeline_version(),
+        )
+        .only("text_hash", "summary_text")
+        .first()
+    )
+    if summary is None:
+        return None
+    if summary.text_hash != user_file.text_hash:
+        logger.info(f"Stored summary for file {user_file.id} is stale; text changed")
+        return None
+    return summary.summary_text
+
+
+def find_shared_summary(text_digest, level=2):
+    """Return a current summary of any file whose text hashes to *text_digest*."""
+    return (
+        DocumentSummary.objects.filter(
+            text_hash=text_digest,
+            level=level,
+            pipeline_version=summary_pipeline_version(),
+        )
+        .values_list("summary_text", flat=True)
+        .first()
+    )
+
+
+def store_summary(user_file, summary_text, level=2):
+    """Save *summary_text* as the current summary of *user_file*."""
+    DocumentSummary.objects.update_or_create(
+        user_file=user_file,
+        level=level,
+        pipeline_version=summary_pipeline_version(),
+        defaults={
+            "text_hash": user_file.text_hash,
+            "summary_text": summary_text,
+        },
+    )
+
+
+def fallback_summary(text, simplified):
+    """What to show when Gemini gave no summary: the simplified text, else the original."""
+    return simplified if simplified.strip() else text
+
+
+def get_or_create_summary(user_file, level=2):
+    """
+    Return the summary of *user_file*, generating and storing it only when no
+    valid stored summary exists.  A fallback (Gemini failed) is returned but
+    not stored.  May call BERT and Gemini, so it belongs on the job pool, not
+    in a request.
+    """
+    summary = get_stored_summary(user_file, level)
+    if summary is not None:
+        return summary
+
+    summary = find_shared_summary(user_file.text_hash, level) if user_file.text_hash else None
+    text = user_file.extracted_text
+    if summary is None:
+        if not text or not text.strip():
+            return "No text available to summarise."
+        simplified = bert_simplify(text, level)
+        summary = gemini_summary(simplified, level)
+        if not summary:
+            logger.info(f"No Gemini summary for file {user_file.id}; serving an unsaved fallback")
+            return fallback_summary(text, simplified)
+    store_summary(user_file, summary, level)
+    return summary
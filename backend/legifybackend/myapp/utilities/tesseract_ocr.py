@@ -0,0 +1,198 @@
+"""
+Local OCR engine: rasterize PDF pages and run Tesseract on them.
+
+Pages are rendered (pdf2image/poppler, or PyMuPDF if that is what is
+installed) and OCR'd on the shared PDF process pool (see
+``text_extractor._get_pdf_pool``), one page per task, so offline or
+quota-limited deployments can OCR on local cores instead of queuing behind
+Gemini rate limits.
+
+Settings: TESSERACT_CMD (auto-detected when empty), OCR_DPI, OCR_LANG and
+TESSERACT_WORKERS (pages of one document in flight at a time).
+"""
+
+import logging
+import os
+import shutil
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+import pytesseract
+from django.conf import settings
+
+try:
+    import pdf2image
+except ImportError:
+    pdf2image = None
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24
+    except ImportError:
+        fitz = None
+
+logger = logging.getLogger("legify.ocr")
+
+# Where Tesseract usually lives when it is not on PATH
+_COMMON_TESSERACT_PATHS = [
+    r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+    "/usr/bin/tesseract",
+    "/usr/local/bin/tesseract",
+    "/opt/homebrew/bin/tesseract",
+]
+
+
+@lru_cache(maxsize=1)
+def find_tesseract_cmd():
+    """Path of the tesseract binary, or None if it cannot be found."""
+    configured = getattr(settings, "TESSERACT_CMD", "")
+    if configured:
+        return configured if os.path.exists(configured) or shutil.which(configured) else None
+
+    on_path = shutil.which("tesseract")
+    if on_path:
+        return on_path
+    for candidate in _COMMON_TESSERACT_PATHS:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def is_available():
+    """True if Tesseract can run (the binary exists)."""
+    return find_tesseract_cmd() is not None
+
+
+def can_rasterize_pdf():
+    """True if a PDF rasterizer (pdf2image or PyMuPDF) is installed."""
+    return pdf2image is not None or fitz is not None
+
+
+def _ocr_settings():
+    return (
+        find_tesseract_cmd(),
+        getattr(settings, "OCR_DPI", 300),
+        getattr(settings, "OCR_LANG", "eng"),
+    )
+
+
+def ocr_image(image):
+    """OCR a PIL image with the configured binary and language."""
+    cmd, _, lang = _ocr_settings()
+    if cmd is None:
+        raise RuntimeError("Tesseract binary not found; set TESSERACT_CMD")
+    pytesseract.pytesseract.tesseract_cmd = cmd
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+# ── PDF pages ────────────────────────────────────────────────────────────────
+
+
+def _rasterize_pdf_page(file_path, page_number, dpi):
+    """Render one (0-based) PDF page to a grayscale PIL image."""
+    if pdf2image is not None:
+        images = pdf2image.convert_from_path(
+            file_path,
+            dpi=dpi,
+            first_page=page_number + 1,
+            last_page=page_number + 1,
+            grayscale=True,
+        )
+        return images[0]
+
+    if fitz is not None:
+        from PIL import Image
+
+        with fitz.open(file_path) as document:
+            pixmap = document[page_number].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+    raise RuntimeError("No PDF rasterizer installed (pdf2image or PyMuPDF)")
+
+
+def _ocr_pdf_page(file_path, page_number, cmd, dpi, lang):
+    """Process-pool worker: rasterize and OCR one page."""
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    pytesseract.pytesseract.tesseract_cmd = cmd
+    image = _rasterize_pdf_page(file_path, page_number, dpi)
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def pdf_page_count(file_path):
+    if pdf2image is not None:
+        return pdf2image.pdfinfo_from_path(file_path)["Pages"]
+    if fitz is not None:
+        with fitz.open(file_path) as document:
+            return document.page_count
+    raise RuntimeError("No PDF rasterizer installed (pdf2image or PyMuPDF)")
+
+
+def ocr_pdf_pages(file_path, page_numbers, workers=None):
+    """
+    OCR the given (0-based) pages of a PDF locally.
+
+    Returns a list of (page_number, text) in page order; pages whose OCR
+    failed are left out.
+    """
+    # Imported here: text_extractor imports this module
+    from . import text_extractor
+
+    cmd, dpi, lang = _ocr_settings()
+    if cmd is None:
+        raise RuntimeError("Tesseract binary not found; set TESSERACT_CMD")
+
+    page_numbers = sorted(page_numbers)
+    if not page_numbers:
+        return []
+    if workers is None:
+        workers = getattr(settings, "TESSERACT_WORKERS", os.cpu_count() or 1)
+
+    results = []
+    pool = text_extractor._get_pdf_pool()
+    in_flight = deque()
+
+    def collect():
+        number, future = in_flight.popleft()
+        try:
+            results.append((number, future.result()))
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            logger.warning(f"Tesseract OCR failed for page {number + 1}: {e}")
+
+    try:
+        for number in page_numbers:
+            in_flight.append((number, pool.submit(_ocr_pdf_page, file_path, number, cmd, dpi, lang)))
+            if len(in_flight) >= max(1, workers):
+                collect()
+        while in_flight:
+            collect()
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); the pages not done yet are left out
+        logger.warning(f"Tesseract OCR pool broke: {e}")
+        text_extractor._discard_pdf_pool(pool)
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+    return results
+
+
+def ocr_pdf(file_path):
+    """
+    OCR every page of a PDF.  Pages are joined with PAGE_BREAK, empty ones
+    included, so the Nth break still starts page N + 1; raises if any page
+    could not be OCR'd.
+    """
+    from .text_extractor import PAGE_BREAK, _page_ranges
+
+    page_count = pdf_page_count(file_path)
+    texts = dict(ocr_pdf_pages(file_path, range(page_count)))
+    missing = [number for number in range(page_count) if number not in texts]
+    if missing:
+        raise RuntimeError(f"Tesseract OCR failed for {len(missing)} of {page_count} PDF pages: {_page_ranges(missing)}")
+    return PAGE_BREAK.join(texts[number].replace(PAGE_BREAK, "\n").strip() for number in range(page_count))
@@ -1,48 +1,86 @@
+import codecs
+import io
+import mmap
 import os
+import re
 import base64
+import multiprocessing
+import tempfile
+import time
+import zipfile
+import xml.etree.ElementTree as ET
 import requests
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from threading import Lock
 import PyPDF2
 import docx
 import pandas as pd
 import json
-import pytesseract
 from PIL import Image
+from django.conf import settings
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 from django.core.exceptions import ValidationError
 
-# Ensure Tesseract path is configured as a fallback
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+from . import pdf_backends, tesseract_ocr
+from .image_preprocess import preprocess_image
 
-def extract_text_via_gemini(file_path, mime_type):
-    """Extract text from a file using the Gemini multimodal API as a fallback OCR engine."""
+# Bump whenever a change here alters extracted text, so cached extractions
+# (see extraction_cache.py) are rebuilt instead of served stale.
+EXTRACTOR_VERSION = "9"
+
+# Separates the pages of extracted PDF text (see utilities/pages.py)
+PAGE_BREAK = '\f'
+
+_OCR_PROMPT = "Extract all readable text from this document as accurately as possible. Output ONLY the extracted text. Do not summarize, do not translate, do not add introductory phrases, notes, markdown comments, or explanations."
+
+# Asked for between pages when a multi-page range is OCR'd in one request,
+# so the text can be split back into its pages
+_OCR_PAGE_SEPARATOR = "=== PAGE BREAK ==="
+_OCR_PAGES_PROMPT = _OCR_PROMPT + " The document has {pages} pages: output a line containing only " + _OCR_PAGE_SEPARATOR + " between the text of one page and the next."
+_OCR_PAGE_SEPARATOR_RE = re.compile(r'^[ \t]*' + re.escape(_OCR_PAGE_SEPARATOR) + r'[ \t]*$', re.MULTILINE)
+
+# Read size for streaming payloads; a multiple of 3 so base64 pieces concatenate cleanly
+_PAYLOAD_READ_SIZE = 3 * 64 * 1024
+
+def _gemini_ocr_url():
+    # Load API KEY from env, or fall back to views.py key
+    api_key = os.getenv("GEMINI_API_KEY")
+    base = getattr(settings, "GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+    model = getattr(settings, "GEMINI_OCR_MODEL", "gemini-2.0-flash")
+    return f"{base}/models/{model}:generateContent?key={api_key}"
+
+def _stream_ocr_payload(fileobj, mime_type, prompt=_OCR_PROMPT):
+    """
+    Yield the generateContent JSON body piece by piece, base64-encoding the
+    file as it is read instead of building the whole payload in memory.
+    """
+    yield (
+        '{"contents": [{"parts": [{"inlineData": {"mimeType": '
+        + json.dumps(mime_type) + ', "data": "'
+    ).encode("utf-8")
+    while True:
+        chunk = fileobj.read(_PAYLOAD_READ_SIZE)
+        if not chunk:
+            break
+        yield base64.b64encode(chunk)
+    yield ('"}}, {"text": ' + json.dumps(prompt) + '}]}]}').encode("utf-8")
+
+def extract_stream_via_gemini(fileobj, mime_type, prompt=_OCR_PROMPT):
+    """Extract text from an open binary file using the Gemini multimodal API."""
     try:
-        # Load API KEY from env, or fall back to views.py key
-        api_key = os.getenv("GEMINI_API_KEY")
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-        
-        with open(file_path, "rb") as f:
-            base64_data = base64.b64encode(f.read()).decode("utf-8")
-            
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "inlineData": {
-                                "mimeType": mime_type,
-                                "data": base64_data
-                            }
-                        },
-                        {
-                            "text": "Extract all readable text from this document as accurately as possible. Output ONLY the extracted text. Do not summarize, do not translate, do not add introductory phrases, notes, markdown comments, or explanations."
-                        }
-                    ]
-                }
-            ]
-        }
-        
         headers = {"Content-Type": "application/json"}
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
+        response = requests.post(
+            _gemini_ocr_url(),
+            headers=headers,
+            data=_stream_ocr_payload(fileobj, mime_type, prompt),
+            timeout=getattr(settings, "GEMINI_OCR_TIMEOUT", 60),
+        )
         
         if response.status_code != 200:
             raise Exception(f"Gemini API returned status code {response.status_code}: {response.text}")
@@ -59,93 +97,695 @@ def extract_text_via_gemini(file_path, mime_type):
         print(f"Error in Gemini OCR extraction: {e}")
         raise e
 
-def extract_text_from_txt(file_path):
-    """Extract text from a .txt file with robust encoding fallback."""
-    encodings = ['utf-8', 'latin-1', 'windows-1252', 'utf-16']
-    for encoding in encodings:
+def extract_bytes_via_gemini(data, mime_type):
+    """Extract text from in-memory file bytes using the Gemini multimodal API."""
+    return extract_stream_via_gemini(io.BytesIO(data), mime_type)
+
+def extract_text_via_gemini(file_path, mime_type):
+    """
+    Extract text from a file using the Gemini multimodal API as a fallback OCR engine.
+
+    Multi-page PDFs are OCR'd in ranges of GEMINI_OCR_PAGES_PER_CHUNK pages
+    (see ocr_pdf_pages) and their pages joined with PAGE_BREAK; if any range
+    still fails after its retries the whole extraction fails, rather than
+    returning a document with pages silently missing.  Everything else is
+    streamed in a single request.
+    """
+    if mime_type == "application/pdf":
         try:
-            with open(file_path, 'r', encoding=encoding) as file:
-                return file.read()
-        except UnicodeDecodeError:
-            continue
-    raise ValidationError("Could not decode text file with standard encodings.")
+            page_count = pdf_backends.get_backend().page_count(file_path)
+        except Exception:
+            page_count = 0
+        if page_count > 1:
+            texts = dict(ocr_pdf_pages(file_path, range(page_count)))
+            missing = [number for number in range(page_count) if number not in texts]
+            if missing:
+                raise Exception(f"Gemini OCR failed for {len(missing)} of {page_count} PDF pages: {_page_ranges(missing)}")
+            return PAGE_BREAK.join(texts[number].replace(PAGE_BREAK, '\n') for number in range(page_count))
+
+    with open(file_path, "rb") as f:
+        return extract_stream_via_gemini(f, mime_type)
+
+_TEXT_SAMPLE_BYTES = 64 * 1024
+
+# Checked longest first: the UTF-32 LE BOM starts with the UTF-16 LE one
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Bytes with no character in windows-1252; their presence means latin-1
+_CP1252_UNDEFINED = frozenset(b'\x81\x8d\x8f\x90\x9d')
+
+def detect_text_encoding(sample, complete=False):
+    """
+    Guess the encoding of a text file from its first bytes.
+
+    A BOM wins; otherwise BOM-less UTF-16 is recognised by its pattern of
+    NUL bytes, then UTF-8 is tried on the sample (a multi-byte character cut
+    off at the end of the sample is fine), then windows-1252, then latin-1.
+    *complete* says the sample is the whole file.  The returned codec names
+    strip any BOM when decoding.
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    pairs = len(sample) // 2
+    if pairs:
+        even_nulls = sample[0:pairs * 2:2].count(0)
+        odd_nulls = sample[1:pairs * 2:2].count(0)
+        if odd_nulls > pairs * 0.3 and even_nulls < pairs * 0.05:
+            return 'utf-16-le'
+        if even_nulls > pairs * 0.3 and odd_nulls < pairs * 0.05:
+            return 'utf-16-be'
 
-def extract_text_from_pdf(file_path):
-    """Extract text from a .pdf file, with fallback to Gemini OCR if scanned."""
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ''
-            for page in reader.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + '\n'
-            
-            # Simple check: if text is empty or very short, it is likely a scanned PDF
-            clean_text = ''.join(c for c in text if c.isalnum())
-            if len(clean_text) < 150:
-                print("PDF text extraction resulted in very little content. Falling back to Gemini OCR.")
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=complete)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    if _CP1252_UNDEFINED.isdisjoint(sample):
+        return 'windows-1252'
+    return 'latin-1'
+
+def _read_sample(file_path):
+    with open(file_path, 'rb') as file:
+        sample = file.read(_TEXT_SAMPLE_BYTES)
+        return sample, not file.read(1)
+
+def extract_text_from_txt(file_path):
+    """Extract text from a .txt file, decoding it once in the detected encoding."""
+    try:
+        if os.path.getsize(file_path) == 0:
+            return ''
+        with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            encoding = detect_text_encoding(
+                mapped[:_TEXT_SAMPLE_BYTES], complete=len(mapped) <= _TEXT_SAMPLE_BYTES
+            )
+            with memoryview(mapped) as view:
+                try:
+                    return str(view, encoding)
+                except UnicodeDecodeError:
+                    # The sample looked like UTF-8 but a later part is not
+                    print(f"{file_path} is not valid {encoding}; decoding as windows-1252")
+                    return str(view, 'windows-1252', 'replace')
+    except (OSError, ValueError) as e:
+        raise ValidationError(f"Failed to read text file: {str(e)}")
+
+def iter_text_lines(file_path):
+    """
+    Yield the lines of a text file (without line endings) without loading
+    the whole file, for very large transcripts.  Undecodable bytes are
+    replaced rather than raising mid-stream.
+    """
+    encoding = detect_text_encoding(*_read_sample(file_path))
+    with open(file_path, 'r', encoding=encoding, errors='replace') as file:
+        for line in file:
+            yield line.rstrip('\r\n')
+
+def iter_text_paragraphs(file_path):
+    """Yield blank-line separated paragraphs of a text file, streamed like iter_text_lines."""
+    paragraph = []
+    for line in iter_text_lines(file_path):
+        if line.strip():
+            paragraph.append(line)
+        elif paragraph:
+            yield '\n'.join(paragraph)
+            paragraph = []
+    if paragraph:
+        yield '\n'.join(paragraph)
+
+def _extract_pdf_page_range(file_path, start, stop, backend=None):
+    """Process-pool worker: (text, has_images) of pages [start, stop) of a PDF."""
+    return pdf_backends.get_backend(backend).extract_range(file_path, start, stop)
+
+# PDF page pool: created on first use (so forked web workers each get their
+# own) and shared by every extraction, instead of spawning fresh interpreters
+# for each document
+_pdf_pool = None
+_pdf_pool_lock = Lock()
+
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # "spawn" because this runs on job worker threads, where fork is unsafe
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=max(1, getattr(settings, 'PDF_EXTRACT_WORKERS', os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _pdf_pool
+
+def _discard_pdf_pool(pool):
+    """Drop a broken pool so the next extraction starts a fresh one."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _iter_pdf_page_info(file_path, workers=None):
+    """
+    Yield (text, has_images) for each page of a PDF, in page order.
+
+    Documents of at least PDF_PARALLEL_MIN_PAGES pages are split into
+    PDF_PAGES_PER_TASK page ranges parsed on the shared process pool (of
+    PDF_EXTRACT_WORKERS processes; *workers* <= 1 parses serially instead).
+    Pages are yielded as soon as their range is done, so callers can start
+    on page 1 while later pages are still being parsed.
+    """
+    backend = pdf_backends.backend_name()
+    page_count = pdf_backends.get_backend(backend).page_count(file_path)
+    if workers is None:
+        workers = getattr(settings, 'PDF_EXTRACT_WORKERS', os.cpu_count() or 1)
+    min_pages = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 32)
+
+    if workers <= 1 or page_count < min_pages:
+        yield from _extract_pdf_page_range(file_path, 0, page_count, backend)
+        return
+
+    per_task = getattr(settings, 'PDF_PAGES_PER_TASK', 16)
+    ranges = [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+    pool = _get_pdf_pool()
+    futures = []
+    try:
+        for start, stop in ranges:
+            futures.append(pool.submit(_extract_pdf_page_range, file_path, start, stop, backend))
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the pool cannot be reused
+        _discard_pdf_pool(pool)
+        raise
+    finally:
+        # Stopped early (error or abandoned generator): drop ranges not yet started
+        for future in futures:
+            future.cancel()
+
+def iter_pdf_pages(file_path, workers=None):
+    """Yield the embedded text of each page of a PDF, in page order."""
+    for text, _ in _iter_pdf_page_info(file_path, workers):
+        yield text
+
+def _page_needs_ocr(text, has_images):
+    """A page is treated as scanned if it has an image but (almost) no text layer."""
+    min_chars = getattr(settings, 'PDF_SCANNED_PAGE_MIN_CHARS', 20)
+    return has_images and sum(1 for c in text if c.isalnum()) < min_chars
+
+def _contiguous_runs(page_numbers):
+    """Group sorted page numbers into runs of consecutive pages: [1,2,3,7] -> [[1,2,3],[7]]."""
+    runs = []
+    for number in page_numbers:
+        if runs and number == runs[-1][-1] + 1:
+            runs[-1].append(number)
+        else:
+            runs.append([number])
+    return runs
+
+def _page_ranges(page_numbers):
+    """Human-readable 1-based ranges of sorted 0-based page numbers: [0,1,2,6] -> "1-3, 7"."""
+    return ", ".join(
+        f"{run[0] + 1}-{run[-1] + 1}" if len(run) > 1 else str(run[0] + 1)
+        for run in _contiguous_runs(page_numbers)
+    )
+
+def _ocr_pdf_part(reader, page_numbers):
+    """OCR the given pages of an open PdfReader as one temporary PDF."""
+    writer = PyPDF2.PdfWriter()
+    for number in page_numbers:
+        writer.add_page(reader.pages[number])
+    prompt = _OCR_PAGES_PROMPT.format(pages=len(page_numbers)) if len(page_numbers) > 1 else _OCR_PROMPT
+    with tempfile.TemporaryFile() as part:
+        writer.write(part)
+        part.seek(0)
+        return extract_stream_via_gemini(part, "application/pdf", prompt)
+
+def _ocr_pdf_page_range(file_path, page_numbers):
+    """
+    Thread worker: copy the given pages into a temporary PDF and stream it to
+    Gemini.  Each call opens its own reader, so workers share no state.
+
+    Returns one text per page.  The reply is split on _OCR_PAGE_SEPARATOR;
+    when it does not split into exactly one part per page, the pages are
+    OCR'd again one at a time rather than guessing where each page ends.
+    """
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        text = _ocr_pdf_part(reader, page_numbers)
+        texts = [part.strip() for part in _OCR_PAGE_SEPARATOR_RE.split(text)]
+        if len(texts) == len(page_numbers):
+            return texts
+
+        print(
+            f"Gemini OCR returned {len(texts)} page(s) for PDF pages "
+            f"{page_numbers[0] + 1}-{page_numbers[-1] + 1}; OCR'ing them one by one"
+        )
+        return [_ocr_pdf_part(reader, [number]) for number in page_numbers]
+
+def ocr_pdf_pages(file_path, page_numbers):
+    """
+    OCR only the given (0-based) pages of a PDF.
+
+    Consecutive pages are grouped into ranges of at most
+    GEMINI_OCR_PAGES_PER_CHUNK pages, and the ranges are OCR'd concurrently
+    with at most GEMINI_OCR_CONCURRENCY requests in flight.  Ranges that fail
+    are retried (and only those) up to GEMINI_OCR_RETRIES times.
+
+    Returns a list of (page number, text) pairs in page order, like
+    tesseract_ocr.ocr_pdf_pages; pages of ranges that still fail are left out.
+    """
+    per_chunk = max(1, getattr(settings, "GEMINI_OCR_PAGES_PER_CHUNK", 10))
+    concurrency = max(1, getattr(settings, "GEMINI_OCR_CONCURRENCY", 4))
+    retries = getattr(settings, "GEMINI_OCR_RETRIES", 2)
+
+    ranges = []
+    for run in _contiguous_runs(sorted(page_numbers)):
+        ranges.extend(run[i:i + per_chunk] for i in range(0, len(run), per_chunk))
+
+    results = {}
+    pending = ranges
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(ranges) or 1)) as pool:
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+                print(f"Retrying Gemini OCR for {len(pending)} failed page range(s)")
+            futures = {pool.submit(_ocr_pdf_page_range, file_path, run): run for run in pending}
+            failed = []
+            for future, run in futures.items():
                 try:
-                    ocr_text = extract_text_via_gemini(file_path, "application/pdf")
-                    if ocr_text:
-                        return ocr_text
+                    results.update(zip(run, future.result()))
                 except Exception as ocr_err:
-                    print(f"Gemini OCR fallback failed for PDF: {ocr_err}")
-            
-            return text
+                    print(f"Gemini OCR failed for PDF pages {run[0] + 1}-{run[-1] + 1}: {ocr_err}")
+                    failed.append(run)
+            pending = failed
+            if not pending:
+                break
+
+    return sorted(results.items())
+
+def _ocr_engine_order():
+    """OCR engines to try, in order, from OCR_ENGINE_ORDER ("gemini", "tesseract")."""
+    order = getattr(settings, 'OCR_ENGINE_ORDER', ['gemini', 'tesseract'])
+    return [engine for engine in order if engine in ('gemini', 'tesseract')]
+
+def _tesseract_can_ocr_pdf():
+    return tesseract_ocr.is_available() and tesseract_ocr.can_rasterize_pdf()
+
+def ocr_pdf_pages_with_engines(file_path, page_numbers):
+    """
+    OCR the given (0-based) PDF pages, trying each engine in OCR_ENGINE_ORDER
+    on the pages the previous engines could not handle.
+
+    Returns (page number, text) pairs in page order, like ocr_pdf_pages.
+    """
+    remaining = sorted(page_numbers)
+    results = []
+    for engine in _ocr_engine_order():
+        if not remaining:
+            break
+        if engine == 'tesseract':
+            if not _tesseract_can_ocr_pdf():
+                continue
+            engine_results = tesseract_ocr.ocr_pdf_pages(file_path, remaining)
+        else:
+            engine_results = ocr_pdf_pages(file_path, remaining)
+
+        results.extend(engine_results)
+        done = {number for number, _ in engine_results}
+        remaining = [number for number in remaining if number not in done]
+    return sorted(results)
+
+def ocr_whole_pdf(file_path):
+    """OCR an entire PDF with the first engine in OCR_ENGINE_ORDER that succeeds."""
+    errors = []
+    for engine in _ocr_engine_order():
+        try:
+            if engine == 'tesseract':
+                if not _tesseract_can_ocr_pdf():
+                    continue
+                text = tesseract_ocr.ocr_pdf(file_path)
+            else:
+                text = extract_text_via_gemini(file_path, "application/pdf")
+            if text:
+                return text
+        except Exception as ocr_err:
+            print(f"{engine} OCR failed for PDF: {ocr_err}")
+            errors.append(f"{engine}: {ocr_err}")
+    raise Exception("; ".join(errors) or "No OCR engine available")
+
+def extract_text_from_pdf(file_path):
+    """
+    Extract text from a .pdf file.
+
+    Pages without a usable text layer (scanned pages) are OCR'd individually
+    and merged back in page order, so only the pages that need OCR are sent.
+    Pages are separated by PAGE_BREAK, OCR'd pages included, so every page
+    keeps its own text.
+    """
+    try:
+        texts = []
+        scanned = []
+        for number, (text, has_images) in enumerate(_iter_pdf_page_info(file_path)):
+            texts.append(text)
+            if _page_needs_ocr(text, has_images):
+                scanned.append(number)
+        if scanned:
+            print(f"{len(scanned)} of {len(texts)} PDF pages look scanned. Sending only those to OCR.")
+            ocr_texts = dict(ocr_pdf_pages_with_engines(file_path, scanned))
+            missing = [number for number in scanned if number not in ocr_texts]
+            if missing:
+                # Every engine (with its retries) already tried these pages; OCR'ing
+                # the whole document again would not help and would lose the page breaks
+                raise ValidationError(f"OCR failed for scanned PDF pages {_page_ranges(missing)}")
+            for number, ocr_text in ocr_texts.items():
+                texts[number] = ocr_text
+
+        # Keep empty pages so the Nth PAGE_BREAK still starts page N + 1
+        text = PAGE_BREAK.join(page.replace(PAGE_BREAK, '\n') for page in texts)
+
+        # No images to classify but still almost no text (e.g. outlined glyphs):
+        # fall back to OCR of the whole document
+        clean_text = ''.join(c for c in text if c.isalnum())
+        if len(clean_text) < 150 and not scanned:
+            print("PDF text extraction resulted in very little content. Falling back to OCR.")
+            try:
+                ocr_text = ocr_whole_pdf(file_path)
+                if ocr_text:
+                    return ocr_text
+            except Exception as ocr_err:
+                print(f"OCR fallback failed for PDF: {ocr_err}")
+
+        return text
+    except ValidationError:
+        raise
     except Exception as e:
-        print(f"Error in PyPDF2 extraction: {e}. Trying Gemini OCR.")
+        print(f"Error in PDF text extraction: {e}. Trying OCR.")
         try:
-            return extract_text_via_gemini(file_path, "application/pdf")
+            return ocr_whole_pdf(file_path)
         except Exception as ocr_err:
             raise ValidationError(f"Failed to extract text from PDF: {str(e)} | OCR error: {str(ocr_err)}")
 
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+def _docx_parts(archive):
+    """Text-bearing parts of a .docx in reading order: headers, body, footers, notes."""
+    names = set(archive.namelist())
+
+    def numbered(prefix):
+        found = [name for name in names if name.startswith(f'word/{prefix}') and name.endswith('.xml')]
+        return sorted(found, key=lambda name: (len(name), name))
+
+    parts = numbered('header') + ['word/document.xml'] + numbered('footer')
+    parts += [name for name in ('word/footnotes.xml', 'word/endnotes.xml') if name in names]
+    return [name for name in parts if name in names]
+
+_MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+
+def _iter_docx_part(stream):
+    """
+    Yield the paragraphs of one WordprocessingML part in document order.
+    Table rows come out as one line with cells separated by " | ".
+    Paragraphs nested in a paragraph (text boxes) become lines of the
+    enclosing paragraph; the legacy copy of a text box (mc:Fallback) is
+    skipped so its text is not read twice.
+
+    Elements are detached from their parent as soon as they are consumed, so
+    memory is bounded by the current paragraph or table row rather than the
+    whole document.
+    """
+    # Open paragraphs and tables, innermost last: {"p": [...]} or {"row": [...], "cell": [...]}
+    blocks = []
+    parents = []
+    fallback = 0
+
+    def deliver(text):
+        # Hand finished paragraph / row text to the enclosing block; False if there is none
+        if not blocks:
+            return False
+        outer = blocks[-1]
+        if text.strip():
+            if 'p' in outer:
+                outer['p'].extend(['\n', text.strip(), '\n'])
+            else:
+                outer['cell'].append(text.strip())
+        return True
+
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            parents.append(elem)
+            if tag == _MC_FALLBACK:
+                fallback += 1
+            if fallback:
+                continue
+            if tag == _W + 'p':
+                blocks.append({'p': []})
+            elif tag == _W + 'tbl':
+                blocks.append({'row': [], 'cell': []})
+            elif tag == _W + 'tr' and blocks and 'row' in blocks[-1]:
+                blocks[-1]['row'] = []
+            elif tag == _W + 'tc' and blocks and 'row' in blocks[-1]:
+                blocks[-1]['cell'] = []
+            continue
+
+        parents.pop()
+        if parents:
+            parents[-1].remove(elem)
+
+        if tag == _MC_FALLBACK:
+            fallback -= 1
+            continue
+        if fallback or not blocks:
+            continue
+
+        block = blocks[-1]
+        if 'p' in block:
+            if tag == _W + 't':
+                block['p'].append(elem.text or '')
+            elif tag == _W + 'tab':
+                block['p'].append('\t')
+            elif tag in (_W + 'br', _W + 'cr'):
+                block['p'].append('\n')
+            elif tag == _W + 'p':
+                blocks.pop()
+                text = ''.join(block['p'])
+                if not deliver(text):
+                    yield text
+        elif tag == _W + 'tc':
+            block['row'].append(' '.join(block['cell']))
+        elif tag == _W + 'tr':
+            line = ' | '.join(block['row'])
+            if not line.strip(' |'):
+                continue
+            # Rows of a nested table become text of the enclosing cell or paragraph
+            blocks.pop()
+            absorbed = deliver(line)
+            blocks.append(block)
+            if not absorbed:
+                yield line
+        elif tag == _W + 'tbl':
+            blocks.pop()
+
+def iter_docx_paragraphs(file_path):
+    """Yield the paragraphs and table rows of a .docx: headers, body, footers, then foot/endnotes."""
+    with zipfile.ZipFile(file_path) as archive:
+        for part in _docx_parts(archive):
+            with archive.open(part) as stream:
+                yield from _iter_docx_part(stream)
+
 def extract_text_from_docx(file_path):
-    """Extract text from a .docx file."""
+    """Extract text from a .docx file, including tables, headers, footers and notes."""
+    try:
+        return '\n'.join(iter_docx_paragraphs(file_path))
+    except Exception as e:
+        raise ValidationError(f"Failed to read DOCX file: {str(e)}")
+
+def extract_text_from_docx_object_model(file_path):
+    """
+    Body paragraphs only, via the python-docx object model (the previous
+    implementation; kept as the baseline for benchmark_extractors).
+    """
     try:
         doc = docx.Document(file_path)
         return '\n'.join([para.text for para in doc.paragraphs])
     except Exception as e:
         raise ValidationError(f"Failed to read DOCX file: {str(e)}")
 
+def _tabular_caps(max_rows, max_cols):
+    if max_rows is None:
+        max_rows = getattr(settings, 'TABULAR_MAX_ROWS', 100000)
+    if max_cols is None:
+        max_cols = getattr(settings, 'TABULAR_MAX_COLS', 50)
+    return max_rows, max_cols
+
+def _format_row(values):
+    """One tab-separated line; tabs/newlines inside cells become spaces, trailing blanks are dropped."""
+    cells = ['' if value is None else ' '.join(str(value).split()) for value in values]
+    while cells and not cells[-1]:
+        cells.pop()
+    return '\t'.join(cells)
+
+def iter_csv_lines(file_path, max_rows=None, max_cols=None):
+    """
+    Yield a .csv file as tab-separated lines (header first), reading
+    TABULAR_CHUNK_ROWS rows at a time and stopping at the row/column caps.
+    """
+    max_rows, max_cols = _tabular_caps(max_rows, max_cols)
+    chunks = pd.read_csv(
+        file_path,
+        dtype=str,
+        keep_default_na=False,
+        encoding_errors='replace',
+        chunksize=getattr(settings, 'TABULAR_CHUNK_ROWS', 10000),
+        nrows=max_rows + 1,  # one extra row tells us whether we truncated
+    )
+    emitted = 0
+    header_done = False
+    for chunk in chunks:
+        if chunk.shape[1] > max_cols:
+            chunk = chunk.iloc[:, :max_cols]
+        if not header_done:
+            yield _format_row(chunk.columns)
+            header_done = True
+        for row in chunk.itertuples(index=False, name=None):
+            if emitted == max_rows:
+                yield f"[truncated after {max_rows} rows]"
+                return
+            yield _format_row(row)
+            emitted += 1
+
+def iter_xlsx_lines(file_path, max_rows=None, max_cols=None):
+    """
+    Yield every sheet of a .xlsx workbook as tab-separated lines, each sheet
+    introduced by a "## <sheet name>" line.  The workbook is opened read-only
+    so rows are streamed from the file rather than loaded into memory.
+    """
+    from openpyxl import load_workbook
+
+    max_rows, max_cols = _tabular_caps(max_rows, max_cols)
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield f"## {sheet.title}"
+            emitted = 0
+            for row in sheet.iter_rows(values_only=True, max_col=max_cols):
+                line = _format_row(row)
+                if not line:
+                    continue
+                if emitted == max_rows:
+                    yield f"[truncated after {max_rows} rows]"
+                    break
+                yield line
+                emitted += 1
+    finally:
+        workbook.close()
+
 def extract_text_from_csv(file_path):
     """Extract text from a .csv file."""
-    df = pd.read_csv(file_path)
-    return df.to_string()
+    return '\n'.join(iter_csv_lines(file_path))
 
 def extract_text_from_xlsx(file_path):
-    """Extract text from a .xlsx file."""
-    df = pd.read_excel(file_path)
-    return df.to_string()
+    """Extract text from a .xlsx file (all sheets)."""
+    return '\n'.join(iter_xlsx_lines(file_path))
+
+def iter_json_lines(file_path, max_bytes=None):
+    """
+    Yield "key.path: value" lines for every string and number in a .json
+    file, walking it event by event so the document is never loaded whole.
+    Stops once JSON_MAX_BYTES of text has been produced.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'JSON_MAX_BYTES', 5 * 1024 * 1024)
+
+    if ijson is None:
+        # No incremental parser installed: fall back to a full load
+        with open(file_path, 'r', encoding='utf-8') as file:
+            yield from json.dumps(json.load(file), indent=4).splitlines()
+        return
+
+    produced = 0
+    with open(file_path, 'rb') as file:
+        for prefix, event, value in ijson.parse(file, use_float=True):
+            if event not in ('string', 'number'):
+                continue
+            text = ' '.join(str(value).split())
+            if not text:
+                continue
+            line = f"{prefix}: {text}" if prefix else text
+            produced += len(line.encode('utf-8')) + 1
+            if produced > max_bytes:
+                yield f"[truncated after {max_bytes} bytes]"
+                return
+            yield line
 
 def extract_text_from_json(file_path):
     """Extract text from a .json file."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-        return json.dumps(data, indent=4)
+    return '\n'.join(iter_json_lines(file_path))
 
 def extract_text_from_image(file_path):
-    """Extract text from an image using Gemini OCR or local pytesseract as fallback."""
+    """
+    Extract text from an image using the OCR engines in OCR_ENGINE_ORDER.
+
+    The image is pre-processed once (rotation, grayscale, downscale,
+    binarization) and the smaller result is what every engine receives.
+    """
     extension = Path(file_path).suffix.lower()
     mime_type = "image/png"
     if extension in ['.jpg', '.jpeg']:
         mime_type = "image/jpeg"
     elif extension == '.webp':
         mime_type = "image/webp"
-    
-    try:
-        ocr_text = extract_text_via_gemini(file_path, mime_type)
-        if ocr_text:
-            return ocr_text
-    except Exception as gemini_err:
-        print(f"Gemini OCR failed for image: {gemini_err}. Trying local pytesseract.")
-    
-    # Fallback to local pytesseract
-    try:
-        image = Image.open(file_path)
-        return pytesseract.image_to_string(image)
-    except Exception as tess_err:
-        raise ValidationError(f"Gemini OCR and pytesseract both failed to extract text from image: {str(tess_err)}")
+
+    prepared = None
+    if getattr(settings, 'OCR_IMAGE_PREPROCESS', True):
+        try:
+            prepared = preprocess_image(file_path)
+        except Exception as prep_err:
+            print(f"Image pre-processing failed, using the original: {prep_err}")
+
+    errors = []
+    for engine in _ocr_engine_order():
+        try:
+            if engine == 'tesseract':
+                if not tesseract_ocr.is_available():
+                    continue
+                if prepared is not None:
+                    ocr_text = tesseract_ocr.ocr_image(prepared.image)
+                else:
+                    with Image.open(file_path) as image:
+                        ocr_text = tesseract_ocr.ocr_image(image)
+            elif prepared is not None:
+                ocr_text = extract_bytes_via_gemini(prepared.data, prepared.mime_type)
+            else:
+                ocr_text = extract_text_via_gemini(file_path, mime_type)
+            if ocr_text:
+                return ocr_text
+        except Exception as ocr_err:
+            print(f"{engine} OCR failed for image: {ocr_err}")
+            errors.append(f"{engine}: {ocr_err}")
+
+    raise ValidationError(f"No OCR engine could extract text from image: {'; '.join(errors) or 'no engine available'}")
+
+def extractor_backend(file_path):
+    """
+    Name of the extraction path a file goes through, e.g.
+    "pdf:pypdf2+ocr:gemini,tesseract".
+
+    Part of the extraction cache key, so switching PDF backends or OCR
+    engines does not serve text produced by another one.
+    """
+    extension = Path(file_path).suffix.lower().lstrip('.')
+    if extension == 'pdf':
+        return f"pdf:{pdf_backends.backend_name()}+ocr:{','.join(_ocr_engine_order())}"
+    if extension in ('png', 'jpg', 'jpeg', 'bmp', 'tiff', 'webp'):
+        return f"{extension}+ocr:{','.join(_ocr_engine_order())}"
+    return extension
 
 def extract_text(file_path):
     """Extract text based on file extension."""
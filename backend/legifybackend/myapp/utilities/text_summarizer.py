@@ -1,22 +1,21 @@
 import os
+from collections import OrderedDict
+from threading import Lock
 from dotenv import load_dotenv
 import torch
 import logging
 import re
-import nltk
 import requests
-from transformers import AutoTokenizer, AutoModelForPreTraining, pipeline
+from django.conf import settings
+from nltk.tokenize import sent_tokenize
+from transformers import AutoTokenizer, pipeline
 
-load_dotenv()
-
-# ── NLTK data: download both punkt variants so it works on NLTK 3.7 and 3.8+ ──
-for _resource in ("punkt", "punkt_tab"):
-    try:
-        nltk.data.find(f"tokenizers/{_resource}")
-    except LookupError:
-        nltk.download(_resource, quiet=True)
+from . import inference_backends, model_registry
+from .fill_mask_batcher import FillMaskBatcher
+from . import glossary
+from .glossary import Glossary
 
-from nltk.tokenize import sent_tokenize  # import AFTER downloads
+load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("legal_bert_simplifier")
@@ -30,31 +29,44 @@ _GEMINI_URL = (
 )
 
 
-# ── Singleton model (loaded once per process) ────────────────────────────────
-_simplifier_instance = None
+# ── Pipeline version ─────────────────────────────────────────────────────────
+# Bump whenever the simplifier, prompt or Gemini model changes so stored
+# summaries (DocumentSummary) are regenerated instead of served stale.
+SUMMARY_PIPELINE_VERSION = "3"
+
+
+def summary_pipeline_version():
+    """
+    The version stored summaries are keyed on: SUMMARY_PIPELINE_VERSION plus
+    the glossary's fingerprint, since glossary edits are picked up without a
+    restart (and without a version bump).
+    """
+    return f"{SUMMARY_PIPELINE_VERSION}-{glossary.fingerprint()}"
+
+
+# ── Singleton model (loaded once per process, see model_registry) ────────────
 
 
 def _get_simplifier():
-    global _simplifier_instance
-    if _simplifier_instance is None:
-        _simplifier_instance = LegalBertSimplifier()
-    return _simplifier_instance
+    return model_registry.get("inlegalbert")
 
 
 class LegalBertSimplifier:
-    def __init__(self, device=None, max_length=512):
+    def __init__(self, device=None, max_length=512, model_name=None, backend=None):
         if device is None:
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
         else:
             self.device = device
 
-        logger.info(f"Using device: {self.device}")
+        model_name = model_name or getattr(settings, "LEGALBERT_MODEL", "law-ai/InLegalBERT")
+        self.backend = inference_backends.backend_name(backend)
 
         try:
-            logger.info("Loading InLegalBERT model...")
-            self.tokenizer = AutoTokenizer.from_pretrained("law-ai/InLegalBERT")
-            self.model = AutoModelForPreTraining.from_pretrained("law-ai/InLegalBERT")
-            self.model.to(self.device)
+            logger.info(f"Loading {model_name} ({self.backend})...")
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            # Masked-LM head only; see inference_backends for fp32 / int8 / onnx
+            self.model, self.device = inference_backends.load_masked_lm(model_name, self.backend, self.device)
+            logger.info(f"Using device: {self.device}")
 
             self.fill_mask = pipeline(
                 "fill-mask",
@@ -62,8 +74,15 @@ class LegalBertSimplifier:
                 tokenizer=self.tokenizer,
                 device=0 if self.device == "cuda" else -1,
             )
+            # Level-3 predictions go through a shared micro-batching queue
+            self.batcher = FillMaskBatcher(self.model, self.tokenizer, device=self.device)
+
+            # Level-3 predictions by masked context window, shared across documents
+            self._prediction_cache = OrderedDict()
+            self._prediction_cache_lock = Lock()
 
-            self.legal_terms = self._load_legal_terms()
+            # Term replacements, reloaded when LEGAL_GLOSSARY_PATH changes
+            self.glossary = Glossary()
             logger.info("Model loaded successfully")
 
         except Exception as e:
@@ -72,31 +91,26 @@ class LegalBertSimplifier:
 
         self.max_length = max_length
 
-    def _load_legal_terms(self):
-        return {
-            "hereinafter": "from now on",
-            "aforementioned": "mentioned earlier",
-            "pursuant to": "according to",
-            "in accordance with": "following",
-            "notwithstanding": "despite",
-            "whereby": "by which",
-            "herein": "in this document",
-            "therein": "in that",
-            "heretofore": "until now",
-            "party of the first part": "first party",
-            "party of the second part": "second party",
-            "shall": "will",
-            "such": "this",
-            "said": "the",
-            "deemed to be": "considered as",
-        }
-
-    def simplify_text(self, text, level=2):
+    @property
+    def legal_terms(self):
+        return self.glossary.terms
+
+    def simplify_text(self, text, level=2, sequential=False):
+        """
+        Simplify *text* sentence by sentence.  Level 3 model predictions are
+        made for the whole document at once (batched and memoized); pass
+        sequential=True for the previous one-prediction-at-a-time behaviour.
+        """
         if not text:
             return ""
 
-        # sent_tokenize is now safe — punkt/punkt_tab both downloaded at module load
+        # Glossary terms are replaced across the whole document in one pass
+        if level >= 1:
+            text = self._replace_legal_terms(text)
+
+        # punkt/punkt_tab data is fetched by the registry on first use
         try:
+            model_registry.get("nltk")
             sentences = sent_tokenize(text)
         except Exception:
             # Ultimate fallback: split on period
@@ -107,24 +121,22 @@ class LegalBertSimplifier:
         for sentence in sentences:
             simplified = sentence
 
-            if level >= 1:
-                simplified = self._replace_legal_terms(simplified)
             if level >= 2:
                 simplified = self._simplify_structure(simplified)
-            if level >= 3:
-                simplified = self._model_based_simplification(simplified)
+            if level >= 3 and sequential:
+                simplified = self._model_based_simplification_sequential(simplified)
 
             simplified_sentences.append(simplified)
 
+        if level >= 3 and not sequential:
+            simplified_sentences = self._model_based_simplification_batch(simplified_sentences)
+
         result = " ".join(simplified_sentences)
         result = self.clean_text(result)
         return result
 
     def _replace_legal_terms(self, text):
-        for term, replacement in self.legal_terms.items():
-            pattern = r"\b" + re.escape(term) + r"\b"
-            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-        return text
+        return self.glossary.replace(text)
 
     def _simplify_structure(self, text):
         text = re.sub(r"\([^)]{20,}\)", "", text)
@@ -136,6 +148,77 @@ class LegalBertSimplifier:
         return text
 
     def _model_based_simplification(self, text):
+        return self._model_based_simplification_batch([text])[0]
+
+    def _is_simplification_candidate(self, word):
+        return len(word) > 7 and word.isalpha() and word.lower() not in self.legal_terms
+
+    def _masked_window(self, words, index):
+        """The words around *index* with that word masked: the model input and memo key."""
+        window = getattr(settings, "SIMPLIFY_CONTEXT_WORDS", 12)
+        start = max(0, index - window)
+        return " ".join(words[start:index] + [self.tokenizer.mask_token] + words[index + 1:index + 1 + window])
+
+    def _cached_predictions(self, keys):
+        with self._prediction_cache_lock:
+            found = {}
+            for key in keys:
+                if key in self._prediction_cache:
+                    self._prediction_cache.move_to_end(key)
+                    found[key] = self._prediction_cache[key]
+            return found
+
+    def _cache_predictions(self, predictions):
+        max_size = getattr(settings, "SIMPLIFY_PREDICTION_CACHE_SIZE", 50000)
+        with self._prediction_cache_lock:
+            self._prediction_cache.update(predictions)
+            while len(self._prediction_cache) > max_size:
+                self._prediction_cache.popitem(last=False)
+
+    def _model_based_simplification_batch(self, sentences):
+        """
+        Level 3 for many sentences at once.  Each long word is masked by its
+        position (not by text search, so repeated words are handled) within a
+        window of SIMPLIFY_CONTEXT_WORDS words either side.  Distinct windows
+        are predicted together through the batcher; windows seen before (in
+        this or an earlier document) come from the cache.
+        """
+        split_sentences = [sentence.split() for sentence in sentences]
+        targets = [
+            (s, i, self._masked_window(words, i))
+            for s, words in enumerate(split_sentences)
+            for i, word in enumerate(words)
+            if self._is_simplification_candidate(word)
+        ]
+        if not targets:
+            return [" ".join(words) for words in split_sentences]
+
+        keys = list(dict.fromkeys(key for _, _, key in targets))
+        predictions = self._cached_predictions(keys)
+        missing = [key for key in keys if key not in predictions]
+        if missing:
+            try:
+                computed = dict(zip(missing, self.batcher.fill_many(missing)))
+            except Exception as e:
+                logger.warning(f"Level-3 predictions failed: {e}")
+                computed = {}
+            self._cache_predictions(computed)
+            predictions.update(computed)
+
+        for s, i, key in targets:
+            word = split_sentences[s][i]
+            simpler_alternatives = [
+                pred["token_str"]
+                for pred in predictions.get(key, [])
+                if len(pred["token_str"]) < len(word) and pred["score"] > 0.05
+            ]
+            if simpler_alternatives:
+                split_sentences[s][i] = simpler_alternatives[0]
+
+        return [" ".join(words) for words in split_sentences]
+
+    def _model_based_simplification_sequential(self, text):
+        """The original level 3: one fill-mask pipeline call per long word (kept for benchmarking)."""
         words = text.split()
         simplified_words = []
 
@@ -173,42 +256,36 @@ class LegalBertSimplifier:
 # ── Public API ────────────────────────────────────────────────────────────────
 
 
-def summarize_text(text, level=2):
+def bert_simplify(text, level=2):
     """
-    Simplify/summarise *text* at the given *level* (1-3).
-
-    Strategy:
-      1. Run InLegalBERT-based simplification (rule + structural).
-      2. Send the simplified text to Gemini for a concise human-readable summary.
-      3. On any Gemini failure, return the InLegalBERT-simplified text instead
-         of raising / returning empty string.
+    Run InLegalBERT-based simplification (rule + structural) on *text*.
 
-    Returns a non-empty string on success.  Raises on total failure so the
-    caller can decide what to show the user.
+    Returns the original text if the model cannot be loaded or fails, so the
+    caller can still hand something to Gemini.
     """
     if not text or not text.strip():
-        return "No text available to summarise."
+        return text or ""
 
-    # ── Step 1: InLegalBERT simplification ───────────────────────────────────
-    bert_simplified = text  # safe default
     try:
         simplifier = _get_simplifier()
-        print(text)
-        print(f"\n--- Simplification Level {level} ---")
-        bert_simplified = simplifier.simplify_text(text, level=level)
-        print(bert_simplified)
-        print("-" * 50)
+        logger.debug(f"Simplification level {level} on {len(text)} chars")
+        return simplifier.simplify_text(text, level=level)
     except Exception as bert_err:
         logger.warning(f"InLegalBERT simplification failed: {bert_err}")
-        # Continue — we can still try Gemini on the original text
+        return text
 
-    # ── Step 2: Gemini summary ────────────────────────────────────────────────
+
+def gemini_summary(text, level=2):
+    """
+    Ask Gemini for a concise human-readable summary of (already simplified)
+    *text*.  Returns ``None`` when Gemini fails or gives no usable candidate.
+    """
     line_counts = {1: "40-50", 2: "20-30", 3: "15-20"}
     count = line_counts.get(level, "20-30")
     prompt = (
         f"Summarise and simplify the following text into {count} concise, "
         "plain-English lines.  Output ONLY the summary — no preamble, no "
-        "markdown bold/italic markers:\n\n" + bert_simplified
+        "markdown bold/italic markers:\n\n" + text
     )
 
     try:
@@ -228,8 +305,7 @@ def summarize_text(text, level=2):
                     gemini_text = parts[0].get("text", "").strip()
                     if gemini_text:
                         # Strip markdown bold/italic markers
-                        gemini_text = gemini_text.replace("**", "").replace("*", "")
-                        return gemini_text
+                        return gemini_text.replace("**", "").replace("*", "")
 
             logger.warning(
                 "Gemini returned no usable candidates; falling back to BERT result."
@@ -244,5 +320,32 @@ def summarize_text(text, level=2):
             f"Gemini call failed: {gemini_err}; falling back to BERT result."
         )
 
+    return None
+
+
+def summarize_text(text, level=2):
+    """
+    Simplify/summarise *text* at the given *level* (1-3).
+
+    Strategy:
+      1. Run InLegalBERT-based simplification (rule + structural).
+      2. Send the simplified text to Gemini for a concise human-readable summary.
+      3. On any Gemini failure, return the InLegalBERT-simplified text instead
+         of raising / returning empty string.
+
+    Returns a non-empty string on success.  Raises on total failure so the
+    caller can decide what to show the user.
+    """
+    if not text or not text.strip():
+        return "No text available to summarise."
+
+    # ── Step 1: InLegalBERT simplification ───────────────────────────────────
+    bert_simplified = bert_simplify(text, level)
+
+    # ── Step 2: Gemini summary ────────────────────────────────────────────────
+    gemini_text = gemini_summary(bert_simplified, level)
+    if gemini_text:
+        return gemini_text
+
     # ── Step 3: Fallback — return InLegalBERT result ─────────────────────────
     return bert_simplified if bert_simplified.strip() else text
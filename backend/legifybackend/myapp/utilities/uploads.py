@@ -0,0 +1,216 @@
+"""
+Streaming upload writer.
+
+Uploads are copied to disk in fixed-size chunks from ``uploaded_file.chunks()``
+so peak memory per request is one chunk, regardless of file size.  The same
+pass computes the SHA-256 content hash, sniffs the MIME type from the first
+bytes and enforces ``FILE_UPLOAD_MAX_SIZE``.  Files whose extension the
+extractor does not handle, or whose bytes do not match their extension (an
+executable named .pdf), are rejected as soon as the first bytes are in.
+
+An upload never replaces an existing file: the final name is reserved with
+O_EXCL before anything is written, and a name that is taken raises
+``FileExistsError``.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+try:
+    import magic  # python-magic (libmagic bindings)
+except ImportError:  # libmagic not available; fall back to the signature table
+    magic = None
+
+logger = logging.getLogger("legify.uploads")
+
+# Allowance for multipart boundaries and headers on top of the file itself
+MULTIPART_SLACK = 64 * 1024
+
+# Bytes handed to the MIME sniffer
+SNIFF_BYTES = 2048
+
+StoredUpload = namedtuple("StoredUpload", ["path", "size", "content_hash", "mime_type"])
+
+
+class UploadTooLarge(ValidationError):
+    """Raised when an upload exceeds ``FILE_UPLOAD_MAX_SIZE``."""
+
+
+class UnsupportedUpload(ValidationError):
+    """Raised when an upload is not a type the extractor handles, or its bytes do not match its extension."""
+
+
+def max_upload_size():
+    return getattr(settings, "FILE_UPLOAD_MAX_SIZE", 50 * 1024 * 1024)
+
+
+def check_content_length(content_length):
+    """
+    Reject a request by its Content-Length header before the body is parsed.
+    """
+    try:
+        content_length = int(content_length or 0)
+    except (TypeError, ValueError):
+        return
+    if content_length > max_upload_size() + MULTIPART_SLACK:
+        raise UploadTooLarge(
+            f"Upload exceeds the maximum size of {max_upload_size()} bytes"
+        )
+
+
+# ── MIME sniffing ────────────────────────────────────────────────────────────
+
+_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/msword"),
+]
+
+# Office Open XML files are zip archives; the extension tells them apart
+_ZIP_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def sniff_mime_type(head, file_name=""):
+    """Best-effort MIME type of a file from its first bytes."""
+    extension = Path(file_name).suffix.lower()
+
+    if magic is not None:
+        try:
+            mime_type = magic.from_buffer(head, mime=True)
+            if mime_type == "application/zip" and extension in _ZIP_TYPES:
+                return _ZIP_TYPES[extension]
+            if mime_type:
+                return mime_type
+        except Exception as e:
+            logger.debug(f"libmagic sniffing failed: {e}")
+
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"PK\x03\x04"):
+        return _ZIP_TYPES.get(extension, "application/zip")
+
+    try:
+        sample = head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        if e.start < len(head) - 3:
+            return "application/octet-stream"
+        sample = head[: e.start].decode("utf-8")
+
+    if extension == ".json" or sample.lstrip()[:1] in ("{", "["):
+        return "application/json"
+    if extension == ".csv":
+        return "text/csv"
+    return "text/plain"
+
+
+# Sniffed MIME type prefixes accepted for each extension extract_text handles
+_TEXT_TYPES = ("text/", "application/json", "application/csv")
+_EXPECTED_TYPES = {
+    ".pdf": ("application/pdf",),
+    ".txt": _TEXT_TYPES,
+    ".csv": _TEXT_TYPES,
+    ".json": _TEXT_TYPES,
+    ".docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml", "application/zip"),
+    ".xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml", "application/zip"),
+    ".doc": ("application/msword", "application/x-ole-storage", "application/cdfv2", "application/vnd.ms-office"),
+    ".png": ("image/",),
+    ".jpg": ("image/",),
+    ".jpeg": ("image/",),
+    ".bmp": ("image/",),
+    ".tiff": ("image/",),
+    ".webp": ("image/",),
+}
+
+
+def check_upload_type(head, file_name):
+    """The sniffed MIME type of an upload; raises UnsupportedUpload if it cannot be processed."""
+    extension = Path(file_name).suffix.lower()
+    if extension not in _EXPECTED_TYPES:
+        raise UnsupportedUpload(f"Unsupported file type: {extension or file_name}")
+
+    mime_type = sniff_mime_type(head, file_name)
+    if not mime_type.lower().startswith(_EXPECTED_TYPES[extension]):
+        raise UnsupportedUpload(f"File content ({mime_type}) does not match its {extension} extension")
+    return mime_type
+
+
+# ── Writer ───────────────────────────────────────────────────────────────────
+
+
+def save_upload(uploaded_file, file_path, max_size=None, chunk_size=None):
+    """
+    Stream *uploaded_file* to *file_path* and return a ``StoredUpload``.
+
+    *file_path* is reserved first (``FileExistsError`` if it is taken); the
+    data goes to a private ``.part`` file that is renamed over the reservation
+    only once it is complete, so a rejected or interrupted upload never
+    leaves a partial file under its final name.
+    """
+    if max_size is None:
+        max_size = max_upload_size()
+    if chunk_size is None:
+        chunk_size = getattr(settings, "UPLOAD_CHUNK_SIZE", 1024 * 1024)
+
+    # Django already knows the size from the multipart headers
+    if uploaded_file.size is not None and uploaded_file.size > max_size:
+        raise UploadTooLarge(f"Upload exceeds the maximum size of {max_size} bytes")
+
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    # Claim the final name; O_EXCL fails instead of clobbering another upload
+    os.close(os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    fd, part_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(file_path) + ".", suffix=".part")
+
+    digest = hashlib.sha256()
+    head = b""
+    mime_type = None
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in uploaded_file.chunks(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(
+                        f"Upload exceeds the maximum size of {max_size} bytes"
+                    )
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[: SNIFF_BYTES - len(head)]
+                    if len(head) >= SNIFF_BYTES:
+                        mime_type = check_upload_type(head, uploaded_file.name)
+                digest.update(chunk)
+                out.write(chunk)
+        if mime_type is None:
+            # Smaller than the sniffing window
+            mime_type = check_upload_type(head, uploaded_file.name)
+        os.chmod(part_path, 0o644)
+        os.replace(part_path, file_path)
+    except BaseException:
+        for path in (part_path, file_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    return StoredUpload(
+        path=file_path,
+        size=size,
+        content_hash=digest.hexdigest(),
+        mime_type=mime_type,
+    )
@@ -1,10 +1,15 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import BinaryField, Q
+from django.db.models.functions import Cast
+import base64
+import binascii
 import json
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+import uuid
 from django.conf import settings
 import os
 from django.views.decorators.csrf import csrf_exempt
@@ -21,16 +26,31 @@ from rest_framework.decorators import (
 from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.parsers import MultiPartParser
 from rest_framework.authtoken.models import Token
 
 from django.contrib.auth import authenticate, login
 
-from .models import UserFile, PasswordResetOTP
-from .utilities.text_extractor import extract_text
-from .utilities.text_summarizer import summarize_text
+from .fields import iter_decompressed_text
+from .models import UserFile, PasswordResetOTP, ProcessingJob
 from .utilities.ncr import extract_legal_entities
+from .utilities.pages import get_pages, page_count, page_text, parse_page_range
+from .utilities import extraction_cache, model_registry
+from .utilities.jobs import submit_on_commit
+from .utilities.pipeline import (
+    SUMMARY_LEVEL,
+    enqueue_document_job,
+    ensure_document_job,
+    finished_recently,
+    job_progress,
+    latest_job,
+    recent_fallback_summary,
+    sweep_stale_jobs_if_due,
+)
+from .utilities.storage import file_url_for, remove_files, upload_path
+from .utilities.summary_store import get_stored_summary
+from .utilities.uploads import UnsupportedUpload, UploadTooLarge, check_content_length, save_upload
 
 load_dotenv()
 
@@ -136,141 +156,295 @@ def user_logout(request):
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser])
 def file_upload(request):
+    # Refuse oversized bodies before the multipart parser touches them
+    try:
+        check_content_length(request.META.get("CONTENT_LENGTH"))
+    except UploadTooLarge as e:
+        return JsonResponse({"error": e.messages[0]}, status=413)
+
     if "file" not in request.FILES:
         return JsonResponse({"error": "No file uploaded"}, status=400)
 
     uploaded_file = request.FILES["file"]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_file_name = f"{request.user.id}_{timestamp}_{uploaded_file.name}"
-    file_path = os.path.join(settings.MEDIA_ROOT, "uploads", unique_file_name)
+    # Stored under a random prefix so same-name uploads in the same second never collide
+    file_path = upload_path(f"{uuid.uuid4().hex[:8]}_{unique_file_name}")
 
-    default_storage.save(file_path, ContentFile(uploaded_file.read()))
+    try:
+        stored = save_upload(uploaded_file, file_path)
+    except UploadTooLarge as e:
+        return JsonResponse({"error": e.messages[0]}, status=413)
+    except UnsupportedUpload as e:
+        return JsonResponse({"error": e.messages[0]}, status=415)
+    except FileExistsError:
+        return JsonResponse({"error": "An upload with this name is in progress; please retry"}, status=409)
 
     user_file = UserFile.objects.create(
         user=request.user,
         file_name=unique_file_name,
         file_path=file_path,
+        content_hash=stored.content_hash,
+        mime_type=stored.mime_type,
+        file_size=stored.size,
     )
 
-    try:
-        extracted_text = extract_text(file_path)
+    # Extraction, simplification, summary and NER run on the worker pool;
+    # the client polls the job endpoint for progress and results.
+    job = enqueue_document_job(user_file)
 
-        if not extracted_text:
-            return JsonResponse(
-                {"error": "Could not extract text from file"}, status=400
-            )
+    return JsonResponse(
+        {
+            "message": "File uploaded, processing started",
+            "file_url": file_url_for(user_file),
+            "file_id": user_file.id,
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": reverse("job_status", args=[job.id]),
+        },
+        status=202,
+    )
 
-        # Save extracted text
-        user_file.extracted_text = str(extracted_text)
-        user_file.save()
 
-        # ── Summarise ────────────────────────────────────────────────────────
-        summarized = ""
-        summary_error = None
-        try:
-            summarized = summarize_text(str(extracted_text), 2)
-        except Exception as e:
-            import traceback
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def job_status(request, job_id):
+    """
+    Report per-stage progress of a processing job and, once it has finished,
+    its results (summary and entities).  The extracted text is not inlined;
+    fetch it from ``text_url`` (streamed) or by page from file_details.
+    """
+    sweep_stale_jobs_if_due()
+    job = get_object_or_404(ProcessingJob, id=job_id, user=request.user)
+
+    data = {
+        "job_id": job.id,
+        "file_id": job.user_file_id,
+        "status": job.status,
+        "current_stage": job.current_stage,
+        "progress": job_progress(job),
+        "stages": job.stages,
+        "error": job.error,
+    }
 
-            summary_error = str(e)
-            traceback.print_exc()
-            print("SUMMARY ERROR:", summary_error)
-            summarized = "Summary generation failed: " + summary_error
+    if job.status == ProcessingJob.STATUS_SUCCEEDED:
+        data["result"] = {
+            "summarized_text": job.result.get("summarized_text", ""),
+            "entities": job.result.get("entities", {}),
+            "text_url": reverse("file_text", args=[job.user_file_id]),
+        }
 
-        return JsonResponse(
-            {
-                "message": "File uploaded successfully",
-                "file_url": f"{settings.MEDIA_URL}uploads/{unique_file_name}",
-                "summarized_text": summarized,
-                "extracted_text": str(extracted_text),
-                "file_id": user_file.id,
-            },
-            status=201,
-        )
+    return JsonResponse(data)
 
-    except Exception as e:
-        import traceback
 
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+def _encode_history_cursor(user_file):
+    raw = f"{user_file.uploaded_at.isoformat()}|{user_file.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_history_cursor(cursor):
+    """(uploaded_at, id) of the last row of the previous page; ValueError if malformed."""
+    try:
+        uploaded_at, file_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(uploaded_at), int(file_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Invalid cursor")
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def file_history(request):
-    user_files = UserFile.objects.filter(user=request.user).order_by("-uploaded_at")
+    """
+    A page of the user's files, newest first.
+
+    Pass the returned ``next_cursor`` as ?cursor= to get the next page
+    (null on the last page).  ?limit= sets the page size and
+    ?include_total=1 adds the user's file count.  Pages are found with a
+    keyset on (uploaded_at, id), so every page costs the same however deep it is.
+    """
+    try:
+        limit = int(request.GET.get("limit", settings.FILE_HISTORY_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    limit = max(1, min(limit, settings.FILE_HISTORY_MAX_PAGE_SIZE))
+
+    user_files = (
+        UserFile.objects.filter(user=request.user)
+        .only("id", "file_name", "file_path", "uploaded_at")
+        .order_by("-uploaded_at", "-id")
+    )
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            uploaded_at, file_id = _decode_history_cursor(cursor)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        user_files = user_files.filter(
+            Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=file_id)
+        )
+
+    # One extra row tells us whether there is a next page
+    page = list(user_files[: limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
 
     data = [
         {
             "id": f.id,
             "file_name": f.file_name,
-            "file_url": f"{settings.MEDIA_URL}uploads/{f.file_name}",
+            "file_url": file_url_for(f),
             "uploaded_at": f.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
         }
-        for f in user_files
+        for f in page
     ]
 
-    return JsonResponse({"file_history": data})
+    response = {
+        "file_history": data,
+        "next_cursor": _encode_history_cursor(page[-1]) if has_more else None,
+    }
+    if request.GET.get("include_total") in ("1", "true"):
+        response["total"] = UserFile.objects.filter(user=request.user).count()
+
+    return JsonResponse(response)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def file_details(request, file_id):
     """
-    Return full details for a single file including OCR text and summary.
+    Return details for a single file including its summary.
     Called when the user clicks a document from sidebar / history.
+
+    ``status`` is "ready" when the summary is available.  Otherwise text or
+    summary is still being produced (or has to be produced again, e.g. after
+    a pipeline version bump) by the job at ``status_url``, whose status is
+    returned ("pending", "running" or "failed"); nothing is extracted or
+    summarised in the request itself.
+
+    The extracted text is not inlined: fetch it from ``text_url`` (streamed),
+    or pass ?pages=3-5 to get just those pages (no summary).
     """
     try:
-        user_file = get_object_or_404(UserFile, id=file_id, user=request.user)
-
-        # Extract on-the-fly if text is missing (legacy entries)
-        if not user_file.extracted_text:
-            if os.path.exists(user_file.file_path):
-                try:
-                    user_file.extracted_text = extract_text(user_file.file_path)
-                    user_file.save()
-                except Exception as ext_err:
-                    print(f"Re-extraction failed for file {file_id}: {ext_err}")
-
-        # ── Summarise ────────────────────────────────────────────────────────
-        summarized = ""
-        if user_file.extracted_text:
-            try:
-                summarized = summarize_text(user_file.extracted_text, 2)
-            except Exception as e:
-                import traceback
+        page_range = parse_page_range(request.GET.get("pages"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-                traceback.print_exc()
-                print(f"Error summarizing file {file_id}: {e}")
-                # Return a helpful message rather than a blank string so the
-                # frontend can display something in the Summary tab.
-                summarized = f"Summary could not be generated: {str(e)}"
+    try:
+        if page_range is not None:
+            return _file_pages(request, file_id, page_range)
 
-        return JsonResponse(
-            {
-                "id": user_file.id,
-                "file_name": user_file.file_name,
-                "file_url": f"{settings.MEDIA_URL}uploads/{user_file.file_name}",
-                "uploaded_at": user_file.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "extracted_text": user_file.extracted_text or "",
-                "summarized_text": summarized,
-            }
+        # The text is not loaded: the summary lookup and page count only need its hash
+        user_file = get_object_or_404(
+            UserFile.objects.defer("extracted_text"), id=file_id, user=request.user
         )
+        has_text = bool(user_file.text_hash)
+
+        # Missing text or summary is never computed here: the request reports the
+        # file's job and, if there is none running, queues one on the job pool
+        job = latest_job(user_file)
+        summarized = get_stored_summary(user_file, SUMMARY_LEVEL) if has_text else None
+        if summarized is None and has_text:
+            summarized = recent_fallback_summary(job)
+        if summarized is not None:
+            status = "ready"
+        elif job is not None and job.status in ProcessingJob.ACTIVE_STATUSES:
+            status = job.status
+        elif job is not None and job.status == ProcessingJob.STATUS_FAILED and (
+            not has_text or finished_recently(job)
+        ):
+            # Failed extraction is not retried on view (it would fail again);
+            # other failures are, once SUMMARY_RETRY_SECONDS have passed
+            status = "failed"
+        elif not has_text and not os.path.exists(user_file.file_path):
+            job, status = None, "failed"
+        else:
+            job = ensure_document_job(user_file)
+            status = job.status
+
+        data = {
+            "id": user_file.id,
+            "file_name": user_file.file_name,
+            "file_url": file_url_for(user_file),
+            "uploaded_at": user_file.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "status": status,
+            "summarized_text": summarized or "",
+            "page_count": page_count(user_file) if has_text else 0,
+            "text_url": reverse("file_text", args=[user_file.id]),
+        }
+        if status != "ready":
+            if job is not None:
+                data["job_id"] = job.id
+                data["status_url"] = reverse("job_status", args=[job.id])
+            if status == "failed":
+                data["error"] = job.error if job is not None else "The uploaded file is missing"
+        return JsonResponse(data)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
+def _file_pages(request, file_id, page_range):
+    """file_details for a page range: reads DocumentPage rows, never the full text."""
+    user_file = get_object_or_404(
+        UserFile.objects.defer("extracted_text"), id=file_id, user=request.user
+    )
+    pages = get_pages(user_file, page_range)
+
+    return JsonResponse(
+        {
+            "id": user_file.id,
+            "file_name": user_file.file_name,
+            "file_url": file_url_for(user_file),
+            "uploaded_at": user_file.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "page_count": page_count(user_file),
+            "pages": [{"page_number": number, "text": text} for number, text in pages],
+            "extracted_text": "\n".join(text for _, text in pages),
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def file_text(request, file_id):
+    """
+    Stream the extracted text of a file as text/plain, decompressing it piece
+    by piece instead of building the whole string (and a JSON copy) in memory.
+    """
+    # Cast to a plain binary column so the compressed bytes are not decoded on load
+    row = (
+        UserFile.objects.filter(id=file_id, user=request.user)
+        .annotate(raw_text=Cast("extracted_text", output_field=BinaryField()))
+        .values_list("id", "raw_text")
+        .first()
+    )
+    if row is None:
+        return JsonResponse({"error": "File not found"}, status=404)
+
+    _, raw_text = row
+    if raw_text is None:
+        return JsonResponse({"error": "Text has not been extracted yet"}, status=404)
+
+    return StreamingHttpResponse(
+        (chunk.encode("utf-8") for chunk in iter_decompressed_text(raw_text)),
+        content_type="text/plain; charset=utf-8",
+    )
+
+
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def cleanup_files(request):
     user_files = UserFile.objects.filter(user=request.user)
 
-    for f in user_files:
-        if os.path.exists(f.file_path):
-            os.remove(f.file_path)
-        f.delete()
+    # One bulk delete; the files themselves are removed on the worker pool
+    # once the delete has committed, so the request does not wait on disk I/O.
+    # Anything left behind is picked up by `manage.py reconcile_uploads`.
+    with transaction.atomic():
+        paths = list(user_files.values_list("file_path", flat=True))
+        # Only ids: the compressed text of every row is not needed to delete it
+        user_files.only("id").delete()
+        submit_on_commit(remove_files, paths)
 
-    return JsonResponse({"message": "Files cleaned successfully"})
+    return JsonResponse({"message": "Files cleaned successfully", "deleted": len(paths)})
 
 
 # ================= GEMINI CHAT =================
@@ -297,9 +471,9 @@ _CACHE_MAX_SIZE = 200
 _CACHE_TTL_SECONDS = 3600  # 1 hour
 
 
-def _cache_key(file_id, question):
+def _cache_key(file_id, question, pages=None):
     normalized = re.sub(r"\s+", " ", question.lower().strip())
-    raw = f"{file_id or 'none'}:{normalized}"
+    raw = f"{file_id or 'none'}:{pages or 'all'}:{normalized}"
     return hashlib.sha256(raw.encode()).hexdigest()
 
 
@@ -501,6 +675,12 @@ def chat(request):
     if not prompt:
         return Response({"success": False, "error": "Prompt is required."}, status=200)
 
+    # Optional "pages": "3-5" limits the document context to those pages
+    try:
+        page_range = parse_page_range(request.data.get("pages"))
+    except ValueError as e:
+        return Response({"success": False, "error": str(e)}, status=200)
+
     user_id = getattr(request.user, "id", "anon")
     if not _check_throttle(user_id):
         return Response(
@@ -511,7 +691,7 @@ def chat(request):
             status=200,
         )
 
-    ck = _cache_key(file_id, prompt)
+    ck = _cache_key(file_id, prompt, page_range)
     cached = _cache_get(ck)
     if cached:
         logger.info(f"Cache HIT for file_id={file_id}")
@@ -522,15 +702,20 @@ def chat(request):
     context_text = ""
     if file_id:
         try:
+            files = UserFile.objects.all()
+            if page_range is not None:
+                files = files.defer("extracted_text")
             if request.user and request.user.is_authenticated:
-                user_file = UserFile.objects.filter(
-                    id=file_id, user=request.user
-                ).first()
+                user_file = files.filter(id=file_id, user=request.user).first()
             else:
-                user_file = UserFile.objects.filter(id=file_id).first()
+                user_file = files.filter(id=file_id).first()
+
+            if user_file and page_range is not None:
+                context_text = page_text(user_file, page_range)
+            elif user_file:
+                context_text = user_file.extracted_text or ""
 
-            if user_file and user_file.extracted_text:
-                context_text = user_file.extracted_text
+            if context_text:
                 logger.info(
                     f"Document context loaded: {len(context_text)} chars, file_id={file_id}"
                 )
@@ -616,7 +801,28 @@ def chat(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def getners(request):
+    """
+    Entities in "text", or in a stored file: "file_id" plus an optional
+    "pages" range ("3-5") to run NER on those pages only.
+    """
     text = request.data.get("text")
+    file_id = request.data.get("file_id")
+
+    if not text and file_id:
+        try:
+            page_range = parse_page_range(request.data.get("pages"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        if page_range is not None:
+            user_file = get_object_or_404(
+                UserFile.objects.defer("extracted_text"), id=file_id, user=request.user
+            )
+            text = page_text(user_file, page_range)
+        else:
+            user_file = get_object_or_404(UserFile, id=file_id, user=request.user)
+            text = user_file.extracted_text
+
     if not text:
         return Response({"error": "Text is required"}, status=400)
 
@@ -630,6 +836,30 @@ def getners(request):
     return Response({"entities": ners, "response": f"```json\n{json.dumps(ners)}\n```"})
 
 
+# ================= HEALTH =================
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def readiness(request):
+    """
+    Which NLP models are loaded in this worker and how long each took, plus
+    this worker's extraction cache counters.  503 until every model in
+    MODEL_PRELOAD is ready (for load balancer checks).
+    """
+    ready = model_registry.is_ready()
+    return JsonResponse(
+        {
+            "ready": ready,
+            "pid": os.getpid(),
+            "preload": model_registry.preload_names(),
+            "models": model_registry.status(),
+            "extraction_cache": extraction_cache.stats(),
+        },
+        status=200 if ready else 503,
+    )
+
+
 # ================= SETTINGS API =================
 
 user_settings_data = {}
@@ -9,7 +9,8 @@ const DocumentHistory = () => {
   const apiUrl = import.meta.env.VITE_API_URL;
   
   const [fileHistory,setFileHistory] = useState([])
-  const fetchUserDocs = async () => {
+  const [nextCursor, setNextCursor] = useState(null)
+  const fetchUserDocs = async (cursor = null) => {
     try {
       const user = JSON.parse(localStorage.getItem("user"));
       const authToken = localStorage.getItem("authToken");
@@ -23,9 +24,14 @@ const DocumentHistory = () => {
         headers: {
           Authorization: `Token ${authToken}`,
         },
+        params: cursor ? { cursor } : {},
       });
 
-      setFileHistory(response.data.file_history); // Ensure the correct response structure
+      // History is paginated; "Load more" appends the next page
+      setFileHistory((previous) =>
+        cursor ? [...previous, ...response.data.file_history] : response.data.file_history
+      );
+      setNextCursor(response.data.next_cursor);
       console.log("Fetched File History:", response.data.file_history);
     } catch (error) {
       console.error("Error fetching file history:", error);
@@ -78,7 +84,11 @@ const DocumentHistory = () => {
         </table>
       </div>
       <div className="card-footer">
-        <button className="load-more-btn">{t("load_more")}</button>
+        {nextCursor && (
+          <button className="load-more-btn" onClick={() => fetchUserDocs(nextCursor)}>
+            {t("load_more")}
+          </button>
+        )}
       </div>
     </div>
   );
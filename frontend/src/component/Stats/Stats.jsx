@@ -6,7 +6,7 @@ import axios from 'axios';
 
 const Stats = () => {
   const apiUrl = import.meta.env.VITE_API_URL;
-  const [fileHistory, setFileHistory] = useState([]);
+  const [numDocuments, setNumDocuments] = useState(0);
   
   // Fetch file history from the API
   const fetchUserDocs = async () => {
@@ -19,14 +19,16 @@ const Stats = () => {
         return;
       }
 
+      // Only the count is needed, not the (paginated) list itself
       const response = await axios.get(`${apiUrl}users/history/`, {
         headers: {
           Authorization: `Token ${authToken}`,
         },
+        params: { limit: 1, include_total: 1 },
       });
 
-      setFileHistory(response.data.file_history); // Store file history
-      console.log("Fetched File History for Stats:", response.data.file_history);
+      setNumDocuments(response.data.total);
+      console.log("Fetched document count for Stats:", response.data.total);
     } catch (error) {
       console.error("Error fetching file history:", error);
     }
@@ -39,7 +41,6 @@ const Stats = () => {
   const { t } = useTranslation();
 
   // Calculate stats based on fetched data
-  const numDocuments = fileHistory.length; // Number of documents processed
   const timeSaved = (numDocuments * 0.67).toFixed(1); // Random calc: 0.67 hours saved per document
   const aiAnalyses = numDocuments * 2 + Math.floor(Math.random() * 10); // Random calc: 2 analyses per doc + random extra
 
@@ -6,6 +6,7 @@ import axios from "axios";
 import { toast } from "react-toastify";
 import { useNavigate } from "react-router-dom";
 import { useTranslation } from "react-i18next";
+import { JOB_POLL_INTERVAL_MS, JOB_POLL_MAX_ATTEMPTS } from "../../config/jobPolling";
 
 const UploadDocument = () => {
   const apiUrl = import.meta.env.VITE_API_URL;
@@ -66,31 +67,70 @@ const UploadDocument = () => {
 
       console.log(response.data);
 
-      const interval = setInterval(() => {
-        setProgress((prev) => {
-          if (prev >= 100) {
-            clearInterval(interval);
-            setProcessing(false);
-            toast.success("Your document has been analyzed successfully", {
+      // Processing runs in the background; poll the job until it finishes,
+      // giving up after JOB_POLL_MAX_ATTEMPTS polls
+      const jobId = response.data.job_id;
+      let polls = 0;
+      const pollJob = async () => {
+        polls += 1;
+        try {
+          const jobResponse = await axios.get(`${apiUrl}users/jobs/${jobId}/`, {
+            headers: {
+              "Authorization": `Token ${authToken}`,
+            },
+          });
+          const job = jobResponse.data;
+          setProgress(Math.round((job.progress || 0) * 100));
+
+          if (job.status === "failed") {
+            toast.error("Error processing document: " + (job.error || "unknown error"), {
               position: "top-right",
               autoClose: 3000,
             });
-            // Dispatch custom event to trigger history reload in Sidebar
-            window.dispatchEvent(new Event("documentUploaded"));
-
-            navigate("/viewer", {
-              state: {
-                fileId: response.data.file_id,
-                uploadedFile: file,
-                ocrResult: response.data.extracted_text || "OCR text not available",
-                sometext:response.data.summarized_text || "Summarized text"
-              },
-            });
-            return 100;
+            setProcessing(false);
+            return;
           }
-          return prev + 10;
-        });
-      }, 500);
+
+          if (job.status !== "succeeded") {
+            if (polls < JOB_POLL_MAX_ATTEMPTS) {
+              setTimeout(pollJob, JOB_POLL_INTERVAL_MS);
+            } else {
+              toast.info("Processing is taking longer than expected. Open the document from your history later.", {
+                position: "top-right",
+                autoClose: 5000,
+              });
+              // Still processing: it shows up in the history, where it can be opened later
+              window.dispatchEvent(new Event("documentUploaded"));
+              setProcessing(false);
+            }
+            return;
+          }
+
+          setProcessing(false);
+          toast.success("Your document has been analyzed successfully", {
+            position: "top-right",
+            autoClose: 3000,
+          });
+          // Dispatch custom event to trigger history reload in Sidebar
+          window.dispatchEvent(new Event("documentUploaded"));
+
+          navigate("/viewer", {
+            state: {
+              fileId: response.data.file_id,
+              uploadedFile: file,
+              sometext: job.result.summarized_text || "Summarized text"
+            },
+          });
+        } catch (pollError) {
+          console.error("Job status error:", pollError);
+          toast.error("Error processing document: " + pollError.message, {
+            position: "top-right",
+            autoClose: 3000,
+          });
+          setProcessing(false);
+        }
+      };
+      pollJob();
     } catch (error) {
       console.error("Upload error:", error);
       toast.error("Error processing document: " + error.message, {
@@ -0,0 +1,5 @@
+// Background jobs are polled every JOB_POLL_INTERVAL_MS, for at most
+// JOB_POLL_MAX_ATTEMPTS polls (10 minutes), after which the user is told to
+// come back later instead of the page polling forever
+export const JOB_POLL_INTERVAL_MS = 2000;
+export const JOB_POLL_MAX_ATTEMPTS = 300;
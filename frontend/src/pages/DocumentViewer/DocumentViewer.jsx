@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from "react";
 import { useLocation, useNavigate } from "react-router-dom";
 import "./DocumentViewer.css";
 import axios from "axios";
+import { JOB_POLL_INTERVAL_MS, JOB_POLL_MAX_ATTEMPTS } from "../../config/jobPolling";
 
 const DocumentViewer = () => {
   const apiUrl = import.meta.env.VITE_API_URL;
@@ -44,29 +45,60 @@ const DocumentViewer = () => {
     }
   }, [chatMessages, activeTab]);
 
-  // Fetch document details from history if no OCR in state (sidebar click)
+  // Fetch the document details and its OCR text (streamed as plain text, not
+  // inlined in the JSON).  While the document is still being processed, or its
+  // summary regenerated, the details are polled until they are ready.
   useEffect(() => {
-    const fetchHistoryDetails = async () => {
-      if (!fileId || initialOcr) return;
+    if (!fileId || initialOcr) return;
+
+    let cancelled = false;
+    let timer = null;
+    let polls = 0;
+    const headers = {
+      Authorization: `Token ${localStorage.getItem("authToken")}`,
+    };
 
-      setIsLoadingHistory(true);
+    const fetchHistoryDetails = async () => {
+      // Only the first load shows the spinner, not every poll
+      if (polls === 0) setIsLoadingHistory(true);
       try {
-        const response = await axios.get(`${apiUrl}users/history/${fileId}/`, {
-          headers: {
-            Authorization: `Token ${localStorage.getItem("authToken")}`,
-          },
-        });
-        setOcrResult(response.data.extracted_text || "OCR text not available");
-        setSometext(response.data.summarized_text || "Summary not available");
+        const details = await axios.get(`${apiUrl}users/history/${fileId}/`, { headers });
+        if (cancelled) return;
+        const { status, page_count, summarized_text, error } = details.data;
+
+        if (page_count > 0) {
+          const textResponse = await axios.get(`${apiUrl}users/history/${fileId}/text/`, {
+            headers,
+            responseType: "text",
+          });
+          if (cancelled) return;
+          setOcrResult(textResponse.data || "OCR text not available");
+        }
+
+        if (status === "ready") {
+          if (!initialSome) setSometext(summarized_text || "Summary not available");
+        } else if (status === "failed") {
+          setSometext("Processing failed: " + (error || "unknown error"));
+        } else if (polls < JOB_POLL_MAX_ATTEMPTS) {
+          polls += 1;
+          if (!initialSome) setSometext("Your document is still being processed…");
+          timer = setTimeout(fetchHistoryDetails, JOB_POLL_INTERVAL_MS);
+        } else {
+          setSometext("Processing is taking longer than expected. Please reopen the document later.");
+        }
       } catch (err) {
         console.error("Error loading document history details:", err);
       } finally {
-        setIsLoadingHistory(false);
+        if (!cancelled) setIsLoadingHistory(false);
       }
     };
 
     fetchHistoryDetails();
-  }, [fileId, initialOcr, apiUrl]);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [fileId, initialOcr, initialSome, apiUrl]);
 
   // Fetch NER data when NER modal is opened
   const fetchNerData = async () => {